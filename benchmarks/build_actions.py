@@ -0,0 +1,46 @@
+"""
+Time to build one frame as the backlog of queued actions grows.
+
+Each frame drains at most MAX_FRAME_ACTIONS actions, so the build time should
+stay flat from a thousand to a million queued actions.
+
+    python benchmarks/build_actions.py
+"""
+
+import time
+
+from iturtle.screen import MAX_FRAME_ACTIONS, Screen
+
+BACKLOGS = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+TURTLES = 4
+FRAMES = 20
+
+def build_time(screen, backlog):
+  action = {'type': 'L'}
+
+  for i in range(backlog):
+    screen.add_action({**action, 'id': str(i % TURTLES)})
+
+  now = time.monotonic()
+  frames = min(FRAMES, backlog // MAX_FRAME_ACTIONS) or 1
+  started = time.perf_counter()
+
+  for _ in range(frames):
+    screen._build_actions(now, MAX_FRAME_ACTIONS)
+
+  elapsed = (time.perf_counter() - started) / frames
+
+  screen._build_actions()
+
+  return elapsed
+
+def main():
+  screen = Screen()
+  screen.stop()
+
+  print(f'{"backlog":>10} {"ms/frame":>10}')
+  for backlog in BACKLOGS:
+    print(f'{backlog:>10} {build_time(screen, backlog) * 1000:>10.2f}')
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,294 @@
+"""
+Benchmarks of the Python action pipeline, from turtle calls to the frames
+synced to the frontend, run headless against a mock comm.
+
+Every timing is the median of many samples. Each sample is also divided by a
+reference workload timed just before it, and these relative timings are
+compared with the baseline stored next to this file, so that a machine
+busier or slower than when the baseline was saved does not fail the run. The
+script exits with an error if a result is worse by more than the tolerance.
+
+    python benchmarks/pipeline.py            # Compare with baseline.json
+    python benchmarks/pipeline.py --save     # Store the results as baseline.json
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+from ipywidgets import Widget
+
+from iturtle import shutdown
+from iturtle.codec import DeltaEncoder, pack_actions
+from iturtle.metrics import payload_size
+from iturtle.screen import MAX_FRAME_ACTIONS, Screen
+from iturtle.tests.conftest import MockComm
+from iturtle.turtle import Turtle
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+REPEATS = 21 # Samples of every timing
+CALLS = 2000 # Turtle calls timed per sample
+FRAMES = 5 # Frames built per sample
+REFERENCE = 20000 # Iterations of the reference workload
+BACKLOGS = [10 ** 3, 10 ** 5]
+TURTLES = [1, 10, 100]
+ENCODINGS = ['json', 'packed', 'delta']
+
+OPERATIONS = {
+  'forward': lambda turtle, i: (turtle.forward(10), turtle.left(1)),
+  'circle': lambda turtle, i: turtle.circle(20, 90),
+  'dot': lambda turtle, i: turtle.dot(5),
+  'write': lambda turtle, i: turtle.write(i),
+  'stamp': lambda turtle, i: turtle.stamp(),
+}
+
+def reference():
+  # Pure Python work like the pipeline's, building and reading small dicts
+  actions = []
+  for i in range(REFERENCE):
+    action = {'id': i % 8, 'type': 'L', 'position': (i, -i), 'pen': True}
+    actions.append({**action, 'distance': action['position'][0]})
+
+  return actions
+
+def median(func, reset=None, repeats=REPEATS):
+  """
+  Median seconds of the samples of func, and median of the samples relative
+  to the reference workload.
+  """
+  times = []
+  relative = []
+  for _ in range(repeats):
+    if reset:
+      reset()
+    gc.collect()
+    gc.disable()
+    try:
+      started = time.perf_counter()
+      reference()
+      timed = time.perf_counter()
+      func()
+      ended = time.perf_counter()
+    finally:
+      gc.enable()
+
+    times.append(ended - timed)
+    relative.append((ended - timed) / (timed - started))
+
+  return statistics.median(times), statistics.median(relative)
+
+def per(count, sample):
+  # Rate of count operations from a sample, relative rates are per reference workload
+  return count / sample[0], count / sample[1]
+
+def scaled(factor, sample):
+  return sample[0] * factor, sample[1] * factor
+
+def manual_screen(**kwargs):
+  screen = Screen(**kwargs)
+  screen.tracer(0)
+
+  return screen
+
+def calls_per_second(operation):
+  """
+  Turtle calls per second, including the frame that shows them.
+  """
+  screen = manual_screen()
+  turtle = Turtle(screen)
+  turtle.speed(0)
+
+  def run():
+    for i in range(CALLS):
+      operation(turtle, i)
+    screen.update()
+
+  def reset():
+    turtle.clear()
+    screen.update()
+
+  return per(CALLS, median(run, reset))
+
+def build_time(backlog):
+  """
+  Seconds to build one frame from a backlog of queued actions, averaged over
+  the frames of a sample.
+  """
+  screen = Screen()
+  screen.stop()
+  # As many full frames as the backlog holds, up to FRAMES
+  frames = min(FRAMES, backlog // MAX_FRAME_ACTIONS) or 1
+
+  def reset():
+    screen._build_actions()
+    for i in range(backlog):
+      screen.add_action({'type': 'L', 'id': str(i % 4)})
+
+  def run():
+    now = time.monotonic()
+    for _ in range(frames):
+      screen._build_actions(now, MAX_FRAME_ACTIONS)
+
+  return scaled(1 / frames, median(run, reset))
+
+ENCODERS = {
+  'json': lambda actions: actions,
+  'packed': lambda actions: {'frame': 1, **pack_actions(actions)},
+  'delta': lambda actions: {'frame': 1, 'actions': DeltaEncoder().encode(actions)},
+}
+
+def draw_spiral(screen):
+  # A square spiral with a few dots and labels
+  turtle = Turtle(screen)
+
+  for i in range(CALLS):
+    turtle.forward(i % 50)
+    turtle.left(90)
+    if i % 100 == 0:
+      turtle.dot(5)
+      turtle.write(i)
+
+def bytes_per_action(encoding):
+  """
+  Bytes per action drawn when every action is encoded on its own, which is
+  what the encodings themselves cost.
+  """
+  screen = manual_screen()
+  draw_spiral(screen)
+  actions = screen._build_actions()
+
+  return payload_size(ENCODERS[encoding](actions)) / len(actions)
+
+def merged_bytes_per_action(encoding):
+  """
+  Bytes synced per action drawn, once strokes are merged into paths as in
+  the frames sent.
+  """
+  screen = manual_screen(encoding=encoding, metrics=True)
+  draw_spiral(screen)
+  screen.update()
+
+  stats = screen.stats()
+
+  return stats['sizes']['frame_bytes']['total'] / stats['counters']['actions']
+
+def turtles_per_second(count):
+  """
+  Actions per second when count turtles share a screen.
+  """
+  screen = manual_screen()
+  turtles = [Turtle(screen) for _ in range(count)]
+  steps = max(CALLS // count, 1)
+
+  def run():
+    for _ in range(steps):
+      for turtle in turtles:
+        turtle.forward(10)
+        turtle.left(10)
+    screen.update()
+
+  return per(2 * steps * count, median(run))
+
+def startup(create):
+  """
+  Seconds to create screens and turtles, without the fixed wait of
+  Screen.__init__ for the frontend to show the screen.
+  """
+  wait = Screen._display_wait
+  Screen._display_wait = 0
+  try:
+    return median(create, shutdown)
+  finally:
+    Screen._display_wait = wait
+
+def run():
+  """
+  Results as name -> (value, value compared with the baseline, unit, higher
+  is better). Timings are compared relative to the reference workload, sizes
+  as they are.
+  """
+  results = {}
+
+  for name, operation in OPERATIONS.items():
+    results[f'{name} calls'] = (*calls_per_second(operation), 'calls/s', True)
+
+  for backlog in BACKLOGS:
+    results[f'build frame, backlog {backlog}'] = (*scaled(1000, build_time(backlog)), 'ms', False)
+
+  for encoding in ENCODINGS:
+    size = bytes_per_action(encoding)
+    results[f'{encoding} bytes'] = (size, size, 'B/action', False)
+    size = merged_bytes_per_action(encoding)
+    results[f'{encoding} bytes, merged'] = (size, size, 'B/action', False)
+
+  for count in TURTLES:
+    results[f'{count} turtles'] = (*turtles_per_second(count), 'actions/s', True)
+
+  results['Screen()'] = (*scaled(1000, startup(Screen)), 'ms', False)
+  results['Turtle()'] = (*scaled(1000, startup(lambda: Turtle(Screen()))), 'ms', False)
+
+  shutdown()
+
+  return results
+
+def compare(results, baseline, tolerance):
+  """
+  Print results next to their baseline, and return the names of regressions.
+  """
+  regressions = []
+
+  print(f'{"benchmark":<28} {"value":>12} {"baseline":>12} {"change":>8}  unit')
+  for name, (value, compared, unit, higher) in results.items():
+    base = baseline.get(name)
+    change = ''
+
+    if base:
+      ratio = compared / base['compared'] if higher else base['compared'] / compared
+      change = f'{(ratio - 1) * 100:+.0f}%'
+      if ratio < 1 / (1 + tolerance):
+        regressions.append(name)
+        change += ' !'
+
+    shown = f'{base["value"]:.4g}' if base else '-'
+    print(f'{name:<28} {value:>12.4g} {shown:>12} {change:>8}  {unit}')
+
+  return regressions
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--save', action='store_true', help='store the results as the baseline')
+  parser.add_argument('--tolerance', type=float, default=0.5, help='slowdown allowed before failing, 0.5 is 50%%')
+  args = parser.parse_args()
+
+  # No kernel, widgets talk to a mock comm like in the tests
+  Widget._comm_default = lambda self: MockComm()
+
+  # Screens are displayed as text outside notebooks
+  with contextlib.redirect_stdout(io.StringIO()):
+    results = run()
+  baseline = {}
+  if os.path.exists(BASELINE):
+    with open(BASELINE) as f:
+      baseline = json.load(f)
+
+  regressions = compare(results, {} if args.save else baseline, args.tolerance)
+
+  if args.save:
+    with open(BASELINE, 'w') as f:
+      json.dump({
+        name: {'value': round(value, 6), 'compared': round(compared, 6)}
+        for name, (value, compared, _, _) in results.items()
+      }, f, indent=2)
+      f.write('\n')
+  elif regressions:
+    print(f'Slower than the baseline: {", ".join(regressions)}')
+    sys.exit(1)
+
+if __name__ == '__main__':
+  main()
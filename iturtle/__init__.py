@@ -1,6 +1,8 @@
 import threading
 
-from .turtle import ACTIVE_TURTLES, Turtle, Screen, done
+from .turtle import ACTIVE_TURTLES, Turtle, Screen, done, shutdown
+from .aio import AsyncScreen, AsyncTurtle
+from .headless import HeadlessScreen
 from .version import __version__, version_info
 from .wrapper import *
 
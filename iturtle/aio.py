@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+from functools import wraps
+
+from .screen import MAX_FRAME_ACTIONS, Screen
+from .turtle import Turtle
+from traitlets import observe
+
+# Turtle methods that produce actions, awaited until their action is shown
+MOTION_METHODS = [
+  'backward', 'back', 'bk', 'begin_fill', 'circle', 'clear', 'dot', 'end_fill', 'forward', 'fd', 'goto',
+  'hideturtle', 'ht', 'home', 'left', 'lt', 'path', 'pendown', 'pd', 'down', 'penup', 'pu', 'up', 'play',
+  'polyline', 'reset', 'right', 'rt', 'setheading', 'seth', 'setpos', 'setposition', 'setx', 'sety',
+  'showturtle', 'st', 'stamp', 'teleport', 'write',
+]
+
+class AsyncScreen(Screen):
+  """
+  A screen whose frame loop runs as a task on the running asyncio event loop,
+  such as the one of the ipykernel, instead of a thread. The task ends when
+  nothing is queued, and the next action starts it again.
+  """
+  _task = None
+  _loop = None
+  # Sleeping would block the event loop, the frontend catches up from the first frame
+  _display_wait = 0
+
+  def start(self, main_loop=None):
+    if self.closed:
+      return
+
+    if (self._task is None) or self._task.done():
+      try:
+        loop = asyncio.get_running_loop()
+      except RuntimeError:
+        # Actions queued from other threads start the task on the event loop
+        if (self._loop is not None) and self._loop.is_running():
+          self._loop.call_soon_threadsafe(self.start, main_loop)
+        else:
+          # Without an event loop yet, the first action queued on one starts the task
+          self._idle = True
+        return
+
+      self._loop = loop
+      self._idle = False
+      self._task = loop.create_task(main_loop() if main_loop else self._arun())
+
+  def stop(self):
+    if self._task is not None:
+      self._task.cancel()
+      self._task = None
+
+  async def _arun(self):
+    while True:
+      started = time.monotonic()
+
+      if self._ready(started):
+        self._publish(self._build_actions(started, MAX_FRAME_ACTIONS), started)
+
+      due = self._next_due()
+      if due is None:
+        # Nothing is queued, producers see the flag and start the task again
+        self._idle = True
+        self._task = None
+        return
+
+      await asyncio.sleep(max(max(due, started + self._frame_interval()) - time.monotonic(), 0))
+
+  @observe('key')
+  def on_key_change(self, _):
+    self.curr_key = self.key
+
+    if self.curr_key in self._on_keys:
+      # Coroutine callbacks run concurrently on the event loop
+      result = (self._on_keys[self.curr_key])()
+      if asyncio.iscoroutine(result):
+        asyncio.ensure_future(result)
+
+    self.curr_key = None
+
+def _awaitable(name):
+  @wraps(getattr(Turtle, name))
+  async def wrapper(self, *args, **kwargs):
+    result = getattr(self._turtle, name)(*args, **kwargs)
+
+    await asyncio.sleep(max(self._turtle._due - time.monotonic(), 0))
+
+    return result
+  return wrapper
+
+class AsyncTurtle:
+  """
+  A turtle whose motion methods are awaitable, they return once the action is
+  due on screen so that many turtles can be animated concurrently with
+  asyncio.gather. Other methods are the same as for Turtle.
+  """
+  def __init__(self, screen=None):
+    self._turtle = Turtle(AsyncScreen() if screen is None else screen)
+
+  def __getattr__(self, name):
+    return getattr(self._turtle, name)
+
+for _name in MOTION_METHODS:
+  setattr(AsyncTurtle, _name, _awaitable(_name))
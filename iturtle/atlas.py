@@ -0,0 +1,95 @@
+"""
+Bundle many small image shapes into one binary sheet, sent to the frontend
+once, with an index of the region of every shape in it. Images keep their own
+bytes, the frontend makes one object URL per region.
+"""
+
+import re
+import struct
+
+from math import ceil
+
+MIME_TYPES = {'bmp': 'image/bmp', 'gif': 'image/gif', 'jpg': 'image/jpeg', 'png': 'image/png', 'svg': 'image/svg+xml'}
+
+def _svg_size(data):
+  tag = re.search(rb'<svg\b[^>]*>', data)
+  if tag is None:
+    return None
+
+  attrs = dict(re.findall(rb'([\w:-]+)\s*=\s*["\']([^"\']*)["\']', tag.group(0)))
+  size = re.compile(rb'^\s*([\d.]+)\s*(px)?\s*$')
+  width, height = size.match(attrs.get(b'width', b'')), size.match(attrs.get(b'height', b''))
+
+  if width and height:
+    return float(width.group(1)), float(height.group(1))
+
+  box = attrs.get(b'viewBox', b'').replace(b',', b' ').split()
+  if len(box) == 4:
+    return float(box[2]), float(box[3])
+
+  return None
+
+def _jpeg_size(data):
+  i = 2
+  while i + 9 <= len(data):
+    if data[i] != 0xff:
+      i += 1
+      continue
+
+    marker = data[i + 1]
+    # Start of frame markers, except DHT, JPG and DAC
+    if (0xc0 <= marker <= 0xcf) and (marker not in (0xc4, 0xc8, 0xcc)):
+      height, width = struct.unpack('>HH', data[i + 5:i + 9])
+      return width, height
+
+    i += 2 + struct.unpack('>H', data[i + 2:i + 4])[0]
+
+  return None
+
+def image_size(data, ext):
+  """
+  Width and height of an image, read from its header.
+  """
+  data = bytes(data[:65536]) if ext != 'svg' else bytes(data)
+
+  if ext == 'png' and data[12:16] == b'IHDR':
+    return struct.unpack('>II', data[16:24])
+  elif ext == 'gif':
+    return struct.unpack('<HH', data[6:10])
+  elif ext == 'bmp':
+    width, height = struct.unpack('<ii', data[18:26])
+    return width, abs(height)
+  elif ext == 'jpg':
+    return _jpeg_size(data)
+  elif ext == 'svg':
+    return _svg_size(data)
+
+  return None
+
+def build_atlas(images):
+  """
+  Bundle images, given as (name, ext, data), into one buffer of their raw
+  bytes back to back. Returns the buffer and the region of every image by
+  name: its offset and length in the buffer, its width and height, and its
+  MIME type. Images whose size cannot be read are left out.
+  """
+  parts = []
+  regions = {}
+  offset = 0
+
+  for name, ext, data in images:
+    size = image_size(data, ext)
+    if not (size and (ext in MIME_TYPES)):
+      continue
+
+    parts.append(data)
+    regions[name] = {
+      'offset': offset,
+      'length': len(data),
+      'width': int(ceil(size[0])),
+      'height': int(ceil(size[1])),
+      'mime': MIME_TYPES[ext],
+    }
+    offset += len(data)
+
+  return b''.join(parts), regions
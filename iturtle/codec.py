@@ -0,0 +1,253 @@
+"""
+Compact encodings of the action stream synced from the kernel to the frontend.
+
+The packed encoding stores actions column by column in typed arrays, which are
+transferred as binary widget buffers, with only the fields that changed since
+the previous action, and keeps every string (turtle ids, colors, shapes,
+texts) once in a string table. The delta encoding only sends
+the fields of an action that changed since the previous action of the same
+turtle. The frontend counterparts live in src/codec.ts and must be kept in sync
+with the layouts below.
+"""
+
+import sys
+
+from array import array
+
+ENCODINGS = ['json', 'packed', 'delta']
+
+# Action types are sent as their index in this tuple, see ActionType in turtle.py
+ACTION_TYPES = (
+  'M', 'm', 'L', 'D', 'W', 'C', 'S', 'CLR', 'UPDATE_STATE', 'STAMP', 'BEGIN_FILL', 'END_FILL', 'DONE', 'P', 'RM',
+)
+ACTION_CODES = {t: i for i, t in enumerate(ACTION_TYPES)}
+
+# Bits of the per action flags byte
+FLAG_SHOW = 1
+FLAG_PEN = 2
+FLAG_CLOCKWISE = 4
+FLAG_LARGE_ARC = 8
+FLAG_FILL_MODE = 16
+
+# Float32 fields, each sent only when it changed since the previous action,
+# members is 0 but for the state shared by the members of a swarm
+FLOAT_FIELDS = (
+  'x', 'y', 'heading', 'pensize', 'stretch_wid', 'stretch_len', 'penoutlinewidth', 'distance', 'radius', 'font_size',
+  'members',
+)
+# Int32 string table references, -1 means absent, each sent only when it
+# changed since the previous action
+REF_FIELDS = (
+  'id', 'color', 'pencolor', 'stampid', 'shape', 'media', 'text', 'align', 'font_family', 'font_weight', 'commands',
+  'd',
+)
+# Uint32 mask of every action: bit i is set when the i-th float field changed,
+# bit len(FLOAT_FIELDS) + j when the j-th ref field changed, and the changed
+# values follow in that order in the floats and refs columns. Fields start
+# at 0 and -1 before the first action
+# Bits of the mask after the field bits, for the scene node drawn by every
+# action: MASK_NODE when it draws one, MASK_NODE_AT when the node is not one
+# past the last node drawn and is sent in the nodes column, MASK_REMOVES when
+# it removes nodes, whose number is then sent in the nodes column too
+MASK_NODE = 1 << (len(FLOAT_FIELDS) + len(REF_FIELDS))
+MASK_NODE_AT = MASK_NODE << 1
+MASK_REMOVES = MASK_NODE << 2
+# Path points of all actions are concatenated in one float32 pool, each path
+# takes two floats per command in order of appearance
+# Arcs of paths, 'A' commands, take three more floats each in the arcs pool:
+# radius, large arc and sweep flags, see optimize.py
+# Removed nodes of all actions are concatenated in one int32 pool in order of
+# appearance
+
+NO_REF = -1
+
+# A full action is sent every so many actions of a turtle, so late views can catch up
+KEYFRAME_INTERVAL = 100
+# Fields only used for pacing in the kernel
+KERNEL_FIELDS = ('speed', 'need_delay')
+
+def pack_actions(actions):
+  """
+  Pack a list of action dicts into typed columns plus a string table.
+
+  Binary columns are returned as memoryviews, which ipywidgets sends as
+  separate binary buffers instead of JSON.
+  """
+  strings = []
+  refs_of = {}
+
+  def ref(value):
+    if value is None:
+      return NO_REF
+    index = refs_of.get(value)
+    if index is None:
+      index = refs_of[value] = len(strings)
+      strings.append(value)
+    return index
+
+  types = array('B')
+  flags = array('B')
+  masks = array('I')
+  floats = array('f')
+  refs = array('i')
+  points = array('f')
+  arcs = array('f')
+  nodes = array('i')
+  removed = array('i')
+
+  last_floats = [0] * len(FLOAT_FIELDS)
+  last_refs = [NO_REF] * len(REF_FIELDS)
+  last_node = -1
+
+  for action in actions:
+    types.append(ACTION_CODES[action['type']])
+    flags.append(
+      (FLAG_SHOW if action['show'] else 0) |
+      (FLAG_PEN if action['pen'] else 0) |
+      (FLAG_CLOCKWISE if action['clockwise'] else 0) |
+      (FLAG_LARGE_ARC if action['large_arc'] else 0) |
+      (FLAG_FILL_MODE if action['fill_mode'] else 0)
+    )
+
+    font = action.get('font')
+    x, y = action['position']
+    stretch_wid, stretch_len = action['penstretchfactor']
+    values = (
+      x, y, action['heading'], action['pensize'], stretch_wid, stretch_len,
+      action['penoutlinewidth'], action['distance'], action['radius'], font[1] if font else 0,
+      action.get('members', 0),
+    )
+    indexes = (
+      ref(action['id']),
+      ref(action['color']),
+      ref(action['pencolor']),
+      ref(action['stampid']),
+      ref(action['shape']),
+      ref(action['media']),
+      ref(action.get('text')),
+      ref(action.get('align')),
+      ref(font[0]) if font else NO_REF,
+      ref(font[2]) if font else NO_REF,
+      ref(action.get('commands')),
+      ref(action.get('d')),
+    )
+
+    mask = 0
+    bit = 1
+    for i, value in enumerate(values):
+      if value != last_floats[i]:
+        mask |= bit
+        floats.append(value)
+        last_floats[i] = value
+      bit <<= 1
+    for i, index in enumerate(indexes):
+      if index != last_refs[i]:
+        mask |= bit
+        refs.append(index)
+        last_refs[i] = index
+      bit <<= 1
+
+    if 'points' in action:
+      points.extend(action['points'])
+      
+    if action.get('arcs'):
+      arcs.extend(action['arcs'])
+      
+    node = action.get('node')
+    if node is not None:
+      mask |= MASK_NODE
+      if node != last_node + 1:
+        mask |= MASK_NODE_AT
+        nodes.append(node)
+      last_node = node
+
+    dropped = action.get('nodes')
+    if dropped:
+      mask |= MASK_REMOVES
+      nodes.append(len(dropped))
+      removed.extend(dropped)
+
+    masks.append(mask)
+
+  # Typed arrays on the frontend are always little endian in practice
+  if sys.byteorder == 'big':
+    for column in (masks, floats, refs, points, arcs, nodes, removed):
+      column.byteswap()
+
+  return {
+    'count': len(types),
+    'strings': strings,
+    'types': memoryview(types),
+    'flags': memoryview(flags),
+    'masks': memoryview(masks),
+    'floats': memoryview(floats),
+    'refs': memoryview(refs),
+    'points': memoryview(points),
+    'arcs': memoryview(arcs),
+    'nodes': memoryview(nodes),
+    'removed': memoryview(removed),
+  }
+
+def pack_transforms(transforms, ranges=()):
+  """
+  Pack sprite transforms, given as (slot, x, y, heading) tuples, into an int32
+  column of slots and a float32 column of x, y and heading interleaved per
+  sprite, both returned as memoryviews. Ranges of consecutive slots, such as
+  the members of a swarm, follow as (first slot, float32 array of x, y and
+  heading interleaved per sprite).
+  """
+  slots = array('i', (t[0] for t in transforms))
+  values = array('f', (v for t in transforms for v in t[1:]))
+
+  for first, _values in ranges:
+    slots.extend(range(first, first + len(_values) // 3))
+    values.extend(_values)
+
+  if sys.byteorder == 'big':
+    slots.byteswap()
+    values.byteswap()
+
+  return memoryview(slots), memoryview(values)
+
+class DeltaEncoder:
+  """
+  Encode actions as the fields changed since the last action of each turtle.
+
+  Every action keeps its id and type. The first action of a turtle, and then
+  every KEYFRAME_INTERVAL actions, is sent in full and flagged as keyframe.
+  Fields an action no longer has are listed as removed.
+  """
+  def __init__(self, interval=KEYFRAME_INTERVAL):
+    self.interval = interval
+    self._states = {}
+    self._counts = {}
+
+  def encode(self, actions):
+    deltas = []
+
+    for action in actions:
+      _id = action['id']
+      state = self._states.get(_id)
+      count = self._counts.get(_id, 0)
+
+      if (state is None) or (count % self.interval == 0):
+        delta = {k: v for k, v in action.items() if k not in KERNEL_FIELDS}
+        self._states[_id] = dict(delta)
+        delta['keyframe'] = True
+      else:
+        delta = {'id': _id, 'type': action['type']}
+        for k, v in action.items():
+          if (k not in KERNEL_FIELDS) and ((k not in state) or (state[k] != v)):
+            delta[k] = v
+            state[k] = v
+
+        removed = [k for k in state if k not in action]
+        if removed:
+          delta['removed'] = removed
+          for k in removed:
+            del state[k]
+
+      self._counts[_id] = count + 1
+      deltas.append(delta)
+
+    return deltas
@@ -0,0 +1,170 @@
+"""
+Write animated GIFs in pure Python, one raster frame at a time. Frames go to
+the file as they are added and only the region that changed since the
+previous frame is encoded, so a long animation never sits in memory.
+"""
+
+import struct
+
+MAX_CODE = 4096 # Codes of the LZW table, 12 bits at most
+
+def _lzw(indices, min_size):
+  # Variable length LZW codes of palette indices, packed least significant bit first
+  clear, end = 1 << min_size, (1 << min_size) + 1
+  out = bytearray()
+  buffer = bits = 0
+
+  def emit(code, size):
+    nonlocal buffer, bits
+    buffer |= code << bits
+    bits += size
+    while bits >= 8:
+      out.append(buffer & 0xff)
+      buffer >>= 8
+      bits -= 8
+
+  size = min_size + 1
+  table = {}
+  available = end + 1
+  emit(clear, size)
+
+  code = indices[0]
+  for index in indices[1:]:
+    key = (code << 8) | index
+    known = table.get(key)
+
+    if known is not None:
+      code = known
+      continue
+
+    emit(code, size)
+
+    if available < MAX_CODE:
+      table[key] = available
+      available += 1
+      # Decoders widen the codes one entry later than the table grows
+      if (available > (1 << size)) and (size < 12):
+        size += 1
+    else:
+      emit(clear, size)
+      size, table, available = min_size + 1, {}, end + 1
+
+    code = index
+
+  emit(code, size)
+  emit(end, size)
+  if bits:
+    out.append(buffer & 0xff)
+
+  return bytes(out)
+
+def _blocks(data):
+  # Data sub-blocks of at most 255 bytes, ended by an empty one
+  return b''.join(bytes([len(data[i:i + 255])]) + data[i:i + 255] for i in range(0, len(data), 255)) + b'\x00'
+
+def _changed(rows, previous, width):
+  # Bounds of the pixels that differ between two frames, or None
+  changed = [y for y, (a, b) in enumerate(zip(rows, previous)) if a != b]
+  if not changed:
+    return None
+
+  left, right = width, 0
+  for y in changed:
+    a, b = rows[y], previous[y]
+    # First and last differing pixel, found by halving the common prefix and suffix
+    lo, hi = 0, width
+    while lo < hi:
+      mid = (lo + hi) // 2
+      if a[:3 * (mid + 1)] == b[:3 * (mid + 1)]:
+        lo = mid + 1
+      else:
+        hi = mid
+    left = min(left, lo)
+
+    lo, hi = 0, width
+    while lo < hi:
+      mid = (lo + hi) // 2
+      if a[3 * (width - mid - 1):] == b[3 * (width - mid - 1):]:
+        lo = mid + 1
+      else:
+        hi = mid
+    right = max(right, width - lo)
+
+  return left, changed[0], right, changed[-1] + 1
+
+class GIFWriter:
+  """
+  An animated GIF being written to a binary file. Every frame added is a
+  Raster snapshot, shown for 1 / fps seconds, and the animation loops.
+  """
+  def __init__(self, file, width, height, fps=15):
+    self.file = file
+    self.width = width
+    self.height = height
+    self.delay = max(int(round(100 / fps)), 1) # Hundredths of a second
+    self.frames = 0
+
+    self._previous = None
+
+    file.write(b'GIF89a' + struct.pack('<HHBBB', width, height, 0, 0, 0))
+    # Loop forever
+    file.write(b'\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')
+
+  def add(self, raster):
+    """
+    Append the current pixels of a raster, if anything changed since the last frame.
+    """
+    stride = 3 * self.width
+    pixels = bytes(raster.pixels)
+    rows = [pixels[y * stride:(y + 1) * stride] for y in range(self.height)]
+
+    if self._previous is None:
+      box = (0, 0, self.width, self.height)
+    else:
+      box = _changed(rows, self._previous, self.width)
+
+    self._previous = rows
+    if box is None:
+      return False
+
+    self._write(rows, *box)
+    self.frames += 1
+
+    return True
+
+  def _write(self, rows, left, top, right, bottom):
+    colors = [] # Color table
+    palette = {} # Color -> index in the table
+    indices = bytearray()
+
+    for y in range(top, bottom):
+      row = rows[y]
+      for x in range(left, right):
+        color = row[3 * x:3 * x + 3]
+        index = palette.get(color)
+
+        if index is None:
+          if len(colors) < 256:
+            index = len(colors)
+            colors.append(color)
+          else:
+            # Colors past the table are drawn with the closest one in it
+            index = min(range(256), key=lambda i: sum((a - b) ** 2 for a, b in zip(colors[i], color)))
+          palette[color] = index
+
+        indices.append(index)
+
+    # Local color tables hold a power of two colors, at least 4 for LZW
+    depth = max((len(colors) - 1).bit_length(), 2)
+    table = b''.join(colors).ljust(3 << depth, b'\x00')
+
+    self.file.write(b'\x21\xf9\x04' + struct.pack('<BHBB', 0, self.delay, 0, 0))
+    self.file.write(b'\x2c' + struct.pack('<HHHHB', left, top, right - left, bottom - top, 0x80 | (depth - 1)))
+    self.file.write(table)
+    self.file.write(bytes([depth]) + _blocks(_lzw(indices, depth)))
+
+  def close(self):
+    """
+    End the animation, the file itself is left open.
+    """
+    self.file.write(b'\x3b')
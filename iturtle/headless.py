@@ -0,0 +1,106 @@
+from .raster import rasterize
+from .render import render_scene
+from .resources import RESOURCES
+from .scene import Scene
+from .screen import DELAY, SCREEN_HEIGHT, SCREEN_WIDTH, canvas_transforms, canvas_values
+from .utils import build_color, decode_color
+
+class HeadlessScreen:
+  """
+  A screen without a browser. Actions are kept in a scene as they are added,
+  with no display, thread or animation, and the drawing is rendered from it
+  in-process by to_svg() or to_png(). Turtles are created on it as on any screen:
+
+      screen = HeadlessScreen()
+      turtle = Turtle(screen)
+  """
+  def __init__(self, width=SCREEN_WIDTH, height=SCREEN_HEIGHT, background='white'):
+    self.width = width
+    self.height = height
+    self.delay = DELAY
+    self.background = background
+    self.bgUrl = ''
+    self.loaded = set()
+    self.scene = Scene()
+
+    self._tracer = 0 # Never animated
+    self._colormode = 1.0
+    self._on_keys = {}
+
+  def setup(self, width, height):
+    self.width = width
+    self.height = height
+
+  def tracer(self, n):
+    pass
+
+  def update(self):
+    pass
+
+  def colormode(self, mode=None):
+    if mode is None:
+      return self._colormode
+    else:
+      if (mode == 1.0) or (mode == 255):
+        self._colormode = mode
+
+  def bgcolor(self, *_color):
+    if not _color:
+      return decode_color(self._colormode, self.background)
+    else:
+      self.background = build_color(self._colormode, *_color)
+
+  def bgpic(self, src, reload=False):
+    self.load(src, reload)
+
+    self.bgUrl = src
+
+  def onkeypress(self, fn, key):
+    self._on_keys[key] = fn
+
+  def add_action(self, action, delay=0):
+    self.scene.add(action)
+    self.scene.show([action])
+
+    return 0
+
+  def update_turtles(self, ids, positions, headings=None, due=0):
+    """
+    Move the sprites of many turtles at once without drawing, see Screen.update_turtles.
+    """
+    for _id, position, heading in canvas_transforms(ids, positions, headings, self.width, self.height):
+      self.scene.place(_id, position, heading)
+
+  def update_swarm(self, swarm, positions, headings, due=0):
+    """
+    Move the sprites of the members of a swarm, see Screen.update_swarm.
+    """
+    self.scene.place_members(swarm, canvas_values(positions, headings, self.width, self.height))
+
+  def load(self, file_path, reload=False):
+    if (file_path not in self.loaded) or reload:
+      if not ((file_path.startswith('http://')) or (file_path.startswith('https://'))):
+        # Read once now, rendering finds it in the cache
+        RESOURCES.get(file_path, reload)
+
+        self.loaded.add(file_path)
+
+  def to_svg(self, turtles=True):
+    """
+    The SVG document of the drawing, with visible turtles unless turtles is False.
+    """
+    return render_scene(self, turtles)
+
+  def to_png(self):
+    """
+    The drawing rasterized to PNG bytes, without text, stamps and images.
+    """
+    return rasterize(self.scene.replay(), self.width, self.height, self.background).to_png()
+
+  def save_svg(self, file_path, turtles=True):
+    with open(file_path, 'w') as f:
+      f.write(self.to_svg(turtles))
+
+  def save_png(self, file_path):
+    with open(file_path, 'wb') as f:
+      f.write(self.to_png())
@@ -0,0 +1,132 @@
+"""
+Counters and histograms of the action pipeline of a screen.
+
+Stages are timed where actions are queued by Screen.add_action, collected
+into a frame by _build_actions, merged and simplified, and encoded and
+synced to the frontend. Metrics are off by default, the pipeline then only
+checks the enabled flag. Hooks are called with the name and value of every
+measure taken, to forward them to a profiler or a log.
+"""
+
+import json
+import threading
+import time
+
+# Upper bounds of the histogram buckets, values above the last one are counted apart
+LATENCY_BUCKETS = (1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1) # Seconds
+SIZE_BUCKETS = (1 << 10, 1 << 14, 1 << 17, 1 << 20, 1 << 23) # Bytes
+
+class Histogram:
+  """
+  Count, total, maximum and bucketed distribution of measured values.
+  """
+  def __init__(self, buckets=LATENCY_BUCKETS):
+    self.buckets = buckets
+    self.counts = [0] * (len(buckets) + 1)
+    self.count = 0
+    self.total = 0
+    self.max = 0
+
+  def add(self, value):
+    i = 0
+    while (i < len(self.buckets)) and (value > self.buckets[i]):
+      i += 1
+
+    self.counts[i] += 1
+    self.count += 1
+    self.total += value
+    self.max = max(self.max, value)
+
+  def snapshot(self):
+    return {
+      'count': self.count,
+      'total': self.total,
+      'mean': self.total / self.count if self.count else 0,
+      'max': self.max,
+      'buckets': {
+        **{f'<={bound:g}': n for bound, n in zip(self.buckets, self.counts)},
+        f'>{self.buckets[-1]:g}': self.counts[-1],
+      },
+    }
+
+class Metrics:
+  """
+  Named counters, stage latencies and value histograms, and the hooks told
+  about every measure. Nothing is recorded unless enabled. Measures are taken
+  by the threads adding actions and by the frame thread, so updates hold a
+  lock, hooks are called outside of it.
+  """
+  def __init__(self, enabled=False):
+    self.enabled = enabled
+    self.hooks = [] # Callables taking the name and value of every measure
+    self._lock = threading.Lock()
+    self.reset()
+
+  def reset(self):
+    with self._lock:
+      self.counters = {}
+      self.latencies = {} # Stage -> Histogram of seconds
+      self.sizes = {} # Name -> Histogram of bytes
+
+  def enable(self):
+    self.enabled = True
+
+  def disable(self):
+    self.enabled = False
+
+  def count(self, name, n=1):
+    with self._lock:
+      self.counters[name] = self.counters.get(name, 0) + n
+
+    for hook in self.hooks:
+      hook(name, n)
+
+  def _add(self, histograms, buckets, name, value):
+    with self._lock:
+      histogram = histograms.get(name)
+      if histogram is None:
+        histogram = histograms[name] = Histogram(buckets)
+      histogram.add(value)
+
+    for hook in self.hooks:
+      hook(name, value)
+
+  def observe(self, stage, seconds):
+    self._add(self.latencies, LATENCY_BUCKETS, stage, seconds)
+
+  def size(self, name, size):
+    self._add(self.sizes, SIZE_BUCKETS, name, size)
+
+  def timed(self, stage, func, *args):
+    """
+    Call func with args, and observe how long it took as stage.
+    """
+    started = time.perf_counter()
+    try:
+      return func(*args)
+    finally:
+      self.observe(stage, time.perf_counter() - started)
+
+  def snapshot(self):
+    with self._lock:
+      return {
+        'enabled': self.enabled,
+        'counters': dict(self.counters),
+        'latencies': {stage: h.snapshot() for stage, h in self.latencies.items()},
+        'sizes': {name: h.snapshot() for name, h in self.sizes.items()},
+      }
+
+def payload_size(value):
+  """
+  Bytes of a value synced to the frontend, binary buffers at their size and
+  everything else as compact JSON.
+  """
+  buffers = []
+
+  def binary(o):
+    if isinstance(o, memoryview):
+      buffers.append(o.nbytes)
+      return None
+    raise TypeError(f'{type(o).__name__} is not serializable')
+
+  return len(json.dumps(value, default=binary, separators=(',', ':'))) + sum(buffers)
@@ -0,0 +1,193 @@
+"""
+Merge the strokes of a frame before it is sent, so that the frontend creates
+one path element where it would create hundreds of lines and arcs.
+
+Consecutive pen-down lines, arcs and paths of a turtle with the same pen
+become one path, and state updates superseded by a later action of the same
+turtle in the frame are dropped. The scene keeps one node per stroke, merged
+paths take the node of their first stroke and the merged nodes are grouped.
+Removing a grouped node removes the whole path and sends the strokes left
+back on their own, so undo and clearstamp work stroke by stroke as before.
+"""
+
+STROKES = ('L', 'C', 'P')
+# Fields of the path of a stroke, the others are the state of the turtle after it
+PATH_FIELDS = ('type', 'node', 'commands', 'points', 'arcs')
+
+def segments(action):
+  """
+  Path commands, points and arc parameters of a stroke. Arcs are 'A'
+  commands to their end point, with radius, large arc and sweep flags in arcs.
+  """
+  _type = action['type']
+
+  if _type == 'L':
+    return 'L', list(action['position']), []
+  elif _type == 'C':
+    return 'A', list(action['position']), [action['radius'], action['large_arc'], action['clockwise']]
+
+  return action['commands'], list(action['points']), list(action.get('arcs', ()))
+
+def _mergeable(previous, action):
+  return (
+    (previous['type'] in STROKES) and (action['type'] in STROKES) and
+    previous.get('pen') and action.get('pen') and previous.get('node') and action.get('node') and
+    (previous['id'] == action['id']) and (previous['pencolor'] == action['pencolor']) and
+    (previous['pensize'] == action['pensize']) and (previous['fill_mode'] == action['fill_mode'])
+  )
+
+def _restore(node):
+  # A stroke of a removed path drawn again on its own, from where it starts
+  commands, points, arcs = segments(node['action'])
+
+  if node['start'] is not None:
+    commands, points = 'M' + commands, list(node['start']) + points
+
+  return {**node['action'], 'type': 'P', 'commands': commands, 'points': points, 'arcs': arcs}
+
+def merge_strokes(actions, scene):
+  """
+  The actions of a frame with strokes merged and superseded state updates
+  dropped. Nodes merged are grouped in scene.groups.
+  """
+  # Every action carries the whole state of its turtle, only the last update
+  # counts, the state shared by the members of a swarm apart from its own
+  seen = set()
+  kept = []
+  for action in reversed(actions):
+    key = (action['id'], 'members' in action)
+    if (action['type'] != 'UPDATE_STATE') or (key not in seen):
+      kept.append(action)
+    seen.add(key)
+  kept.reverse()
+
+  merged = [] # (path, last stroke merged in it, nodes merged)
+  result = []
+
+  for action in kept:
+    previous = result[-1] if result else None
+
+    if (previous is not None) and _mergeable(previous, action):
+      if (not merged) or (merged[-1][0] is not previous):
+        commands, points, arcs = segments(previous)
+        path = {**previous, 'type': 'P', 'commands': [commands], 'points': points, 'arcs': arcs}
+        result[-1] = path
+        group = [previous['node']]
+        merged.append([path, previous, group])
+        scene.groups[previous['node']] = group
+
+      path, _, group = merged[-1]
+      commands, points, arcs = segments(action)
+      path['commands'].append(commands)
+      path['points'].extend(points)
+      path['arcs'].extend(arcs)
+      merged[-1][1] = action
+      # Grouped right away, a removal later in the frame takes the whole path
+      group.append(action['node'])
+      scene.groups[action['node']] = group
+    elif (action['type'] in ('RM', 'CLR')) and any(n in scene.groups for n in action.get('nodes') or ()):
+      result.extend(_ungroup(action, scene))
+    else:
+      result.append(action)
+
+  for path, last, _ in merged:
+    path.update({k: v for k, v in last.items() if k not in PATH_FIELDS})
+    path['commands'] = ''.join(path['commands'])
+
+  return result
+
+def _ungroup(action, scene):
+  """
+  A removal of grouped nodes, expanded to the whole paths they are merged
+  in, followed by the strokes left drawn on their own.
+  """
+  removed = set(action['nodes'])
+  nodes = list(action['nodes'])
+  survivors = []
+
+  for n in action['nodes']:
+    for member in scene.groups.get(n, ()):
+      scene.groups.pop(member, None)
+
+      if member not in removed:
+        removed.add(member)
+        nodes.append(member)
+
+        node = scene.nodes.get(member)
+        if node is not None:
+          survivors.append(_restore(node))
+
+  if not survivors:
+    return [{**action, 'nodes': nodes}]
+
+  # The strokes drawn again move the turtle, put it back where the removal leaves it
+  return [{**action, 'nodes': nodes}] + survivors + [{**action, 'type': 'M', 'node': None, 'nodes': []}]
+
+def _distance(px, py, ax, ay, bx, by):
+  # Distance from a point to the segment between a and b
+  dx, dy = bx - ax, by - ay
+  length = dx * dx + dy * dy
+
+  if length == 0:
+    return ((px - ax) ** 2 + (py - ay) ** 2) ** 0.5
+
+  t = max(0, min(1, ((px - ax) * dx + (py - ay) * dy) / length))
+
+  return ((px - ax - t * dx) ** 2 + (py - ay - t * dy) ** 2) ** 0.5
+
+def _douglas_peucker(points, first, last, tolerance, keep):
+  # Drop the vertices strictly between first and last closer than tolerance to the simplified line
+  stack = [(first, last)]
+
+  while stack:
+    lo, hi = stack.pop()
+    ax, ay, bx, by = points[2 * lo], points[2 * lo + 1], points[2 * hi], points[2 * hi + 1]
+    farthest, index = -1, lo
+
+    for i in range(lo + 1, hi):
+      d = _distance(points[2 * i], points[2 * i + 1], ax, ay, bx, by)
+      if d > farthest:
+        farthest, index = d, i
+
+    if farthest > tolerance:
+      stack.append((lo, index))
+      stack.append((index, hi))
+    else:
+      for i in range(lo + 1, hi):
+        keep[i] = 0
+
+def simplify_path(action, tolerance):
+  """
+  A path with the vertices of its runs of lines simplified by
+  Ramer-Douglas-Peucker within tolerance canvas pixels, and the number of
+  vertices dropped. Moves and arcs are kept, the action itself is not changed.
+  """
+  commands, points = action['commands'], action['points']
+  keep = bytearray(b'\x01') * len(commands)
+  i = 0
+
+  while i < len(commands):
+    if commands[i] != 'L':
+      i += 1
+      continue
+
+    j = i
+    while (j < len(commands)) and (commands[j] == 'L'):
+      j += 1
+
+    # A run of lines starts at the vertex before it, where the path starts otherwise
+    first = i - 1 if i > 0 else i
+    if j - 1 - first > 1:
+      _douglas_peucker(points, first, j - 1, tolerance, keep)
+
+    i = j
+
+  dropped = len(commands) - sum(keep)
+  if dropped == 0:
+    return action, 0
+
+  return {
+    **action,
+    'commands': ''.join(c for c, k in zip(commands, keep) if k),
+    'points': [p for i, p in enumerate(points) if keep[i // 2]],
+  }, dropped
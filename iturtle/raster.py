@@ -0,0 +1,307 @@
+"""
+Rasterize turtle actions to PNG in pure Python, for environments without a
+browser or imaging library. Lines, dots, arcs, paths and fills are drawn,
+text, stamps and images are left to the SVG renderer.
+"""
+
+import struct
+import zlib
+
+from .turtle import ActionType
+from math import atan2, ceil, cos, pi, sin, sqrt
+
+# Named colors understood by the rasterizer, others are drawn black
+COLORS = {
+  'black': (0, 0, 0), 'white': (255, 255, 255), 'red': (255, 0, 0), 'green': (0, 128, 0),
+  'blue': (0, 0, 255), 'yellow': (255, 255, 0), 'cyan': (0, 255, 255), 'magenta': (255, 0, 255),
+  'gray': (128, 128, 128), 'grey': (128, 128, 128), 'orange': (255, 165, 0), 'purple': (128, 0, 128),
+  'pink': (255, 192, 203), 'brown': (165, 42, 42), 'gold': (255, 215, 0), 'silver': (192, 192, 192),
+  'navy': (0, 0, 128), 'teal': (0, 128, 128), 'maroon': (128, 0, 0), 'olive': (128, 128, 0),
+  'lime': (0, 255, 0), 'aqua': (0, 255, 255), 'fuchsia': (255, 0, 255), 'violet': (238, 130, 238),
+  'indigo': (75, 0, 130), 'turquoise': (64, 224, 208), 'coral': (255, 127, 80), 'salmon': (250, 128, 114),
+  'skyblue': (135, 206, 235), 'darkgreen': (0, 100, 0), 'darkblue': (0, 0, 139), 'lightblue': (173, 216, 230),
+  'lightgreen': (144, 238, 144), 'lightgray': (211, 211, 211), 'darkgray': (169, 169, 169), 'tan': (210, 180, 140),
+}
+
+ARC_STEP = 4 # Pixels between the points an arc is flattened to
+
+def parse_color(color):
+  """
+  RGB tuple of a #rgb, #rrggbb, rgb(r, g, b) or named color.
+  """
+  color = (color or 'black').strip().lower()
+
+  if color.startswith('#'):
+    if len(color) == 4:
+      return tuple(int(c * 2, 16) for c in color[1:4])
+    return tuple(int(color[i:i + 2], 16) for i in (1, 3, 5))
+
+  if color.startswith('rgb(') and color.endswith(')'):
+    return tuple(int(float(c)) for c in color[4:-1].split(',')[:3])
+
+  return COLORS.get(color, (0, 0, 0))
+
+def arc_points(start, end, radius, large_arc, sweep):
+  """
+  Flatten an SVG arc from start to end into points, excluding start.
+  """
+  (x0, y0), (x1, y1) = start, end
+  hx, hy = (x0 - x1) / 2, (y0 - y1) / 2
+  half = hx * hx + hy * hy
+
+  if half == 0 or radius == 0:
+    return [end]
+
+  radius = max(radius, sqrt(half))
+  coef = sqrt(max(radius * radius - half, 0) / half)
+  if large_arc == sweep:
+    coef = -coef
+
+  cx, cy = coef * hy + (x0 + x1) / 2, -coef * hx + (y0 + y1) / 2
+  theta = atan2(y0 - cy, x0 - cx)
+  extent = atan2(y1 - cy, x1 - cx) - theta
+
+  if sweep and extent < 0:
+    extent += 2 * pi
+  elif not sweep and extent > 0:
+    extent -= 2 * pi
+
+  steps = max(int(ceil(abs(extent) * radius / ARC_STEP)), 1)
+
+  return [
+    (cx + radius * cos(theta + extent * i / steps), cy + radius * sin(theta + extent * i / steps))
+    for i in range(1, steps)
+  ] + [end]
+
+def outline_points(d):
+  """
+  Points of the M, L and A commands of a fill outline traced by the scene,
+  with arcs flattened.
+  """
+  tokens = d.split()
+  points = []
+  i = 0
+
+  while i < len(tokens):
+    c = tokens[i]
+    if (c in ('M', 'L')) or ((c == 'A') and (tokens[i + 2:i + 3] != ['0'])):
+      # Arcs of merged paths are traced by their end point only
+      points.append(tuple(float(v) for v in tokens[i + 1].split(',')))
+      i += 2
+    elif c == 'A':
+      r = float(tokens[i + 1].split(',')[0])
+      end = tuple(float(v) for v in tokens[i + 5].split(','))
+      points.extend(arc_points(points[-1], end, r, int(tokens[i + 3]), int(tokens[i + 4])))
+      i += 6
+    else:
+      i += 1
+
+  return points
+
+class Raster:
+  """
+  An RGB pixel buffer that turtle actions are drawn into.
+  """
+  def __init__(self, width, height, background='white'):
+    self.width = width
+    self.height = height
+    self.pixels = bytearray(bytes(parse_color(background)) * (width * height))
+
+    self._positions = {}
+    self._fills = {}
+
+    self._renderers = {
+      ActionType.MOVE_ABSOLUTE: self._move,
+      ActionType.LINE_ABSOLUTE: self._line,
+      ActionType.DRAW_DOT: self._dot,
+      ActionType.CIRCLE: self._circle,
+      ActionType.PATH: self._path,
+      ActionType.BEGIN_FILL: self._begin_fill,
+      ActionType.END_FILL: self._end_fill,
+      ActionType.REMOVE: self._place,
+    }
+
+  def draw(self, action):
+    renderer = self._renderers.get(action['type'])
+    if renderer is not None:
+      renderer(action)
+
+  def skip(self, action):
+    """
+    Follow the position of an action without drawing it.
+    """
+    if action['type'] in self._renderers and 'position' in action:
+      self._positions[action['id']] = action['position']
+
+  def _start(self, action):
+    # Strokes redrawn from the scene carry where they start
+    if action.get('start') is not None:
+      return action['start']
+
+    return self._positions.get(action['id'], (self.width / 2, self.height / 2))
+
+  def _extend_fill(self, action, points):
+    if action['fill_mode'] and action['id'] in self._fills:
+      self._fills[action['id']][1].extend(points)
+
+  def _place(self, action):
+    self._positions[action['id']] = action['position']
+
+  def _move(self, action):
+    self._extend_fill(action, [action['position']])
+    self._positions[action['id']] = action['position']
+
+  def _line(self, action):
+    if action['pen']:
+      self.polyline([self._start(action), action['position']], action['pensize'], parse_color(action['pencolor']))
+
+    self._move(action)
+
+  def _dot(self, action):
+    self.disc(action['position'], action['radius'], parse_color(action['pencolor']))
+
+  def _circle(self, action):
+    start = self._start(action)
+    points = arc_points(start, action['position'], action['radius'], action['large_arc'], action['clockwise'])
+
+    if action['pen']:
+      self.polyline([start] + points, action['pensize'], parse_color(action['pencolor']))
+
+    self._extend_fill(action, points)
+    self._positions[action['id']] = action['position']
+
+  def _path(self, action):
+    commands, points = action['commands'], action['points']
+    arcs = iter(action.get('arcs') or ())
+    color = parse_color(action['pencolor'])
+    stroke = [self._start(action)]
+    outline = []
+
+    for i, c in enumerate(commands):
+      point = (points[2 * i], points[2 * i + 1])
+
+      if c == 'M':
+        self.polyline(stroke, action['pensize'], color)
+        stroke = [point]
+        outline.append(point)
+      elif c == 'A':
+        # Arcs of merged strokes, see iturtle/optimize.py
+        flattened = arc_points(stroke[-1], point, next(arcs), next(arcs), next(arcs))
+        stroke.extend(flattened)
+        outline.extend(flattened)
+      else:
+        stroke.append(point)
+        outline.append(point)
+
+    self.polyline(stroke, action['pensize'], color)
+
+    self._extend_fill(action, outline)
+    self._positions[action['id']] = action['position']
+
+  def _begin_fill(self, action):
+    self._fills[action['id']] = (parse_color(action['color']), [self._start(action)])
+
+  def _end_fill(self, action):
+    if action.get('d'):
+      # The whole outline traced by the scene, as fills redrawn from it have no BEGIN_FILL
+      self._fills.pop(action['id'], None)
+      self.polygon(outline_points(action['d']), parse_color(action['color']))
+    elif action['id'] in self._fills:
+      color, points = self._fills.pop(action['id'])
+      self.polygon(points, color)
+
+  def _span(self, y, x0, x1, color):
+    if 0 <= y < self.height:
+      x0, x1 = max(x0, 0), min(x1, self.width - 1)
+      if x0 <= x1:
+        start = 3 * (y * self.width + x0)
+        self.pixels[start:start + 3 * (x1 - x0 + 1)] = bytes(color) * (x1 - x0 + 1)
+
+  def disc(self, center, radius, color):
+    cx, cy = center
+    radius = max(radius, 0.5)
+
+    for y in range(int(cy - radius), int(ceil(cy + radius)) + 1):
+      dy = y + 0.5 - cy
+      if abs(dy) <= radius:
+        dx = sqrt(radius * radius - dy * dy)
+        self._span(y, int(round(cx - dx)), int(round(cx + dx)) - 1, color)
+
+  def polyline(self, points, width, color):
+    """
+    Stroke a polyline with round caps and joins by stamping a brush along it.
+    """
+    if len(points) < 2:
+      return
+
+    radius = max(width / 2, 0.5)
+    brush = [
+      (dy, int(round(sqrt(radius * radius - dy * dy))))
+      for dy in range(-int(radius), int(radius) + 1) if dy * dy <= radius * radius
+    ]
+
+    for (x0, y0), (x1, y1) in zip(points, points[1:]):
+      steps = max(int(ceil(max(abs(x1 - x0), abs(y1 - y0)))), 1)
+
+      for i in range(steps + 1):
+        x = int(round(x0 + (x1 - x0) * i / steps))
+        y = int(round(y0 + (y1 - y0) * i / steps))
+
+        for dy, dx in brush:
+          self._span(y + dy, x - dx, x + dx, color)
+
+  def polygon(self, points, color):
+    """
+    Fill a polygon with the even-odd rule, one scanline at a time.
+    """
+    edges = [(p, q) for p, q in zip(points, points[1:] + points[:1]) if p[1] != q[1]]
+    if not edges:
+      return
+
+    top = max(int(min(p[1] for p in points)), 0)
+    bottom = min(int(ceil(max(p[1] for p in points))), self.height - 1)
+
+    for y in range(top, bottom + 1):
+      sy = y + 0.5
+      xs = sorted(
+        x0 + (sy - y0) * (x1 - x0) / (y1 - y0)
+        for (x0, y0), (x1, y1) in edges if (y0 <= sy < y1) or (y1 <= sy < y0)
+      )
+
+      for a, b in zip(xs[0::2], xs[1::2]):
+        self._span(y, int(round(a)), int(round(b)) - 1, color)
+
+  def to_png(self):
+    """
+    The buffer encoded as an 8-bit RGB PNG.
+    """
+    def chunk(kind, data):
+      return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    stride = 3 * self.width
+    rows = b''.join(b'\x00' + bytes(self.pixels[y * stride:(y + 1) * stride]) for y in range(self.height))
+
+    return b''.join([
+      b'\x89PNG\r\n\x1a\n',
+      chunk(b'IHDR', struct.pack('>IIBBBBB', self.width, self.height, 8, 2, 0, 0, 0)),
+      chunk(b'IDAT', zlib.compress(rows, 6)),
+      chunk(b'IEND', b''),
+    ])
+
+def rasterize(actions, width, height, background='white'):
+  """
+  Draw a list of actions into a new raster. Actions of a turtle before its
+  last clear, and those whose scene node was removed, are skipped, as pixels
+  cannot be erased per turtle.
+  """
+  cleared = {action['id']: i for i, action in enumerate(actions) if action['type'] == ActionType.CLEAR}
+  removed = {node for action in actions if action['type'] == ActionType.REMOVE for node in action['nodes']}
+  raster = Raster(width, height, background)
+
+  for i, action in enumerate(actions):
+    if (i < cleared.get(action['id'], -1)) or (action.get('node') in removed):
+      raster.skip(action)
+    else:
+      raster.draw(action)
+
+  return raster
@@ -0,0 +1,295 @@
+"""
+Render turtle actions to an SVG document in-process, the same way the
+frontend draws them into the widget canvas.
+"""
+
+import base64
+
+from .resources import RESOURCES
+from .screen import BUILTIN_SHAPES
+from .turtle import ActionType
+from xml.sax.saxutils import escape, quoteattr
+
+TURTLE_WIDTH = 20
+TURTLE_HEIGHT = 20
+
+# Built-in turtle shapes drawn in a 20x20 box, see src/shapes.tsx
+SHAPES = {
+  'arrow': '<path vector-effect="non-scaling-stroke" d="M1.12403 18.87L10 1.11803L18.876 18.87L10.226 14.4873L10 14.3728L9.77402 14.4873L1.12403 18.87Z"/>',
+  'triangle': '<path vector-effect="non-scaling-stroke" d="M10 0L20 17.23H0L10 0Z"/>',
+  'circle': '<circle vector-effect="non-scaling-stroke" cx="10" cy="10" r="10"/>',
+  'square': '<rect vector-effect="non-scaling-stroke" width="20" height="20"/>',
+  'turtle': ''.join(f'<path vector-effect="non-scaling-stroke" d="{d}"' + (f' fill="{fill}"/>' if fill else '/>') for d, fill in [
+    ('M16 0.248374C13.9097 0.248374 12.2153 1.9429 12.2153 4.03313L12.2153 7.81788C12.2153 9.90811 13.9097 11.6026 16 11.6026 18.0904 11.6026 19.7848 9.90811 19.7848 7.81788L19.7848 4.03313C19.7848 1.9429 18.0903 0.248374 16 0.248374Z', '#9DD7F5'),
+    ('M16 0.248374C13.9097 0.248374 12.2153 1.9429 12.2153 4.03313L12.2153 7.81788C12.2153 9.90811 13.9097 11.6026 16 11.6026 18.0904 11.6026 19.7848 9.90811 19.7848 7.81788L19.7848 4.03313C19.7848 1.9429 18.0903 0.248374 16 0.248374Z', '#78B9EB'),
+    ('M19.7848 7.81788C19.7848 9.90811 18.0904 11.6026 16 11.6026L16 11.6026C16 7.9125 16 4.03313 16 0.248374L16 0.248374C18.0904 0.248374 19.7848 1.9429 19.7848 4.03313L19.7848 7.81788Z', '#9DD7F5'),
+    ('M10.3323 11.6026 5.67713 11.6026C2.54165 11.6026 0 14.1444 0 17.2798L10.3323 17.2798 10.3323 11.6026Z', '#9DD7F5'),
+    ('M10.5874 20.1183 7.7139 23.7808C5.77856 26.2476 6.20946 29.8163 8.67617 31.7516L15.0539 23.6225 10.5874 20.1183Z', '#78B9EB'),
+    ('M21.4127 20.1183 24.2862 23.7808C26.2215 26.2476 25.7906 29.8163 23.3239 31.7516L16.9462 23.6226 21.4127 20.1183Z', '#78B9EB'),
+    ('M21.6677 11.6026 26.3229 11.6026C29.4583 11.6026 32 14.1444 32 17.2798L21.6677 17.2798 21.6677 11.6026Z', '#FF9811'),
+    ('M16.0037 17.2798 22.6782 8.09417C20.8046 6.73052 18.4984 5.92532 16.0037 5.92532 13.5091 5.92532 11.2029 6.73052 9.32932 8.09417L16.0037 17.2798Z', '#FF5023'),
+    ('M16.0037 17.2798 22.6782 8.09417C20.8046 6.73052 18.4984 5.92532 16.0037 5.92532 16.0037 9.71026 16.0037 17.2798 16.0037 17.2798Z', '#FF5023'),
+    ('M16.0037 17.2798 9.33008 8.09351C7.45417 9.45384 5.97575 11.3985 5.20489 13.771 4.43412 16.1436 4.48711 18.5858 5.20508 20.789L16.0037 17.2798Z', '#FF9811'),
+    ('M16.0037 17.2821 16.0037 17.2798 16 17.281 15.9964 17.2798 15.9964 17.2821 5.20498 20.788C5.91907 22.9923 7.31167 24.9994 9.3298 26.4657 11.3456 27.9302 13.6812 28.6343 15.9957 28.6341L15.9957 28.6342C15.9972 28.6342 15.9985 28.6341 16 28.6341 16.0016 28.6341 16.0029 28.6342 16.0044 28.6342L16.0044 28.6341C18.3189 28.6343 20.6546 27.9302 22.6703 26.4657 24.6884 24.9994 26.081 22.9923 26.7951 20.788L16.0037 17.2821Z', '#D80027'),
+    ('M16.0037 17.2798 16.0032 28.6341C18.3203 28.6361 20.6596 27.932 22.6777 26.4657 24.696 24.9993 26.0884 22.9923 26.8028 20.7879L16.0037 17.2798Z', '#802812'),
+    ('M16.0037 17.2798 26.8023 20.7891C27.5203 18.5858 27.5733 16.1435 26.8023 13.7711 26.0315 11.3984 24.5532 9.45403 22.6772 8.09341L16.0037 17.2798Z', '#FFDA44'),
+    ('M19.6188 12.3061 21.8529 19.1825 16.0037 23.4322 10.1544 19.1825 12.3887 12.3061Z', '#FF9811'),
+    ('M19.6188 12.3061 21.8529 19.1825 16.0037 23.4322 16 12.3061Z', None),
+  ]),
+}
+SHAPES[''] = SHAPES['turtle']
+
+TEXT_ANCHORS = {'left': 'start', 'center': 'middle', 'right': 'end'}
+
+def _num(value):
+  return f'{value:.2f}'.rstrip('0').rstrip('.')
+
+def _point(position):
+  return f'{_num(position[0])},{_num(position[1])}'
+
+def _path_commands(action):
+  commands, points = action['commands'], action['points']
+  arcs = iter(action.get('arcs') or ())
+  parts = []
+
+  for i, c in enumerate(commands):
+    if c == 'A':
+      # Arcs of merged strokes, see iturtle/optimize.py
+      r, large_arc, sweep = _num(next(arcs)), int(next(arcs)), int(next(arcs))
+      parts.append(f'A {r},{r} 0 {large_arc} {sweep} {_num(points[2 * i])},{_num(points[2 * i + 1])}')
+    else:
+      parts.append(f'{c} {_num(points[2 * i])},{_num(points[2 * i + 1])}')
+
+  return ' '.join(parts)
+
+def _arc_command(action):
+  r = _num(action['radius'])
+
+  return f'A {r},{r} 0 {action["large_arc"]} {action["clockwise"]} {_point(action["position"])}'
+
+class SVGRenderer:
+  """
+  Materialize a stream of turtle actions into an SVG document.
+
+  Lines, dots, arcs, paths and fills are drawn beneath stamps and text, and
+  visible turtles are drawn on top, like the widget canvas.
+  """
+  def __init__(self, width, height, background='white'):
+    self.width = width
+    self.height = height
+    self.background = background
+    self.bgurl = ''
+    self.resources = {} # Loaded images by name, as (type, ext, buffer)
+
+    self._drawings = [] # (turtle id, scene node, markup)
+    self._stamps = []
+    self._turtles = {} # Last action of every turtle
+    self._positions = {}
+    self._fills = {}
+
+    self._renderers = {
+      ActionType.MOVE_ABSOLUTE: self._move,
+      ActionType.LINE_ABSOLUTE: self._line,
+      ActionType.DRAW_DOT: self._dot,
+      ActionType.WRITE_TEXT: self._text,
+      ActionType.CIRCLE: self._circle,
+      ActionType.PATH: self._path,
+      ActionType.CLEAR: self._clear,
+      ActionType.REMOVE: self._remove,
+      ActionType.STAMP: self._stamp,
+      ActionType.BEGIN_FILL: self._begin_fill,
+      ActionType.END_FILL: self._end_fill,
+    }
+
+  def load(self, name, entry):
+    """
+    Embed an image resource, shown where its name is used as a shape or background.
+    """
+    if entry['type'] == 'image':
+      # SVG images are embedded as data URLs too
+      ext = 'svg+xml' if entry['ext'] == 'svg' else entry['ext']
+      self.resources[name] = ('image', ext, base64.b64encode(entry['buffer']).decode('ascii'))
+
+  def draw(self, action):
+    self._turtles[action['id']] = action
+
+    renderer = self._renderers.get(action['type'])
+    if renderer is not None:
+      renderer(action)
+
+  def _start(self, action):
+    # Strokes redrawn from the scene carry where they start
+    if action.get('start') is not None:
+      return action['start']
+
+    return self._positions.get(action['id'], (self.width / 2, self.height / 2))
+
+  def _extend_fill(self, action, command):
+    if action['fill_mode'] and action['id'] in self._fills:
+      self._fills[action['id']][1].append(command)
+
+  def _move(self, action):
+    self._extend_fill(action, f'L {_point(action["position"])}')
+    self._positions[action['id']] = action['position']
+
+  def _line(self, action):
+    if action['pen']:
+      start = self._start(action)
+      end = action['position']
+
+      self._drawings.append((action['id'], action.get('node'),
+        f'<line x1="{_num(start[0])}" y1="{_num(start[1])}" x2="{_num(end[0])}" y2="{_num(end[1])}" '
+        f'stroke-linecap="round" stroke-width="{_num(action["pensize"])}" stroke={quoteattr(action["pencolor"])}/>'))
+
+    self._move(action)
+
+  def _dot(self, action):
+    color = quoteattr(action['pencolor'])
+
+    self._drawings.append((action['id'], action.get('node'),
+      f'<circle cx="{_num(action["position"][0])}" cy="{_num(action["position"][1])}" r="{_num(action["radius"])}" '
+      f'stroke={color} stroke-width="1" fill={color}/>'))
+
+  def _circle(self, action):
+    arc = _arc_command(action)
+
+    if action['pen']:
+      self._drawings.append((action['id'], action.get('node'),
+        f'<path d="M {_point(self._start(action))} {arc}" stroke={quoteattr(action["pencolor"])} '
+        f'stroke-width="{_num(action["pensize"])}" fill="none"/>'))
+
+    self._extend_fill(action, arc)
+    self._positions[action['id']] = action['position']
+
+  def _path(self, action):
+    commands = _path_commands(action)
+
+    self._drawings.append((action['id'], action.get('node'),
+      f'<path d="M {_point(self._start(action))} {commands}" stroke={quoteattr(action["pencolor"])} '
+      f'stroke-width="{_num(action["pensize"])}" stroke-linecap="round" stroke-linejoin="round" fill="none"/>'))
+
+    self._extend_fill(action, commands)
+    self._positions[action['id']] = action['position']
+
+  def _text(self, action):
+    family, size, weight = action.get('font', ('Arial', 8, 'normal'))
+    anchor = TEXT_ANCHORS.get(action.get('align', 'left'), 'start')
+
+    self._stamps.append((action['id'], action.get('node'),
+      f'<text x="{_num(action["position"][0])}" y="{_num(action["position"][1])}" text-anchor="{anchor}" '
+      f'font-family={quoteattr(str(family))} font-size="{size}" font-style={quoteattr(str(weight))} '
+      f'fill={quoteattr(action["pencolor"])}>{escape(action.get("text", ""))}</text>'))
+
+  def _stamp(self, action):
+    self._stamps.append((action['id'], action.get('node'), self._shape(action)))
+
+  def _clear(self, action):
+    self._drawings = [item for item in self._drawings if item[0] != action['id']]
+    self._stamps = [item for item in self._stamps if item[0] != action['id']]
+
+  def _remove(self, action):
+    nodes = set(action['nodes'])
+
+    self._drawings = [item for item in self._drawings if item[1] not in nodes]
+    self._stamps = [item for item in self._stamps if item[1] not in nodes]
+    self._positions[action['id']] = action['position']
+
+  def _begin_fill(self, action):
+    self._fills[action['id']] = (action['color'], [f'M {_point(self._start(action))}'])
+
+  def _end_fill(self, action):
+    if action.get('d'):
+      # The whole outline traced by the scene
+      self._fills.pop(action['id'], None)
+      self._drawings.append((action['id'], action.get('node'),
+        f'<path d="{action["d"]}" fill={quoteattr(action["color"] or "black")} stroke="none"/>'))
+    elif action['id'] in self._fills:
+      color, commands = self._fills.pop(action['id'])
+
+      self._drawings.append((action['id'], action.get('node'),
+        f'<path d="{" ".join(commands)} Z" fill={quoteattr(color or "black")} stroke="none"/>'))
+
+  def _shape(self, action):
+    """
+    Markup of the turtle shape of an action, placed like src/shapes.tsx does.
+    """
+    shape = action['shape'] or ''
+    sx, sy = action['penstretchfactor']
+    width, height = TURTLE_WIDTH * sx, TURTLE_HEIGHT * sy
+    heading = (-action['heading'] + 90) % 360
+
+    if shape in SHAPES:
+      half_width, half_height = int(width / 2), int(height / 2)
+      if shape in ['', 'turtle']:
+        half_width, half_height = half_width * 1.45, half_height * 1.45
+
+      inner = SHAPES[shape]
+    elif shape.startswith('https://') or shape.startswith('http://'):
+      half_width, half_height = width / 2, height / 2
+      inner = f'<image href={quoteattr(shape)}/>'
+    elif shape in self.resources:
+      _type, ext, buffer = self.resources[shape]
+      half_width, half_height = width / 2, height / 2
+      inner = f'<image href="data:{_type}/{ext};base64,{buffer}" width="{_num(width)}" height="{_num(height)}"/>'
+    else:
+      return ''
+
+    transform = (f'translate({_num(-half_width)} {_num(-half_height)}) '
+      f'rotate({_num(heading)} {_num(half_width)} {_num(half_height)}) scale({_num(sx)} {_num(sy)})')
+
+    return (f'<svg x="{_num(action["position"][0])}" y="{_num(action["position"][1])}" '
+      f'width="{_num(width)}" height="{_num(height)}" overflow="visible" stroke={quoteattr(action["pencolor"])} '
+      f'stroke-width="{_num(action["penoutlinewidth"])}" fill={quoteattr(action["color"])}>'
+      f'<g transform="{transform}">{inner}</g></svg>')
+
+  def drawings(self):
+    """
+    The markup of every line, dot, arc, path and fill drawn so far, with its scene node.
+    """
+    return [(node, markup) for _, node, markup in self._drawings]
+
+  def to_svg(self, turtles=True):
+    """
+    The SVG document of everything drawn so far, with the visible turtles on top
+    unless turtles is False.
+    """
+    parts = [
+      f'<svg xmlns="http://www.w3.org/2000/svg" width="{self.width}" height="{self.height}" '
+      f'viewBox="0 0 {self.width + 1} {self.height + 1}">',
+      f'<rect width="100%" height="100%" fill={quoteattr(self.background)}/>',
+    ]
+
+    if self.bgurl in self.resources:
+      _type, ext, buffer = self.resources[self.bgurl]
+      parts.append(f'<image href="data:{_type}/{ext};base64,{buffer}" width="{self.width}"/>')
+    elif self.bgurl:
+      parts.append(f'<image href={quoteattr(self.bgurl)} width="{self.width}"/>')
+
+    parts.extend(markup for *_, markup in self._drawings)
+    parts.extend(markup for *_, markup in self._stamps)
+
+    if turtles:
+      parts.extend(self._shape(action) for action in self._turtles.values() if action['show'])
+
+    parts.append('</svg>')
+
+    return '\n'.join(parts)
+
+def render_scene(screen, turtles=True):
+  """
+  The SVG document of what a screen shows, drawn from its scene with the
+  images of its shapes and background, with visible turtles unless turtles
+  is False.
+  """
+  renderer = SVGRenderer(screen.width, screen.height, screen.background)
+  renderer.bgurl = screen.bgUrl
+
+  for name in screen.scene.shapes(BUILTIN_SHAPES) + ([screen.bgUrl] if screen.bgUrl else []):
+    if not (name.startswith('http://') or name.startswith('https://')):
+      renderer.load(name, RESOURCES.get(name))
+
+  # Members of swarms are drawn one by one, with the sprites of other turtles
+  for action in screen.scene.replay(members=turtles):
+    renderer.draw(action)
+
+  return renderer.to_svg(turtles)
@@ -0,0 +1,203 @@
+"""
+Process-wide cache of media resources, addressed by content hash.
+
+Files are read once per content, whichever screen loads them, and sent to
+the frontend as raw binary buffers. A hash the frontend has already received
+is sent without its buffer.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+IMAGE_EXTS = ['bmp', 'gif', 'ico‌', 'jpg', 'png', 'svg']
+VIDEO_EXTS = ['mp4', 'webm']
+AUDIO_EXTS = ['aac', 'm4a', 'mp3', 'wav']
+
+CACHE_BYTES = 256 * 1024 * 1024
+MMAP_BYTES = 1024 * 1024 # Larger files are memory-mapped instead of read
+CHUNK_BYTES = 1024 * 1024 # Larger resources are streamed in chunks of this size
+
+# Shared by all screens for reading and uploading resources in the background
+EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix='iturtle-resources')
+
+def shutdown():
+  """
+  Stop the threads reading and uploading resources once their work is done.
+  A new pool takes over, its threads are only started by the next load.
+  """
+  global EXECUTOR
+
+  executor, EXECUTOR = EXECUTOR, ThreadPoolExecutor(max_workers=4, thread_name_prefix='iturtle-resources')
+  executor.shutdown(wait=True)
+
+def map_file(file_path):
+  """
+  The content of a file as a buffer, memory-mapped for large files so that it
+  is paged in as it is hashed and sent rather than copied.
+  """
+  with open(file_path, 'rb') as f:
+    size = os.fstat(f.fileno()).st_size
+
+    if size < MMAP_BYTES:
+      return f.read()
+
+    # The mapping stays valid after the file is closed
+    return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+def resource_type(file_path):
+  ext = file_path.split('.')[-1].lower()
+
+  if ext in IMAGE_EXTS:
+    return 'image', ext
+  elif ext in VIDEO_EXTS:
+    return 'video', ext
+  elif ext in AUDIO_EXTS:
+    return 'audio', ext
+  else:
+    raise Exception(f'Unknown resource type for {file_path}')
+
+class ResourceCache:
+  """
+  Resources by content hash, evicting the least recently used ones
+  beyond max_bytes. Files are re-read when their modification time or size
+  changes. Memory-mapped files are checked before their entry is found, a
+  mapping of a file that shrank cannot be read.
+  """
+  def __init__(self, max_bytes=CACHE_BYTES):
+    self.max_bytes = max_bytes
+    self.size = 0
+    self.sent = set() # Hashes the frontend has received a buffer for
+
+    self._entries = OrderedDict() # hash -> {type, ext, hash, buffer}
+    self._files = {} # path -> (mtime, size, hash)
+    self._mapped = {} # hash -> (path, mtime, size) of memory-mapped entries
+    self._lock = threading.Lock()
+
+  def get(self, file_path, reload=False):
+    """
+    The cached resource of a file, read again if the file changed or reload.
+    """
+    stat = os.stat(file_path)
+    version = (stat.st_mtime_ns, stat.st_size)
+
+    with self._lock:
+      known = self._files.get(file_path)
+
+      if (not reload) and known and (known[:2] == version) and (known[2] in self._entries):
+        self._entries.move_to_end(known[2])
+
+        return self._entries[known[2]]
+
+    _type, ext = resource_type(file_path)
+    data = map_file(file_path)
+    digest = hashlib.sha1(ext.encode() + b':')
+    digest.update(data)
+    _hash = digest.hexdigest()
+
+    with self._lock:
+      # A file mapped before it changed must not be read anymore
+      if known and (known[2] != _hash) and (known[2] in self._mapped):
+        self._drop(known[2])
+
+      entry = self._entries.get(_hash)
+
+      if entry is None:
+        entry = {'type': _type, 'ext': ext, 'hash': _hash, 'buffer': data}
+        self._entries[_hash] = entry
+        if isinstance(data, memoryview):
+          self._mapped[_hash] = (file_path,) + version
+        self.size += len(data)
+        self._evict()
+
+      self._entries.move_to_end(_hash)
+      self._files[file_path] = version + (_hash,)
+
+    return entry
+
+  def put(self, data, _type, ext, **fields):
+    """
+    Cache generated content, such as an atlas sheet, with extra fields sent
+    along with it. The fields are part of the hash.
+    """
+    digest = hashlib.sha1(ext.encode() + b':')
+    digest.update(data)
+    digest.update(json.dumps(fields, sort_keys=True).encode())
+    _hash = digest.hexdigest()
+
+    with self._lock:
+      entry = self._entries.get(_hash)
+
+      if entry is None:
+        entry = {'type': _type, 'ext': ext, 'hash': _hash, 'buffer': data, **fields}
+        self._entries[_hash] = entry
+        self.size += len(data)
+        self._evict()
+
+      self._entries.move_to_end(_hash)
+
+    return entry
+
+  def find(self, _hash):
+    with self._lock:
+      mapped = self._mapped.get(_hash)
+
+      if mapped is not None:
+        try:
+          stat = os.stat(mapped[0])
+          changed = (stat.st_mtime_ns, stat.st_size) != mapped[1:]
+        except OSError:
+          changed = True
+
+        if changed:
+          self._drop(_hash)
+
+      return self._entries.get(_hash)
+
+  def _drop(self, _hash):
+    self.size -= len(self._entries.pop(_hash)['buffer'])
+    self._mapped.pop(_hash, None)
+
+  def _evict(self):
+    # The most recent entry is kept even when it is larger than the cache
+    while (self.size > self.max_bytes) and (len(self._entries) > 1):
+      self._drop(next(iter(self._entries)))
+
+RESOURCES = ResourceCache()
+
+def gather(futures):
+  """
+  A future of the results of all futures, or of the first exception raised.
+  """
+  combined = Future()
+  results = [None] * len(futures)
+  remaining = [len(futures)]
+  lock = threading.Lock()
+
+  def done(index, future):
+    with lock:
+      if combined.done():
+        return
+
+      if future.exception() is not None:
+        combined.set_exception(future.exception())
+        return
+
+      results[index] = future.result()
+      remaining[0] -= 1
+
+      if remaining[0] == 0:
+        combined.set_result(results)
+
+  if not futures:
+    combined.set_result([])
+
+  for index, future in enumerate(futures):
+    future.add_done_callback(lambda f, index=index: done(index, f))
+
+  return combined
@@ -0,0 +1,374 @@
+"""
+Retained scene graph of what is drawn on a screen.
+
+Every stroke, dot, fill, text and stamp becomes a node with an id when its
+action is added. Drawing actions carry the id of the node they insert, and
+removals are sent as the ids of the nodes they drop, so the frontend keeps
+a node to element map instead of searching the canvas. The kernel can then
+clear single stamps, undo, redraw a view from scratch and answer queries
+about what is drawn without asking the browser.
+"""
+
+from array import array
+from itertools import count
+from .optimize import PATH_FIELDS, segments
+
+# Node kind of every action type that draws something, see ActionType in turtle.py
+KINDS = {'L': 'line', 'D': 'dot', 'C': 'arc', 'P': 'path', 'END_FILL': 'fill', 'W': 'text', 'STAMP': 'stamp'}
+STAMP_SIZE = 20 # Width and height of an unstretched turtle shape
+
+def _point(position):
+  return f'{position[0]},{position[1]}'
+
+class Scene:
+  """
+  Nodes of all turtles of a screen in drawing order, and of every turtle on
+  its own layer. Node ids are assigned as actions are added, while the state
+  of what is shown follows the frames published.
+  """
+  def __init__(self):
+    self.nodes = {} # node id -> node, in drawing order
+    self.layers = {} # turtle id -> node ids of the turtle, in drawing order
+    self.stamps = {} # stamp id -> node id
+    self.turtles = {} # turtle id -> last action shown
+    self.groups = {} # node id -> node ids merged in one path when shown, see optimize.py
+    self.swarms = {} # swarm id -> [state shown of all members, float32 canvas x, y and heading of every member]
+
+    self._ids = count(1)
+    self._latest = {} # turtle id -> last action added
+    self._shown = {} # turtle id -> last node shown
+    self._fills = {} # turtle id -> (path commands, points) of the fill in progress
+
+  def __len__(self):
+    return len(self.nodes)
+
+  def add(self, action):
+    """
+    Track an action, tagging it with the node it draws or the nodes it removes.
+    """
+    _id, _type = action['id'], action['type']
+    previous = self._latest.get(_id)
+    self._latest[_id] = action
+    action['node'] = None
+
+    if _type == 'CLR':
+      self._fills.pop(_id, None)
+      action['nodes'] = self._remove(list(self.layers.pop(_id, {})))
+      return
+    elif _type == 'RM':
+      action['nodes'] = self._remove(action.get('nodes', []))
+      return
+
+    start = previous.get('position') if previous else None
+    fill = self._trace_fill(action, start)
+
+    kind = KINDS.get(_type)
+    if (kind is None) or ((_type in ('L', 'C')) and (not action.get('pen'))) or ((kind == 'text') and ('text' not in action)):
+      return
+
+    if kind == 'fill':
+      if fill is None:
+        return
+      action['d'] = ' '.join(fill[0]) + ' Z'
+
+    node = {
+      'node': next(self._ids),
+      'turtle': _id,
+      'kind': kind,
+      'action': action,
+      'start': start,
+      'points': fill[1] if kind == 'fill' else None,
+      # Where the turtle was before drawing, restored by undo
+      'before': (previous.get('position'), previous.get('heading')) if start else None,
+    }
+
+    action['node'] = node['node']
+    self.nodes[node['node']] = node
+    self.layers.setdefault(_id, {})[node['node']] = None
+
+    if action.get('stampid'):
+      self.stamps[action['stampid']] = node['node']
+
+  def _trace_fill(self, action, start):
+    # Outline of the fill in progress, drawn as one node when the fill ends
+    _id, _type = action['id'], action['type']
+
+    if _type == 'BEGIN_FILL':
+      self._fills[_id] = ([f'M {_point(start or action["position"])}'], [start or action['position']])
+    elif _type == 'END_FILL':
+      return self._fills.pop(_id, None)
+    elif action.get('fill_mode') and (_id in self._fills):
+      commands, points = self._fills[_id]
+
+      if _type in ('M', 'L'):
+        commands.append(f'L {_point(action["position"])}')
+        points.append(action['position'])
+      elif _type == 'C':
+        r = action['radius']
+        commands.append(f'A {r},{r} 0 {action["large_arc"]} {action["clockwise"]} {_point(action["position"])}')
+        points.append(action['position'])
+      elif _type == 'P':
+        _points = action['points']
+        commands.extend(f'{c} {_points[2 * i]},{_points[2 * i + 1]}' for i, c in enumerate(action['commands']))
+        points.extend((_points[2 * i], _points[2 * i + 1]) for i in range(len(action['commands'])))
+
+    return None
+
+  def _remove(self, nodes):
+    removed = []
+
+    for n in nodes:
+      node = self.nodes.pop(n, None)
+      if node is None:
+        continue
+
+      self.layers.get(node['turtle'], {}).pop(n, None)
+      if node['action'].get('stampid'):
+        self.stamps.pop(node['action']['stampid'], None)
+      removed.append(n)
+
+    return removed
+
+  def show(self, actions):
+    """
+    Record the actions of a published frame as shown.
+    """
+    for action in actions:
+      if 'members' in action:
+        self._show_swarm(action)
+        continue
+
+      self.turtles[action['id']] = action
+
+      if action.get('node'):
+        self._shown[action['id']] = action['node']
+
+  def _show_swarm(self, action):
+    # Members keep where they are when the state they share changes
+    swarm = self.swarms.get(action['id'])
+    if (swarm is None) or (len(swarm[1]) != 3 * action['members']):
+      x, y = action['position']
+      self.swarms[action['id']] = [action, array('f', (x, y, action['heading'])) * action['members']]
+    else:
+      swarm[0] = action
+
+  def place_members(self, swarm, values):
+    """
+    Record the members of a swarm moved, values holding the float32 canvas x,
+    y and heading of every member, and return them, or None for a swarm never
+    shown.
+    """
+    if swarm not in self.swarms:
+      return None
+
+    self.swarms[swarm][1] = values
+
+    return values
+
+  def members(self, swarm):
+    """
+    The state of every member of a swarm as a turtle action.
+    """
+    state, values = self.swarms[swarm]
+    state = {k: v for k, v in state.items() if k != 'members'}
+
+    return [
+      {**state, 'id': f'{swarm}:{i}', 'type': 'M', 'node': None, 'position': (values[3 * i], values[3 * i + 1]), 'heading': values[3 * i + 2]}
+      for i in range(len(values) // 3)
+    ]
+
+  def place(self, turtle, position, heading=None):
+    """
+    Record a turtle moved without an action, and return its new state, or
+    None for a turtle never shown.
+    """
+    action = self.turtles.get(turtle)
+    if action is None:
+      return None
+
+    action = {**action, 'type': 'UPDATE_STATE', 'node': None, 'position': position}
+    if heading is not None:
+      action['heading'] = heading
+
+    self.turtles[turtle] = action
+    if turtle in self._latest:
+      self._latest[turtle] = {**self._latest[turtle], 'position': position, 'heading': action['heading']}
+
+    return action
+
+  def last(self, turtle):
+    """
+    The last node drawn by a turtle, or None.
+    """
+    layer = self.layers.get(turtle)
+    if not layer:
+      return None
+
+    return self.nodes.get(next(reversed(layer)))
+
+  def items(self, turtle=None, kind=None):
+    """
+    Nodes in drawing order, of one turtle and of one kind when given.
+    """
+    if turtle is None:
+      nodes = list(self.nodes.values())
+    else:
+      nodes = [self.nodes[n] for n in list(self.layers.get(turtle, {})) if n in self.nodes]
+
+    return [node for node in nodes if (kind is None) or (node['kind'] == kind)]
+
+  def shapes(self, exclude=()):
+    """
+    Names of the shapes of the stamps and turtles shown, but those in exclude.
+    """
+    shapes = [node['action'].get('shape') for node in self.items(kind='stamp')]
+    shapes.extend(action.get('shape') for action in list(self.turtles.values()))
+    shapes.extend(state.get('shape') for state, _ in list(self.swarms.values()))
+
+    return [shape for shape in dict.fromkeys(shapes) if (shape is not None) and (shape not in exclude)]
+
+  def bbox(self, turtle=None):
+    """
+    The (left, top, right, bottom) canvas box around the items drawn, of one
+    turtle when given, or None when nothing is drawn. Stroke widths and text
+    extents are not included.
+    """
+    # Raster imports turtle, which imports this module through screen
+    from .raster import arc_points
+
+    points = []
+
+    for node in self.items(turtle):
+      action, start = node['action'], node['start']
+      kind = node['kind']
+
+      if kind == 'line':
+        points.extend(p for p in (start, action['position']) if p)
+      elif kind == 'arc':
+        if start:
+          points.append(start)
+          points.extend(arc_points(start, action['position'], action['radius'], action['large_arc'], action['clockwise']))
+        else:
+          points.append(action['position'])
+      elif kind == 'path':
+        _points = action['points']
+        points.extend(p for p in [start] if p)
+        points.extend((_points[i], _points[i + 1]) for i in range(0, len(_points) - 1, 2))
+      elif kind == 'fill':
+        points.extend(node['points'])
+      elif kind in ('dot', 'stamp'):
+        x, y = action['position']
+        if kind == 'dot':
+          rx = ry = action['radius']
+        else:
+          sx, sy = action['penstretchfactor']
+          rx, ry = STAMP_SIZE * abs(sx) / 2, STAMP_SIZE * abs(sy) / 2
+        points.extend(((x - rx, y - ry), (x + rx, y + ry)))
+      else:
+        points.append(action['position'])
+
+    if not points:
+      return None
+
+    xs, ys = [p[0] for p in points], [p[1] for p in points]
+
+    return min(xs), min(ys), max(xs), max(ys)
+
+  def snapshot(self):
+    """
+    The nodes shown and the state of every turtle, as plain data that can be
+    stored as JSON and restored into another scene.
+    """
+    shown = dict(self._shown)
+    nodes = [node for node in list(self.nodes.values()) if node['node'] <= shown.get(node['turtle'], 0)]
+    groups = {id(group): group for group in list(self.groups.values())}
+
+    return {
+      'nodes': [dict(node) for node in nodes],
+      'turtles': list(self.turtles.values()),
+      'groups': [list(group) for group in groups.values()],
+      'swarms': [[state, values.tolist()] for state, values in list(self.swarms.values())],
+    }
+
+  def restore(self, snapshot):
+    """
+    Replace the scene with a snapshot, everything in it is shown.
+    """
+    self.__init__()
+
+    for node in snapshot['nodes']:
+      node = {**node, 'action': dict(node['action'])}
+      self.nodes[node['node']] = node
+      self.layers.setdefault(node['turtle'], {})[node['node']] = None
+      self._shown[node['turtle']] = node['node']
+
+      if node['action'].get('stampid'):
+        self.stamps[node['action']['stampid']] = node['node']
+
+    for action in snapshot['turtles']:
+      self.turtles[action['id']] = self._latest[action['id']] = dict(action)
+
+    for state, values in snapshot.get('swarms', []):
+      self.swarms[state['id']] = [dict(state), array('f', values)]
+
+    for group in snapshot['groups']:
+      group = [n for n in group if n in self.nodes]
+      for n in group:
+        self.groups[n] = group
+
+    self._ids = count(max(self.nodes, default=0) + 1)
+
+  def replay(self, merge=True, members=False):
+    """
+    Actions redrawing what is shown into an empty view: the nodes shown, each
+    with the position it starts from, then every turtle moved to where it is.
+    Strokes merged when shown are replayed as one path unless merge is False.
+    Swarms are replayed as the state shared by their members, whose sprites
+    are moved by transforms, or as every member when members is True.
+    """
+    shown = dict(self._shown)
+    actions = []
+    paths = [] # (path, last stroke merged in it)
+    group = None # Nodes of the path in actions[-1]
+
+    for node in list(self.nodes.values()):
+      if node['node'] > shown.get(node['turtle'], 0):
+        continue
+
+      grouped = self.groups.get(node['node']) if merge else None
+
+      # Strokes merged in one path when shown are replayed merged in the same way
+      if (grouped is not None) and (grouped is group):
+        commands, points, arcs = segments(node['action'])
+        path = actions[-1]
+        path['commands'].append(commands)
+        path['points'].extend(points)
+        path['arcs'].extend(arcs)
+        paths[-1][1] = node['action']
+        continue
+
+      action = dict(node['action'])
+      if node['start'] is not None:
+        action['start'] = node['start']
+
+      if grouped is not None:
+        commands, points, arcs = segments(node['action'])
+        action.update({'type': 'P', 'commands': [commands], 'points': points, 'arcs': arcs})
+        paths.append([action, node['action']])
+
+      group = grouped
+      actions.append(action)
+
+    for path, last in paths:
+      path.update({k: v for k, v in last.items() if k not in PATH_FIELDS})
+      path['commands'] = ''.join(path['commands'])
+
+    actions.extend({**action, 'type': 'M', 'node': None} for action in list(self.turtles.values()))
+
+    for swarm, (state, _) in list(self.swarms.items()):
+      if members:
+        actions.extend(self.members(swarm))
+      else:
+        actions.append({**state, 'type': 'M', 'node': None})
+
+    return actions
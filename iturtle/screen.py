@@ -1,9 +1,20 @@
-import base64
+import sys
 import threading
 import time
 import uuid
+import weakref
 
+from array import array
+from collections import deque
+from concurrent.futures import Future
+from .codec import ENCODINGS, DeltaEncoder, pack_actions, pack_transforms
 from .frontend import MODULE_NAME, MODULE_VERSION
+from .metrics import Metrics, payload_size
+from .optimize import merge_strokes, simplify_path
+from . import resources
+from .atlas import build_atlas
+from .resources import AUDIO_EXTS, IMAGE_EXTS, RESOURCES, VIDEO_EXTS, gather
+from .scene import Scene
 from .utils import build_color, decode_color
 from IPython.display import clear_output, display
 from ipywidgets import DOMWidget
@@ -13,12 +24,49 @@ SCREEN_FRAMERATE = 15
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 500
 DELAY = 2
+MAX_FRAME_ACTIONS = 10000 # Larger backlogs are spread over the following frames
+MAX_INFLIGHT_FRAMES = 2 # Frames sent but not yet acknowledged by the frontend
+ACK_TIMEOUT = 1.0 # Seconds before an unacknowledged frame is considered lost
+LATENCY_SMOOTHING = 0.2
+DISPLAY_WAIT = 0.1 # Seconds for the frontend to show a new screen before anything is sent
+IDLE_TIMEOUT = 30 # Seconds without anything queued before the frame loop thread exits, it restarts on the next action
+BUILTIN_SHAPES = ('', 'arrow', 'circle', 'default', 'square', 'triangle', 'turtle') # Drawn by the frontend, never loaded
 # SCREEN_WIDTH = 500
 # SCREEN_HEIGHT = 800
 
-IMAGE_EXTS = ['bmp', 'gif', 'ico‌', 'jpg', 'png', 'svg']
-VIDEO_EXTS = ['mp4', 'webm']
-AUDIO_EXTS = ['aac', 'm4a', 'mp3', 'wav']
+SCREENS = weakref.WeakSet() # Screens not closed yet, see shutdown in turtle.py
+
+def canvas_transforms(ids, positions, headings, width, height):
+  """
+  (id, canvas position, heading) of turtles moved to positions in turtle
+  coordinates, given as lists or arrays. Headings are None when not given.
+  """
+  if hasattr(positions, 'tolist'):
+    positions = positions.tolist()
+  if hasattr(headings, 'tolist'):
+    headings = headings.tolist()
+  
+  w, h = width / 2, height / 2
+  headings = [None] * len(positions) if headings is None else headings
+  
+  return [(_id, (x + w, h - y), heading) for _id, (x, y), heading in zip(ids, positions, headings)]
+
+def canvas_values(positions, headings, width, height):
+  """
+  Float32 canvas x, y and heading of turtles moved to positions in turtle
+  coordinates, interleaved per turtle, see Scene.place_members.
+  """
+  if hasattr(positions, 'tolist'):
+    positions = positions.tolist()
+  if hasattr(headings, 'tolist'):
+    headings = headings.tolist()
+  
+  w, h = width / 2, height / 2
+  values = array('f')
+  for (x, y), heading in zip(positions, headings):
+    values.extend((x + w, h - y, heading))
+  
+  return values
 
 class Screen(DOMWidget, HasTraits):
   _model_name = Unicode('TurtleModel').tag(sync=True)
@@ -27,6 +75,7 @@ class Screen(DOMWidget, HasTraits):
   _view_name = Unicode('TurtleView').tag(sync=True)
   _view_module = Unicode(MODULE_NAME).tag(sync=True)
   _view_module_version = Unicode(MODULE_VERSION).tag(sync=True)
+  _display_wait = DISPLAY_WAIT
   
   id = Unicode('').tag(sync=True)
   width = Int(SCREEN_WIDTH).tag(sync=True)
@@ -37,58 +86,134 @@ class Screen(DOMWidget, HasTraits):
   resource = Dict().tag(sync=True)
   
   key = Unicode('').tag(sync=True)
+  frame = Int(0).tag(sync=True)
   actions = List([]).tag(sync=True)
+  packed_actions = Dict().tag(sync=True)
+  delta_actions = Dict().tag(sync=True)
   
-  def __init__(self, framerate=SCREEN_FRAMERATE):
+  def __init__(self, framerate=SCREEN_FRAMERATE, encoding='json', tolerance=None, metrics=False):
     super(Screen, self).__init__()
     
+    if encoding not in ENCODINGS:
+      raise Exception(f'Unknown encoding {encoding}, expected one of {ENCODINGS}')
+    
+    self._encoding = encoding
+    self._delta = DeltaEncoder()
+    self.tolerance = tolerance # Canvas pixels paths are simplified within before they are sent, None to keep every vertex
+    self.simplified = {'vertices': 0, 'dropped': 0} # Path vertices sent and dropped by simplification
+    self.metrics = Metrics(metrics) # Pipeline counters and latencies, see stats
     self._tracer = 1 # 0 means manual mode, others as auto mode
     self._colormode = 1.0 # or 255
     self.curr_key = None
     self._on_keys = {}
     self._framerate = SCREEN_FRAMERATE
     
-    self.loaded = set()
+    self.loaded = {} # Resource hash of every path loaded
+    self.upload_progress = {} # (bytes sent, total bytes) of every streamed resource
+    self._pending = {} # Callbacks of streamed resources, run once acknowledged
+    self._deferred = {} # Turtle id -> last action shown without its streaming shape
+    self._uploads = {} # Futures of streamed resources
+    self._resource_lock = threading.Lock() # Resources may be loaded from preload threads
+    self.regions = {} # Atlas name and region of every shape packed by register_shapes
     
     display(self)
     
-    time.sleep(0.1)
+    time.sleep(self._display_wait)
     self.id = str(uuid.uuid4())
     
+    self.scene = Scene() # What is drawn, queried and redrawn without the frontend
     self.todo_actions = {}
+    self._clocks = {}
+    self._instant = deque() # Actions drawn in manual mode, flushed by update
+    self._transforms = deque() # Due time, swarm and batch of sprite transforms, see update_turtles
+    self._slots = {} # Turtle or swarm id -> index of its first sprite in transform messages
+    self._names = [] # [slot, turtle id] of every turtle and [first slot, swarm id, members] of every swarm
+    self._slot_count = 0
     
     self._main_loop = None
     
     
     self.interval = 1000 / framerate
+    self.latency = 0 # Smoothed seconds between sending a frame and its acknowledgement
+    self._acked = 0
+    self._sent = deque(maxlen=4 * MAX_INFLIGHT_FRAMES)
     self.stop_event = threading.Event()
-    self.lock = threading.Lock()
+    self._wakeup = threading.Event()
     self.thread = None
+    self.closed = False
+    self._thread_lock = threading.Lock() # Starting and idle exits of the frame loop thread
+    self._idle = False # Whether the frame loop thread exited for lack of actions
+    
+    self.on_msg(self._handle_msg)
+    SCREENS.add(self)
     
     if self._tracer > 0:
       self.start()
+      
+  def __enter__(self):
+    return self
+  
+  def __exit__(self, *_):
+    # What is still queued is shown at once before closing
+    if not self.closed:
+      self._publish(self._build_actions())
+    self.close()
 
   def setup(self, width, height):
       self.width = width
       self.height = height
     
   def start(self, main_loop=None):
-    if (not self.thread) or (not self.thread.is_alive()):
-      self.stop_event.clear()
-      self.thread = threading.Thread(target=main_loop if main_loop else self._run)
-      self.thread.start()
+    with self._thread_lock:
+      if self.closed:
+        return
+      
+      if (not self.thread) or (not self.thread.is_alive()):
+        self.stop_event.clear()
+        self._idle = False
+        # Daemon threads never keep the kernel from exiting
+        self.thread = threading.Thread(target=main_loop if main_loop else self._run, daemon=True)
+        self.thread.start()
 
   def stop(self):
-    if self.thread:
+    thread = self.thread
+    
+    if thread:
       self.stop_event.set()
-      self.thread.join()
-      if self.lock.locked():
-        self.lock.release()
+      self._wakeup.set()
+      # A screen collected on its own thread cannot wait for it
+      if thread is not threading.current_thread():
+        thread.join()
+        
+  def close(self):
+    """
+    Stop the frame loop, drop everything queued, cancel resource uploads and
+    close the widget. A closed screen draws nothing more.
+    """
+    self.closed = True
+    self.stop()
+    
+    self.todo_actions.clear()
+    self._clocks.clear()
+    self._instant.clear()
+    self._transforms.clear()
+    
+    for future in list(self._uploads.values()):
+      future.cancel()
+    self._uploads.clear()
+    self._pending.clear()
+    self._deferred.clear()
+    
+    SCREENS.discard(self)
+    super(Screen, self).close()
       
   def tracer(self, n):
     self._tracer = n
     
     if self._tracer > 0:
+      # Anything drawn in manual mode is shown before animation resumes
+      if self._instant:
+        self._publish(self._build_actions())
       self.start()
     else:
       self.stop()
@@ -102,9 +227,7 @@ class Screen(DOMWidget, HasTraits):
       
   def update(self):
     if self._tracer == 0:
-      _actions = self._build_actions()
-      if len(_actions) > 0:
-        self.actions = _actions
+      self._publish(self._build_actions())
       
   def bgcolor(self, *_color):
     if not _color:
@@ -115,7 +238,10 @@ class Screen(DOMWidget, HasTraits):
   def bgpic(self, src, reload=False):
     self.load(src, reload)
     
-    self.bgUrl = src
+    if src in self._pending:
+      self._pending[src].append(lambda: setattr(self, 'bgUrl', src))
+    else:
+      self.bgUrl = src
       
   def save(self):
     clear_output()
@@ -124,68 +250,583 @@ class Screen(DOMWidget, HasTraits):
   def onkeypress(self, fn, key):
     self._on_keys[key] = fn
       
-  def add_action(self, action):
-    try:
-      self.lock.acquire()
-
-      _id = action['id']
-      if _id not in self.todo_actions:
-        self.todo_actions[_id] = []
-      self.todo_actions[_id].append(action)
-    finally:
-      self.lock.release()
+  def add_action(self, action, delay=0):
+    """
+    Queue an action to be shown delay seconds after the previous action of the
+    same turtle, and return the time it is due.
+    """
+    if self.metrics.enabled:
+      self.metrics.count('actions')
+      return self.metrics.timed('queue', self._queue, action, delay)
+    
+    return self._queue(action, delay)
+  
+  def _queue(self, action, delay):
+    if self.closed:
+      return 0
+    
+    self.scene.add(action)
+    
+    if self._pending or self._deferred:
+      action = self._defer(action)
+      if action is None:
+        return 0
+    
+    # Producers never lock, deque appends are atomic and only the frame loop pops
+    if self._tracer == 0:
+      self._instant.append(action)
+      return 0
+    
+    _id = action['id']
+    now = time.monotonic()
+    due = max(self._clocks.get(_id, now), now) + delay
+    self._clocks[_id] = due
+    
+    queue = self.todo_actions.get(_id)
+    if queue is None:
+      queue = self.todo_actions.setdefault(_id, deque())
+    queue.append((due, action))
+    
+    # The frame loop drops drained queues, one dropped meanwhile is put back
+    if self.todo_actions.get(_id) is not queue:
+      current = self.todo_actions.setdefault(_id, queue)
+      while (current is not queue) and queue:
+        current.append(queue.popleft())
+    
+    if not self._wakeup.is_set():
+      self._wakeup.set()
+    
+    # The frame loop exited while idle, checked after queueing so that it cannot be missed
+    if self._idle:
+      self.start()
+      
+    return due
       
+  def preload(self, paths):
+    """
+    Read and send resources on a thread pool ahead of time, so that later
+    shape() and play() calls with them are cache hits. Returns a future that
+    is done once every resource has been sent.
+    """
+    return gather([self._preload(path) for path in paths])
+  
+  def _preload(self, path):
+    # Large resources are done once streamed, without blocking a worker on it
+    done = Future()
+    
+    def streamed(future):
+      if future.exception() is not None:
+        done.set_exception(future.exception())
+      else:
+        done.set_result(path)
+    
+    def loaded(future):
+      if (future.exception() is None) and (path in self._uploads):
+        self._uploads[path].add_done_callback(streamed)
+      else:
+        streamed(future)
+    
+    resources.EXECUTOR.submit(self.load, path).add_done_callback(loaded)
+    
+    return done
+    
+  def register_shapes(self, paths, name=None):
+    """
+    Bundle image shapes into one atlas sheet that is sent once, turtles and
+    stamps with these shapes then show their region of the sheet. Returns the
+    region of every shape, see build_atlas. Atlases are named after their
+    content unless named, a name cannot be given to another atlas.
+    """
+    entries = {path: RESOURCES.get(path) for path in paths}
+    sheet, regions = build_atlas([(path, entry['ext'], entry['buffer']) for path, entry in entries.items()])
+    entry = RESOURCES.put(sheet, 'image', 'atlas', regions=regions)
+    name = name or f'atlas:{entry["hash"]}'
+    
+    if self.loaded.get(name, entry['hash']) != entry['hash']:
+      raise Exception(f'An atlas named {name} is already registered')
+    
+    self._send_resource(name, entry)
+    self.loaded[name] = entry['hash']
+    
+    for path in regions:
+      self.regions[path] = (name, regions[path])
+      self.loaded[path] = entries[path]['hash']
+    
+    return regions
+    
   def load(self, file_path, reload=False):
-    if (file_path not in self.loaded) or reload:
-      if not ((file_path.startswith('http://')) or (file_path.startswith('https://'))):
-        ext = file_path.split('.')[-1].lower()
-        _type = None
-        
-        if ext in IMAGE_EXTS:
-          _type = 'image'
-        elif ext in VIDEO_EXTS:
-          _type = 'video'
-        elif ext in AUDIO_EXTS:
-          _type = 'audio'
-        else:
-          raise Exception(f'Unknown resource type for {file_path}')
-
-        if ext == 'svg':
-          buffer = read_file(file_path).decode('ascii')
-        else:
-          buffer = file_to_base64(file_path)
-
-        self.resource = {
-          'name': file_path,
-          'type': _type,
-          'ext': ext,
-          'buffer': buffer
-        }
+    if (file_path.startswith('http://')) or (file_path.startswith('https://')):
+      return file_path
+    
+    # Packed shapes are shown from their atlas until they are reloaded on their own
+    if file_path in self.regions:
+      if not reload:
+        return file_path
+      
+      del self.regions[file_path]
+      self.loaded.pop(file_path, None)
+    
+    entry = RESOURCES.get(file_path, reload)
+    
+    if self.loaded.get(file_path) != entry['hash']:
+      self._send_resource(file_path, entry)
+      self.loaded[file_path] = entry['hash']
+      
+    return file_path
+      
+  def _send_resource(self, file_path, entry, force=False):
+    with self._resource_lock:
+      self._sync_resource(file_path, entry, force)
+      
+  def _sync_resource(self, file_path, entry, force):
+    if (not force) and (entry['hash'] in RESOURCES.sent):
+      # The frontend caches buffers by hash across screens
+      self.resource = {'name': file_path, **{k: v for k, v in entry.items() if k != 'buffer'}}
+    elif len(entry['buffer']) > resources.CHUNK_BYTES:
+      if file_path not in self._pending:
+        self._pending[file_path] = []
+        self._uploads[file_path] = resources.EXECUTOR.submit(self._upload, file_path, entry)
+    else:
+      # A copy, the trait outlives a memory-mapped file that may change
+      self.resource = {'name': file_path, **entry, 'buffer': bytes(entry['buffer'])}
+      RESOURCES.sent.add(entry['hash'])
+      
+  def _upload(self, file_path, entry):
+    """
+    Stream a large resource to the frontend in chunks, drawing goes on meanwhile.
+    """
+    buffer = memoryview(entry['buffer'])
+    size = len(buffer)
+    chunk = resources.CHUNK_BYTES
+    count = -(-size // chunk)
+    
+    self.upload_progress[file_path] = (0, size)
+    self.send({'event': 'resource_begin', 'name': file_path, **{k: v for k, v in entry.items() if k != 'buffer'},
+      'size': size, 'chunks': count})
+    
+    for index in range(count):
+      # Copied, the message may be sent after a memory-mapped file changed
+      self.send({'event': 'resource_chunk', 'hash': entry['hash'], 'index': index}, [bytes(buffer[index * chunk:(index + 1) * chunk])])
+      self.upload_progress[file_path] = (min((index + 1) * chunk, size), size)
+      
+  def _defer(self, action):
+    """
+    Keep actions from referencing resources the frontend has not acknowledged
+    yet. Sounds are played once acknowledged, shapes show as the default one
+    until the turtle is shown again with its shape on acknowledgement.
+    """
+    if (action['type'] == 'S') and (action.get('media') in self._pending):
+      self._pending[action['media']].append(lambda: self.add_action(action))
+      
+      return None
+    
+    shape = action.get('shape')
+    if (shape in self._pending) or ((shape in self.regions) and (self.regions[shape][0] in self._pending)):
+      self._deferred[action['id']] = action
+      return {**action, 'shape': ''}
     
-        self.loaded.add(file_path)
+    self._deferred.pop(action['id'], None)
+    
+    return action
+  
+  def _reshape(self, name):
+    # Show turtles again with the shape of an acknowledged resource
+    for _id, action in list(self._deferred.items()):
+      shape = action['shape']
+      if (shape == name) or ((shape in self.regions) and (self.regions[shape][0] == name)):
+        del self._deferred[_id]
+        self.add_action({**action, 'type': 'UPDATE_STATE', 'distance': 0, 'need_delay': False})
       
   def _run(self):
     while not self.stop_event.is_set():
-      next_timestamp = time.monotonic() + self.interval
+      self._wakeup.clear()
+      started = time.monotonic()
+      
+      if self._ready(started):
+        self._publish(self._build_actions(started, MAX_FRAME_ACTIONS), started)
+      elif self.metrics.enabled:
+        # Too many frames are awaiting acknowledgement, the frontend is behind
+        self.metrics.count('frames_deferred')
+      
+      due = self._next_due()
+      if due is None:
+        # Nothing is queued, sleep until an action is added or the loop stops, and exit when idle for long
+        if (not self._wakeup.wait(IDLE_TIMEOUT)) and (not self.stop_event.is_set()):
+          with self._thread_lock:
+            self.thread = None
+            self._idle = True
+          
+          # Actions queued meanwhile did not see the loop exit
+          if self._next_due() is not None:
+            self.start()
+          return
+      else:
+        self.stop_event.wait(max(due, started + self._frame_interval()) - time.monotonic())
+  
+  def _frame_interval(self):
+    """
+    Seconds between frames, slowed down to the acknowledgement latency of the
+    frontend so that slow browsers do not build up a backlog.
+    """
+    return max(self.interval / 1000, self.latency)
+  
+  def _ready(self, now):
+    """
+    Whether another frame can be sent. Frontends that never acknowledged a
+    frame are not throttled, and lost acknowledgements time out.
+    """
+    if self._acked == 0 or self.frame - self._acked < MAX_INFLIGHT_FRAMES:
+      return True
+    
+    late = (not self._sent) or (now - self._sent[-1][1] > ACK_TIMEOUT)
+    if late:
+      # The view stopped acknowledging, for instance it was closed, frames go
+      # out unthrottled again until a view acknowledges one
+      self._acked = 0
+      self._sent.clear()
+      
+      if self.metrics.enabled:
+        self.metrics.count('ack_timeouts')
+    
+    return late
+  
+  def _next_due(self):
+    """
+    The earliest due time of the queued actions, or None when nothing is queued.
+    """
+    if self._instant:
+      return 0
+    
+    dues = [v[0][0] for v in list(self.todo_actions.values()) if v]
+    if self._transforms:
+      dues.append(self._transforms[0][0])
+    
+    return min(dues) if dues else None
+  
+  def _handle_msg(self, _, content, buffers):
+    if content.get('event') == 'ack':
+      frame = content.get('frame', 0)
+      now = time.monotonic()
+      
+      while self._sent and self._sent[0][0] <= frame:
+        sent_frame, sent_at = self._sent.popleft()
+        
+        if sent_frame == frame:
+          self.latency += LATENCY_SMOOTHING * (now - sent_at - self.latency)
       
-      self.actions = self._build_actions()
+      self._acked = max(self._acked, frame)
+    elif content.get('event') == 'resource_ack':
+      RESOURCES.sent.add(content.get('hash'))
+      self._uploads.pop(content.get('name'), None)
       
-      sleep_time = next_timestamp - time.monotonic()
-      if sleep_time > 0:
-        self.stop_event.wait(sleep_time / 1000)
+      for callback in self._pending.pop(content.get('name'), []):
+        callback()
+      self._reshape(content.get('name'))
+    elif content.get('event') == 'missing':
+      # The frontend lost its cached buffer, for instance after a page reload
+      name = content.get('name', '')
+      entry = RESOURCES.find(content.get('hash')) or RESOURCES.get(name, True)
+      
+      self._send_resource(name, entry, True)
+    elif content.get('event') == 'redraw':
+      # A new view of the screen starts empty, send it what is shown
+      self._send_snapshot()
+  
+  def snapshot(self):
+    """
+    What the screen shows as plain data: its size, background, and the scene
+    with the state of every turtle. It can be stored as JSON and restored.
+    """
+    return {
+      'width': self.width,
+      'height': self.height,
+      'background': self.background,
+      'bgUrl': self.bgUrl,
+      'scene': self.scene.snapshot(),
+    }
+    
+  def restore(self, snapshot):
+    """
+    Show a snapshot in place of the drawing, on every view of the screen.
+    Actions and sprite transforms not shown yet are dropped.
+    """
+    self._build_actions()
+    self._transforms.clear()
+    self.setup(snapshot['width'], snapshot['height'])
+    self.background = snapshot['background']
+    self.scene.restore(snapshot['scene'])
+    
+    # Images of stamps and turtles are sent before the actions showing them
+    for shape in self.scene.shapes(BUILTIN_SHAPES):
+      self.load(shape)
+    
+    if snapshot['bgUrl']:
+      self.bgpic(snapshot['bgUrl'])
+    else:
+      self.bgUrl = ''
+      
+    self._send_snapshot(clear=True)
+    
+  def export_svg(self, file_path, turtles=True):
+    """
+    Write what is shown to an SVG file, with visible turtles unless turtles is
+    False. It is drawn in the kernel from the scene, no view is needed.
+    """
+    # Render imports turtle, which imports this module
+    from .render import render_scene
+    
+    with open(file_path, 'w') as f:
+      f.write(render_scene(self, turtles))
+    
+  def export_png(self, file_path):
+    """
+    Write what is shown to a PNG file, without text, stamps and images.
+    """
+    from .raster import rasterize
+    
+    with open(file_path, 'wb') as f:
+      f.write(rasterize(self.scene.replay(), self.width, self.height, self.background).to_png())
+    
+  def export_gif(self, file_path, fps=SCREEN_FRAMERATE, step=1):
+    """
+    Write an animated GIF of what is shown being drawn, step strokes a frame
+    at fps frames a second, without text, stamps and images. Frames are
+    streamed to the file as they are drawn.
+    """
+    from .gif import GIFWriter
+    from .raster import Raster
+    
+    raster = Raster(self.width, self.height, self.background)
+    drawn = 0
+    
+    with open(file_path, 'wb') as f:
+      writer = GIFWriter(f, self.width, self.height, fps)
+      writer.add(raster)
+      
+      # Strokes merged when they were shown are drawn one by one
+      for action in self.scene.replay(merge=False):
+        raster.draw(action)
+        
+        if action.get('node'):
+          drawn += 1
+          if drawn % step == 0:
+            writer.add(raster)
+      
+      writer.add(raster)
+      writer.close()
+    
+    return writer.frames
+    
+  def _send_snapshot(self, clear=False):
+    """
+    Send what is shown in one message. Strokes, dots and fills go as SVG
+    markup in a buffer, inserted at once by the frontend, text, stamps and
+    turtles as actions.
+    """
+    # Render imports turtle, which imports this module
+    from .render import SVGRenderer
+    
+    renderer = SVGRenderer(self.width, self.height)
+    actions = []
+    
+    # Paths sent again are not counted again
+    for action in self._simplify(self.scene.replay(), False):
+      if action['type'] in ('W', 'STAMP', 'M'):
+        actions.append(action)
+      else:
+        renderer.draw(action)
+    
+    markup = ''.join(f'<g data-node="{node}">{markup}</g>' for node, markup in renderer.drawings())
+    buffers = [markup.encode('utf-8')]
+    
+    # Members of swarms are moved where they are once their shared state is shown
+    ranges = [(self._slot(swarm, len(values) // 3), values) for swarm, (_, values) in list(self.scene.swarms.items())]
+    if ranges:
+      buffers.extend(pack_transforms([], ranges))
+    
+    self.send({'event': 'snapshot', 'clear': clear, 'actions': actions, 'names': self._names}, buffers)
   
-  def _build_actions(self):
+  def _slot(self, _id, members=None):
+    # Sprites are numbered in transform messages, the members of a swarm consecutively
+    slot = self._slots.get(_id)
+    if slot is None:
+      slot = self._slots[_id] = self._slot_count
+      if members is None:
+        self._slot_count += 1
+        self._names.append([slot, _id])
+      else:
+        self._slot_count += members
+        self._names.append([slot, _id, members])
+    
+    return slot
+  
+  def update_turtles(self, ids, positions, headings=None, due=0):
+    """
+    Move the sprites of many turtles at once without drawing, for instance in
+    a game loop. Positions are (x, y) in turtle coordinates and headings in
+    degrees, one per id, headings are kept when None. They are sent with the
+    next frame as packed arrays, and the frontend moves the sprites in place.
+    Only turtles already shown are moved, and Turtle objects keep their own
+    position. Transforms wait until due, for instance the due time returned
+    by add_action for the strokes that take the turtles there.
+    """
+    # Producers never lock, the frame loop pops whole batches
+    self._transforms.append((due, None, canvas_transforms(ids, positions, headings, self.width, self.height)))
+    self._wake()
+  
+  def update_swarm(self, swarm, positions, headings, due=0):
+    """
+    Move the sprites of the members of a swarm, see TurtleSwarm, like
+    update_turtles does. Positions and headings are given for every member in
+    order, and sent as packed arrays for the whole swarm.
+    """
+    self._transforms.append((due, swarm, canvas_values(positions, headings, self.width, self.height)))
+    self._wake()
+  
+  def _wake(self):
+    if self._tracer and not self._wakeup.is_set():
+      self._wakeup.set()
+    if self._idle:
+      self.start()
+      
+  def _send_transforms(self, now=None):
+    """
+    Send the sprite transforms due by now, or all of them, in one message, the
+    latest one of every turtle and swarm. Slots of new turtles and swarms are
+    named along.
+    """
+    moved = {}
+    swarms = {}
+    # Batches are sent in order, a batch not due yet holds back the next ones
+    while self._transforms and ((now is None) or (self._transforms[0][0] <= now)):
+      _, swarm, batch = self._transforms.popleft()
+      
+      if swarm is not None:
+        values = self.scene.place_members(swarm, batch)
+        if values is not None:
+          swarms[swarm] = values
+        continue
+      
+      for _id, position, heading in batch:
+        action = self.scene.place(_id, position, heading)
+        if action is not None:
+          moved[_id] = action
+    
+    if not (moved or swarms):
+      return
+    
+    named = len(self._names)
+    transforms = [(self._slot(_id), *action['position'], action['heading']) for _id, action in moved.items()]
+    ranges = [(self._slot(swarm, len(values) // 3), values) for swarm, values in swarms.items()]
+    slots, transforms = pack_transforms(transforms, ranges)
+    
+    self.send({'event': 'transforms', 'names': self._names[named:]}, [slots, transforms])
+    
+    if self.metrics.enabled:
+      self.metrics.count('transforms', len(slots))
+      self.metrics.size('transform_bytes', slots.nbytes + transforms.nbytes)
+    
+  def _publish(self, actions, now=None):
+    # Empty frames carry nothing, and the frame counter keeps identical frames distinct
+    if not actions:
+      self._send_transforms(now)
+      return
+    
+    metrics = self.metrics if self.metrics.enabled else None
+    started = time.perf_counter() if metrics else 0
+    count = len(actions)
+    
+    self.scene.show(actions)
+    actions = self._simplify(merge_strokes(actions, self.scene))
+    
+    if metrics:
+      merged = time.perf_counter()
+      metrics.observe('merge', merged - started)
+      metrics.count('actions_merged', count - len(actions))
+    
+    with self.hold_sync():
+      self.frame += 1
+      
+      if self._encoding == 'json':
+        self.actions = payload = actions
+      elif self._encoding == 'packed':
+        self.packed_actions = payload = {'frame': self.frame, **pack_actions(actions)}
+      else:
+        self.delta_actions = payload = {'frame': self.frame, 'actions': self._delta.encode(actions)}
+    
+    self._sent.append((self.frame, time.monotonic()))
+    
+    if metrics:
+      # Encoding, and serializing to the comm when the sync is released
+      metrics.observe('sync', time.perf_counter() - merged)
+      metrics.count('frames')
+      metrics.count('actions_sent', len(actions))
+      metrics.size('frame_bytes', payload_size(payload))
+    
+    # Sprites are moved after the actions of the frame, which may show them first
+    self._send_transforms(now)
+  
+  def stats(self):
+    """
+    Counters, stage latencies and frame sizes of the action pipeline, see
+    metrics.py, with the actions queued per turtle and the frames awaiting
+    acknowledgement. Metrics are recorded once enabled, with
+    Screen(metrics=True) or screen.metrics.enable().
+    """
+    return {
+      **self.metrics.snapshot(),
+      'queued': {_id: len(queue) for _id, queue in list(self.todo_actions.items()) if queue},
+      'instant': len(self._instant),
+      'inflight': len(self._sent),
+      'latency': self.latency,
+    }
+  
+  def _simplify(self, actions, count=True):
+    """
+    The actions with their paths simplified within tolerance, counting the
+    vertices dropped unless count is False. The scene keeps every vertex.
+    """
+    if self.tolerance is None:
+      return actions
+    
+    result = []
+    for action in actions:
+      if action['type'] == 'P':
+        vertices = len(action['commands'])
+        action, dropped = simplify_path(action, self.tolerance)
+        if count:
+          self.simplified['vertices'] += vertices
+          self.simplified['dropped'] += dropped
+        
+      result.append(action)
+      
+    return result
+  
+  def _build_actions(self, now=None, limit=None):
+    """
+    Collect the actions of all turtles due by now, or every queued action, at
+    most limit actions at once.
+    """
+    started = time.perf_counter() if self.metrics.enabled else None
     _actions = []
+    if limit is None:
+      limit = sys.maxsize
     
-    try:
-      self.lock.acquire()
+    # Turtles may be added while draining, iterate over a snapshot
+    for _id, v in list(self.todo_actions.items()):
+      while v and ((now is None) or (v[0][0] <= now)) and (len(_actions) < limit):
+        _actions.append(v.popleft()[1])
+      
+      # Turtles done drawing are forgotten, many are short-lived
+      if (not v) and (now is not None) and (self._clocks.get(_id, now) <= now):
+        del self.todo_actions[_id]
+        self._clocks.pop(_id, None)
       
-      # 简化处理，先瞬移再说  
-      for v in self.todo_actions.values():
-        for _ in range(len(v)):
-          _actions.append(v.pop(0))
-    finally:
-      self.lock.release()
+    count = min(len(self._instant), limit - len(_actions))
+    _actions.extend(self._instant.popleft() for _ in range(count))
+    
+    if started is not None:
+      self.metrics.observe('build', time.perf_counter() - started)
 
     return _actions
   
@@ -197,13 +838,3 @@ class Screen(DOMWidget, HasTraits):
       (self._on_keys[self.curr_key])()
     
     self.curr_key = None
-
-def read_file(file_path):
-  with open(file_path, 'rb') as f:
-    return f.read()
-  
-def file_to_base64(file_path):
-  fc = read_file(file_path)
-  buffer = base64.b64encode(fc)
-  
-  return buffer.decode('utf-8')
\ No newline at end of file
@@ -0,0 +1,215 @@
+"""
+Swarms of turtles held as NumPy columns.
+
+A Turtle keeps its whole state in attributes and adds one action per call.
+A TurtleSwarm keeps the x, y, heading and pen state of every member in
+arrays, a few tens of bytes per member, and shares color, pen and shape
+across members, which the screen keeps once for the whole swarm. All members move in one vectorized call, which adds a single
+path for the strokes drawn by all of them.
+"""
+
+import uuid
+
+import numpy as np
+
+from .screen import BUILTIN_SHAPES, Screen
+from .turtle import ActionType, action_delay, speed_value
+from .utils import build_color
+
+class TurtleSwarm:
+  """
+  A group of n turtles that start at the origin heading east, pens down.
+  Positions and headings are read from the x, y and heading arrays, and
+  changed through the motion methods, which take a value for all members or
+  an array with one value per member.
+  """
+  def __init__(self, n, screen=None):
+    self.screen = Screen() if screen is None else screen
+    self.id = str(uuid.uuid4())
+
+    self.x = np.zeros(n)
+    self.y = np.zeros(n)
+    self.heading = np.zeros(n)
+    self.pen = np.ones(n, dtype=bool)
+
+    self._speed = 10
+    self._show = True
+    self._color = 'black'
+    self._pencolor = 'black'
+    self._pensize = 1
+    self._shape = ''
+    self._stretchfactor = (1, 1)
+    self._outlinewidth = 1
+
+    self._update(full=True)
+
+  def __len__(self):
+    return len(self.x)
+
+  def _state(self, action_type):
+    # An action of the swarm itself, which has no sprite, with the state shared by all members
+    return {
+      'id': self.id,
+      'type': action_type,
+      'position': (self.screen.width / 2, self.screen.height / 2),
+      'speed': self._speed,
+      'color': self._color,
+      'heading': 0,
+      'show': False,
+      'stampid': '',
+      'pen': True,
+      'pencolor': self._pencolor,
+      'pensize': self._pensize,
+      'penstretchfactor': self._stretchfactor,
+      'penoutlinewidth': self._outlinewidth,
+      'distance': 0,
+      'radius': 0,
+      'clockwise': 1,
+      'large_arc': 0,
+      'media': None,
+      'shape': self._shape,
+      'need_delay': False,
+      'fill_mode': False,
+    }
+
+  def _canvas(self, xs, ys):
+    return xs + self.screen.width / 2, self.screen.height / 2 - ys
+
+  def _update(self, full=False, due=0):
+    """
+    Show every member where it is. Members are moved as one batch of
+    transforms, once due, and the state they share is sent once for the whole
+    swarm when it changes.
+    """
+    if full:
+      self.screen.add_action({**self._state(ActionType.UPDATE_STATE), 'show': self._show, 'members': len(self)})
+    else:
+      self.screen.update_swarm(self.id, np.column_stack((self.x, self.y)), self.heading, due)
+
+  def _move(self, xs, ys, draw=True):
+    """
+    Move members to new positions. Strokes of members with their pen down
+    are added as one path of the swarm, from M to L for every member, and
+    members reach their new positions when the path is due.
+    """
+    xs, ys = np.broadcast_to(xs, self.x.shape).astype(float), np.broadcast_to(ys, self.y.shape).astype(float)
+    distances = np.hypot(xs - self.x, ys - self.y)
+    drawn = self.pen & (distances > 0) if draw else np.zeros(len(self), dtype=bool)
+    delay = action_delay(self._speed, float(distances.max(initial=0)), self.screen.delay) if self.screen._tracer else 0
+
+    if drawn.any():
+      x0, y0 = self._canvas(self.x[drawn], self.y[drawn])
+      x1, y1 = self._canvas(xs[drawn], ys[drawn])
+
+      action = self._state(ActionType.PATH)
+      action.update({
+        'commands': 'ML' * int(drawn.sum()),
+        'points': np.column_stack((x0, y0, x1, y1)).ravel().tolist(),
+        'position': (float(x1[-1]), float(y1[-1])),
+        'distance': float(distances.max()),
+      })
+    else:
+      # Moves without strokes are paced all the same
+      action = self._state(ActionType.UPDATE_STATE)
+    due = self.screen.add_action(action, delay)
+
+    self.x, self.y = xs, ys
+    self._update(due=due)
+
+  def position(self):
+    """
+    The (x, y) of every member, as an n x 2 array.
+    """
+    return np.column_stack((self.x, self.y))
+
+  def forward(self, distance):
+    angles = np.radians(self.heading)
+
+    self._move(self.x + distance * np.cos(angles), self.y + distance * np.sin(angles))
+
+  def backward(self, distance):
+    self.forward(-np.asarray(distance))
+
+  def left(self, angle):
+    self.setheading(self.heading + angle)
+
+  def right(self, angle):
+    self.setheading(self.heading - angle)
+
+  def setheading(self, angle):
+    self.heading = np.broadcast_to(angle, self.heading.shape) % 360
+    self._update()
+
+  def goto(self, x, y):
+    self._move(x, y)
+
+  def teleport(self, x, y):
+    self._move(x, y, draw=False)
+
+  def penup(self, members=None):
+    """
+    Lift the pens of all members, or of those selected by an index or mask.
+    """
+    self.pen[slice(None) if members is None else members] = False
+
+  def pendown(self, members=None):
+    self.pen[slice(None) if members is None else members] = True
+
+  def clear(self):
+    """
+    Remove what the members have drawn.
+    """
+    self.screen.add_action(self._state(ActionType.CLEAR))
+
+  def showturtle(self):
+    self._show = True
+    self._update(full=True)
+
+  def hideturtle(self):
+    self._show = False
+    self._update(full=True)
+
+  def speed(self, _speed=None):
+    if _speed is None:
+      return self._speed
+
+    self._speed = speed_value(_speed)
+
+  def color(self, *_color):
+    self._color = self._pencolor = build_color(self.screen.colormode(), *_color)
+    self._update(full=True)
+
+  def pencolor(self, *_color):
+    self._pencolor = build_color(self.screen.colormode(), *_color)
+
+  def pensize(self, size):
+    self._pensize = size
+
+  def shape(self, _shape, reload=False):
+    if _shape not in BUILTIN_SHAPES:
+      self.screen.load(_shape, reload)
+
+    self._shape = _shape
+    self._update(full=True)
+
+  def shapesize(self, stretch_wid, stretch_len=None, outline=None):
+    if stretch_wid == 0 or stretch_len == 0:
+      raise Exception('stretch_wid/stretch_len must not be zero')
+
+    self._stretchfactor = (stretch_wid, stretch_wid if stretch_len is None else stretch_len)
+    if outline is not None:
+      self._outlinewidth = outline
+
+    self._update(full=True)
+
+  st = showturtle
+  ht = hideturtle
+  seth = setheading
+  lt = left
+  rt = right
+  pu = penup
+  pd = pendown
+  fd = forward
+  bk = backward
+  setpos = goto
+  pos = position
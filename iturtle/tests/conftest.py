@@ -37,7 +37,7 @@ undefined = object()
 def mock_comm():
     _widget_attrs["_comm_default"] = getattr(Widget, "_comm_default", undefined)
     Widget._comm_default = lambda self: MockComm()
-    _widget_attrs["_ipython_display_"] = Widget._ipython_display_
+    _widget_attrs["_ipython_display_"] = getattr(Widget, "_ipython_display_", undefined)
 
     def raise_not_implemented(*args, **kwargs):
         raise NotImplementedError()
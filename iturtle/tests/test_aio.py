@@ -0,0 +1,85 @@
+"""
+Test cases for asyncio turtles.
+"""
+
+import asyncio
+import threading
+import time
+
+from ..aio import AsyncScreen, AsyncTurtle
+
+
+def test_async_turtles_without_threads():
+    """
+    Check async turtles animate concurrently on the event loop.
+    """
+    async def main():
+        count = threading.active_count()
+
+        screen = AsyncScreen()
+        a = AsyncTurtle(screen)
+        b = AsyncTurtle(screen)
+
+        start = time.monotonic()
+        await asyncio.gather(a.forward(100), b.left(90), b.fd(50))
+
+        assert a.pos() == (100, 0)
+        assert abs(b.ycor() - 50) < 1e-5
+        assert time.monotonic() - start < 0.5
+        assert threading.active_count() == count
+
+        # The frame task has published every queued action
+        await asyncio.sleep(screen.interval / 1000 * 2)
+        assert not any(screen.todo_actions.values())
+
+        screen.stop()
+
+    asyncio.run(main())
+
+
+def test_async_task_idles():
+    """
+    Check the frame task ends once nothing is queued and starts again with the next action.
+    """
+    async def main():
+        screen = AsyncScreen()
+        turtle = AsyncTurtle(screen)
+
+        await turtle.forward(10)
+        await asyncio.sleep(screen.interval / 1000 * 2)
+
+        assert screen._task is None
+        assert screen._idle
+
+        turtle._turtle.left(90)
+        task = screen._task
+        await asyncio.sleep(screen.interval / 1000 * 2)
+
+        assert task is not None and task.done()
+        assert not any(screen.todo_actions.values())
+
+        screen.stop()
+
+    asyncio.run(main())
+
+
+def test_async_key_callbacks():
+    """
+    Check coroutine key callbacks are scheduled on the event loop.
+    """
+    async def main():
+        screen = AsyncScreen()
+        pressed = []
+
+        async def on_up():
+            pressed.append('Up')
+
+        screen.onkeypress(on_up, 'Up')
+        screen.key = 'Up'
+        await asyncio.sleep(0)
+
+        assert pressed == ['Up']
+
+        screen.stop()
+
+    asyncio.run(main())
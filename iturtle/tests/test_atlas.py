@@ -0,0 +1,96 @@
+"""
+Test cases for sprite atlas packing.
+"""
+
+import struct
+
+import pytest
+
+from ..atlas import build_atlas, image_size
+from ..screen import Screen
+from ..turtle import Turtle
+
+
+def _png(width, height):
+    return b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR' + struct.pack('>II', width, height) + bytes(5)
+
+
+def test_image_size():
+    """
+    Check image sizes are read from headers.
+    """
+    assert image_size(_png(30, 20), 'png') == (30, 20)
+    assert image_size(b'GIF89a' + struct.pack('<HH', 7, 9), 'gif') == (7, 9)
+    assert image_size(b'<svg width="12px" height="8"></svg>', 'svg') == (12, 8)
+    assert image_size(b'<svg viewBox="0 0 64 32"></svg>', 'svg') == (64, 32)
+    assert image_size(b'\xff\xd8\xff\xe0\x00\x04ab\xff\xc0\x00\x0b\x08' + struct.pack('>HH', 5, 6), 'jpg') == (6, 5)
+
+
+def test_build_atlas():
+    """
+    Check images keep their own bytes in the sheet, and images of unknown size are left out.
+    """
+    images = [('a', 'png', _png(4, 4)), ('b', 'txt', b'text'), ('c', 'svg', b'<svg width="3" height="2"></svg>')]
+    sheet, regions = build_atlas(images)
+
+    assert sorted(regions) == ['a', 'c']
+    assert regions['c'] == {'offset': len(_png(4, 4)), 'length': 32, 'width': 3, 'height': 2, 'mime': 'image/svg+xml'}
+    for name, ext, data in [images[0], images[2]]:
+        region = regions[name]
+        assert sheet[region['offset']:region['offset'] + region['length']] == data
+
+
+def test_register_shapes(mock_comm, tmp_path):
+    """
+    Check registered shapes are sent once as an atlas and later used from it.
+    """
+    paths = []
+    for n in range(10):
+        sprite = tmp_path / f'tile{n}.png'
+        sprite.write_bytes(_png(16, 16 + n))
+        paths.append(str(sprite))
+
+    screen = Screen()
+    screen.tracer(0)
+    regions = screen.register_shapes(paths)
+
+    assert sorted(regions) == sorted(paths)
+    assert screen.resource['name'] == f'atlas:{screen.resource["hash"]}'
+    assert screen.resource['regions'] == regions
+    assert bytes(screen.resource['buffer']) == b''.join(_png(16, 16 + n) for n in range(10))
+    assert regions[paths[3]]['height'] == 19
+
+    sent = []
+    screen.observe(lambda change: sent.append(change), 'resource')
+    turtle = Turtle(screen)
+    for path in paths:
+        turtle.shape(path)
+        turtle.stamp()
+
+    assert sent == []
+
+
+def test_register_shapes_twice(mock_comm, tmp_path):
+    """
+    Check atlases registered one after the other are sent apart, and a name is not reused.
+    """
+    paths = []
+    for n in range(4):
+        sprite = tmp_path / f'tile{n}.png'
+        sprite.write_bytes(_png(8, 8 + n))
+        paths.append(str(sprite))
+
+    screen = Screen()
+    screen.tracer(0)
+    screen.register_shapes(paths[:2])
+    first = screen.resource['name']
+    screen.register_shapes(paths[2:])
+
+    assert screen.resource['name'] != first
+    assert screen.regions[paths[0]][0] == first
+    assert screen.regions[paths[2]][0] == screen.resource['name']
+
+    screen.register_shapes(paths[:2], 'tiles')
+
+    with pytest.raises(Exception):
+        screen.register_shapes(paths[2:], 'tiles')
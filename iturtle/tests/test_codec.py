@@ -0,0 +1,189 @@
+"""
+Test cases for action encodings.
+"""
+
+from array import array
+
+from ..codec import (
+    ACTION_CODES, FLAG_CLOCKWISE, FLAG_PEN, FLAG_SHOW, FLOAT_FIELDS, KERNEL_FIELDS, MASK_NODE, MASK_NODE_AT, MASK_REMOVES,
+    NO_REF, REF_FIELDS, DeltaEncoder, pack_actions,
+)
+from ..screen import Screen
+
+
+def _action(**kwargs):
+    action = {
+        'id': 'a',
+        'type': 'L',
+        'position': (10.0, 20.0),
+        'speed': 10,
+        'color': 'black',
+        'heading': 90,
+        'show': True,
+        'stampid': '',
+        'pen': True,
+        'pencolor': 'red',
+        'pensize': 2,
+        'penstretchfactor': (1, 1),
+        'penoutlinewidth': 1,
+        'distance': 5,
+        'radius': 0,
+        'clockwise': 1,
+        'large_arc': 0,
+        'media': None,
+        'shape': '',
+        'need_delay': True,
+        'fill_mode': False,
+    }
+    action.update(kwargs)
+    return action
+
+
+def _unpack(packed):
+    # Fields of every packed action, as src/codec.ts reads them
+    floats = iter(array('f', packed['floats'].tobytes()))
+    refs = iter(array('i', packed['refs'].tobytes()))
+    nodes = iter(array('i', packed['nodes'].tobytes()))
+    last = dict.fromkeys(FLOAT_FIELDS, 0)
+    last.update(dict.fromkeys(REF_FIELDS, NO_REF))
+    node = -1
+    rows = []
+
+    for mask in array('I', packed['masks'].tobytes()):
+        for i, field in enumerate(FLOAT_FIELDS + REF_FIELDS):
+            if mask & (1 << i):
+                last[field] = next(floats if i < len(FLOAT_FIELDS) else refs)
+
+        row = dict(last, node=None, removes=0)
+        if mask & MASK_NODE:
+            node = row['node'] = next(nodes) if mask & MASK_NODE_AT else node + 1
+        if mask & MASK_REMOVES:
+            row['removes'] = next(nodes)
+        rows.append(row)
+
+    return rows
+
+
+def test_pack_actions():
+    """
+    Check packed columns and string table.
+    """
+    packed = pack_actions([
+        _action(),
+        _action(id='b', type='W', text='hi', align='left', font=('Arial', 8, 'normal')),
+    ])
+
+    assert packed['count'] == 2
+    assert list(packed['types']) == [ACTION_CODES['L'], ACTION_CODES['W']]
+    assert packed['flags'][0] == FLAG_SHOW | FLAG_PEN | FLAG_CLOCKWISE
+
+    rows = _unpack(packed)
+    strings = packed['strings']
+
+    assert [rows[0][field] for field in ('x', 'y', 'heading')] == [10.0, 20.0, 90.0]
+    assert rows[1]['font_size'] == 8
+    assert strings[rows[0]['id']] == 'a'
+    assert strings[rows[1]['id']] == 'b'
+    assert rows[0]['media'] == NO_REF
+    assert rows[0]['text'] == NO_REF
+    assert strings[rows[1]['text']] == 'hi'
+    assert strings[rows[1]['color']] == 'black'
+
+    # Strings are interned once across actions
+    assert len(strings) == len(set(strings))
+
+
+def test_pack_changed_fields():
+    """
+    Check only the fields that changed since the previous action are packed, and nodes following each other are implied.
+    """
+    actions = [_action(position=(float(i), 20.0), distance=1, node=i) for i in range(100)]
+    actions.append(_action(position=(99.0, 20.0), distance=1, node=None, nodes=[3, 4]))
+    actions.append(_action(position=(99.0, 20.0), distance=1, node=200))
+    packed = pack_actions(actions)
+    rows = _unpack(packed)
+
+    # The 7 non-zero floats of the first action then x, and its 5 strings
+    assert len(packed['floats']) == 7 + 99
+    assert len(packed['refs']) == 5
+    assert array('i', packed['nodes'].tobytes()).tolist() == [2, 200]
+    assert array('i', packed['removed'].tobytes()).tolist() == [3, 4]
+    assert [row['x'] for row in rows] == [float(i) for i in range(100)] + [99.0, 99.0]
+    assert [row['node'] for row in rows] == list(range(100)) + [None, 200]
+    assert rows[100]['removes'] == 2
+    assert all(packed['strings'][row['pencolor']] == 'red' for row in rows)
+
+
+def test_screen_packed_encoding(mock_comm):
+    """
+    Check packed screens publish frames through binary buffers.
+    """
+    screen = Screen(encoding='packed')
+    screen.tracer(0)
+
+    screen._publish([_action(), _action()])
+
+    assert screen.packed_actions['count'] == 2
+    assert isinstance(screen.packed_actions['floats'], memoryview)
+
+
+def test_delta_encoder():
+    """
+    Check delta encoding keeps only changed fields between keyframes.
+    """
+    encoder = DeltaEncoder(interval=3)
+
+    deltas = encoder.encode([
+        _action(),
+        _action(position=(11.0, 20.0), distance=1),
+        _action(type='UPDATE_STATE', position=(11.0, 20.0), distance=1, heading=120),
+        _action(position=(12.0, 20.0)),
+        _action(id='b'),
+    ])
+
+    assert deltas[0]['keyframe'] is True
+    assert 'need_delay' not in deltas[0]
+    assert deltas[1] == {'id': 'a', 'type': 'L', 'position': (11.0, 20.0), 'distance': 1}
+    assert deltas[2] == {'id': 'a', 'type': 'UPDATE_STATE', 'heading': 120}
+    assert deltas[3]['keyframe'] is True
+    assert deltas[4]['keyframe'] is True
+
+
+def test_delta_removed_fields():
+    """
+    Check fields an action no longer has are listed as removed, and rebuild the action without them.
+    """
+    encoder = DeltaEncoder()
+    actions = [
+        _action(type='WRITE_TEXT', text='hello', align='left'),
+        _action(),
+        _action(type='WRITE_TEXT', text=''),
+    ]
+
+    deltas = encoder.encode(actions)
+    state = {}
+    for delta in deltas:
+        fields = {k: v for k, v in delta.items() if k not in ('keyframe', 'removed')}
+        state = {k: v for k, v in {**state, **fields}.items() if k not in delta.get('removed', [])}
+
+    assert deltas[1] == {'id': 'a', 'type': 'L', 'removed': ['text', 'align']}
+    assert deltas[2] == {'id': 'a', 'type': 'WRITE_TEXT', 'text': ''}
+    assert state == {k: v for k, v in actions[2].items() if k not in KERNEL_FIELDS}
+
+
+def test_pack_path_points():
+    """
+    Check path points of all actions share one pool.
+    """
+    packed = pack_actions([
+        _action(type='P', commands='LL', points=[1.0, 2.0, 3.0, 4.0]),
+        _action(),
+        _action(type='P', commands='M', points=[5.0, 6.0]),
+    ])
+
+    rows = _unpack(packed)
+
+    assert array('f', packed['points'].tobytes()).tolist() == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+    assert packed['strings'][rows[0]['commands']] == 'LL'
+    assert rows[1]['commands'] == NO_REF
+    assert packed['strings'][rows[2]['commands']] == 'M'
@@ -0,0 +1,164 @@
+"""
+Test cases for exporting drawings from the kernel.
+"""
+
+import struct
+import zlib
+
+from ..gif import GIFWriter
+from ..raster import Raster
+from ..screen import Screen
+from ..turtle import Turtle
+
+
+def _decode(data):
+    # Frames of a GIF as (left, top, width, height, color table, palette indices)
+    frames = []
+    i = 13
+
+    while data[i] != 0x3b:
+        if data[i] == 0x21:
+            i += 2
+            while data[i]:
+                i += data[i] + 1
+            i += 1
+            continue
+
+        left, top, width, height, flags = struct.unpack('<HHHHB', data[i + 1:i + 10])
+        i += 10
+        table = data[i:i + (3 << ((flags & 7) + 1))]
+        i += len(table)
+        min_size = data[i]
+        i += 1
+
+        stream = bytearray()
+        while data[i]:
+            stream += data[i + 1:i + 1 + data[i]]
+            i += data[i] + 1
+        i += 1
+
+        bits = int.from_bytes(stream, 'little')
+        clear = 1 << min_size
+        size, position, previous, indices = min_size + 1, 0, None, bytearray()
+        codes = {}
+
+        while True:
+            code = (bits >> position) & ((1 << size) - 1)
+            position += size
+
+            if code == clear:
+                size, previous = min_size + 1, None
+                codes = {c: bytes([c]) for c in range(clear)}
+                continue
+            if code == clear + 1:
+                break
+
+            entry = codes[code] if code in codes else codes[previous] + codes[previous][:1]
+            if previous is not None:
+                codes[len(codes) + 2] = codes[previous] + entry[:1]
+                if (len(codes) + 2 >= (1 << size)) and (size < 12):
+                    size += 1
+            indices += entry
+            previous = code
+
+        frames.append((left, top, width, height, table, bytes(indices)))
+
+    return frames
+
+
+def test_gif_frames():
+    """
+    Check frames only encode the region that changed, and decode back to the same pixels.
+    """
+    raster = Raster(80, 60)
+    frames = []
+
+    class File:
+        def write(self, data):
+            frames.append(data)
+
+    writer = GIFWriter(File(), 80, 60, fps=10)
+    writer.add(raster)
+    raster.polyline([(5, 5), (30, 20)], 3, (255, 0, 0))
+    writer.add(raster)
+
+    assert not writer.add(raster)
+    assert writer.frames == 2
+
+    # Noise overflows the code table
+    for y in range(60):
+        for x in range(80):
+            raster.pixels[3 * (80 * y + x):3 * (80 * y + x) + 3] = bytes([(x * 7 + y * 13 + x * y) % 200] * 3)
+    writer.add(raster)
+    writer.close()
+
+    data = b''.join(frames)
+    decoded = _decode(data)
+    left, top, width, height, table, indices = decoded[1]
+
+    assert data.startswith(b'GIF89a')
+    assert struct.unpack('<H', data[13 + 19 + 4:13 + 19 + 6]) == (10,)
+    assert len(decoded) == 3
+    assert (left, top, left + width, top + height) == (3, 4, 33, 22)
+    assert len(indices) == width * height
+
+    left, top, width, height, table, indices = decoded[2]
+    colors = [table[3 * i:3 * i + 3] for i in indices]
+
+    assert (width, height) == (80, 60)
+    assert colors[80 * 7 + 9] == bytes([(9 * 7 + 7 * 13 + 9 * 7) % 200] * 3)
+    assert colors[-1] == bytes([(79 * 7 + 59 * 13 + 79 * 59) % 200] * 3)
+
+
+def test_screen_exported(mock_comm, tmp_path):
+    """
+    Check a live screen writes what is shown to SVG, PNG and GIF files without a view.
+    """
+    screen = Screen()
+    screen.setup(100, 80)
+    screen.tracer(0)
+
+    turtle = Turtle(screen)
+    turtle.pencolor('blue')
+    for _ in range(4):
+        turtle.forward(20)
+        turtle.left(90)
+    turtle.circle(10)
+    turtle.write('hi')
+    screen.update()
+    turtle.forward(30)
+
+    screen.export_svg(tmp_path / 'drawing.svg')
+    screen.export_png(tmp_path / 'drawing.png')
+    frames = screen.export_gif(tmp_path / 'drawing.gif', fps=20)
+
+    svg = (tmp_path / 'drawing.svg').read_text()
+    png = (tmp_path / 'drawing.png').read_bytes()
+    pixels = zlib.decompress(png[png.index(b'IDAT') + 4:png.index(b'IEND') - 8])
+    decoded = _decode((tmp_path / 'drawing.gif').read_bytes())
+
+    assert svg.count('<path d="M 50,40 L 70,40 L 70,20 L 50,20 L 50,40 A 10,10') == 1
+    assert '>hi</text>' in svg
+    assert pixels[301 * 40 + 1 + 3 * 60:301 * 40 + 1 + 3 * 61] == bytes([0, 0, 255])
+    assert frames == len(decoded) == 1 + 6
+    assert decoded[0][:4] == (0, 0, 100, 80)
+
+
+def test_gif_frames_per_stroke(mock_comm, tmp_path):
+    """
+    Check strokes merged when shown still get a frame each.
+    """
+    screen = Screen()
+    screen.setup(100, 80)
+    screen.tracer(0)
+
+    turtle = Turtle(screen)
+    for n in range(60):
+        turtle.forward(1 + n % 3)
+        turtle.left(6)
+    screen.update()
+
+    frames = screen.export_gif(tmp_path / 'drawing.gif', step=2)
+
+    assert len(screen.scene.replay()) < 10
+    assert frames == 1 + 60 // 2
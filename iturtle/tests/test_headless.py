@@ -0,0 +1,119 @@
+"""
+Test cases for drawing without a frontend.
+"""
+
+import time
+import zlib
+
+from ..headless import HeadlessScreen
+from ..raster import arc_points
+from ..turtle import Turtle
+
+
+def test_headless_svg():
+    """
+    Check drawings are rendered to SVG in-process, and cleared per turtle.
+    """
+    screen = HeadlessScreen(200, 100)
+    turtle = Turtle(screen)
+    other = Turtle(screen)
+
+    for _ in range(4):
+        turtle.forward(20)
+        turtle.left(90)
+    turtle.write('a < b', align='center')
+    other.circle(10)
+
+    svg = screen.to_svg()
+
+    assert svg.startswith('<svg xmlns="http://www.w3.org/2000/svg" width="200" height="100"')
+    assert svg.count('<line ') == 4
+    assert svg.count(' A 10,10 ') == 2
+    assert '>a &lt; b</text>' in svg
+    assert 'text-anchor="middle"' in svg
+
+    turtle.clear()
+
+    svg = screen.to_svg(turtles=False)
+
+    assert '<line ' not in svg
+    assert '<text ' not in svg
+    assert svg.count(' A 10,10 ') == 2
+
+
+def test_headless_png():
+    """
+    Check drawings are rasterized to a valid PNG with lines and fills.
+    """
+    screen = HeadlessScreen(40, 30)
+    screen.bgcolor('black')
+    turtle = Turtle(screen)
+    turtle.pencolor('white')
+    turtle.fillcolor('#ff0000')
+
+    turtle.begin_fill()
+    for _ in range(4):
+        turtle.forward(10)
+        turtle.left(90)
+    turtle.end_fill()
+
+    png = screen.to_png()
+
+    assert png[:8] == b'\x89PNG\r\n\x1a\n'
+    assert png[16:24] == (40).to_bytes(4, 'big') + (30).to_bytes(4, 'big')
+
+    rows = zlib.decompress(png[png.index(b'IDAT') + 4:-16])
+    pixel = lambda x, y: tuple(rows[y * (1 + 3 * 40) + 1 + 3 * x:][:3])
+
+    assert pixel(0, 0) == (0, 0, 0)
+    assert pixel(25, 15) == (255, 255, 255)
+    assert pixel(25, 10) == (255, 0, 0)
+
+
+def test_headless_png_arc_fill():
+    """
+    Check fills traced along arcs are rasterized from the scene outline.
+    """
+    screen = HeadlessScreen(60, 60)
+    turtle = Turtle(screen)
+    turtle.fillcolor('red')
+
+    turtle.begin_fill()
+    turtle.circle(20)
+    turtle.end_fill()
+
+    png = screen.to_png()
+    rows = zlib.decompress(png[png.index(b'IDAT') + 4:-16])
+    pixel = lambda x, y: tuple(rows[y * (1 + 3 * 60) + 1 + 3 * x:][:3])
+
+    assert pixel(30, 10) == (255, 0, 0)
+    assert pixel(45, 10) == (255, 0, 0)
+    assert pixel(55, 10) == (255, 255, 255)
+
+
+def test_arc_points():
+    """
+    Check arcs are flattened on the side given by the sweep flag.
+    """
+    points = arc_points((0, 0), (20, 0), 10, 0, 1)
+
+    assert points[-1] == (20, 0)
+    assert all(abs((x - 10) ** 2 + y ** 2 - 100) < 1e-6 for x, y in points)
+    assert min(y for _, y in points) < -9
+
+
+def test_headless_throughput():
+    """
+    Check many drawings can be generated quickly without a display.
+    """
+    started = time.perf_counter()
+
+    for _ in range(50):
+        screen = HeadlessScreen()
+        turtle = Turtle(screen)
+        for i in range(36):
+            turtle.forward(100)
+            turtle.left(170)
+        screen.to_svg()
+
+    assert time.perf_counter() - started < 5
@@ -0,0 +1,112 @@
+"""
+Test cases for merging the strokes of a frame.
+"""
+
+from array import array
+
+from ..screen import Screen
+from ..turtle import Turtle
+from .test_codec import _unpack
+
+
+def test_strokes_merged(mock_comm):
+    """
+    Check consecutive strokes with the same pen become one path and superseded updates are dropped.
+    """
+    screen = Screen()
+    screen.tracer(0)
+
+    turtle = Turtle(screen)
+    for _ in range(360):
+        turtle.forward(1)
+        turtle.left(1)
+    turtle.pencolor('red')
+    turtle.circle(10)
+    screen.update()
+
+    actions = screen.actions
+
+    assert [action['type'] for action in actions] == ['M', 'P', 'P']
+    assert actions[1]['commands'] == 'L' * 360
+    assert tuple(actions[1]['points'][-2:]) == actions[1]['position']
+    assert actions[2]['commands'] == 'AA'
+    assert actions[2]['arcs'] == [10, 0, 0, 10, 0, 0]
+    assert actions[2]['pencolor'] == 'red'
+    assert len(screen.scene) == 362
+
+    sent = []
+    screen.send = lambda content, buffers=None: sent.append((content, buffers))
+    screen._handle_msg(screen, {'event': 'redraw'}, [])
+
+    content, buffers = sent[0]
+    markup = buffers[0].decode('utf-8')
+
+    assert [action['type'] for action in content['actions']] == ['M']
+    assert markup.count('<g data-node=') == 2
+    assert markup.count(' L ') == 360
+
+
+def test_undo_merged_strokes(mock_comm):
+    """
+    Check removing a merged stroke removes its path and draws the other strokes again.
+    """
+    screen = Screen(encoding='packed')
+    screen.tracer(0)
+
+    turtle = Turtle(screen)
+    for _ in range(3):
+        turtle.forward(10)
+    screen.update()
+
+    first = screen.scene.items(turtle.id)[0]['node']
+    turtle.undo()
+    screen.update()
+
+    packed = screen.packed_actions
+    rows = _unpack(packed)
+    removed = array('i', packed['removed'].tobytes()).tolist()
+
+    assert packed['count'] == 4
+    assert sorted(removed) == [first, first + 1, first + 2]
+    assert [(row['node'], row['removes']) for row in rows] == [(None, 3), (first, 0), (first + 1, 0), (None, 0)]
+    assert turtle.position() == (20, 0)
+    assert not screen.scene.groups
+
+    sent = []
+    screen.send = lambda content, buffers=None: sent.append(buffers[0].decode('utf-8'))
+    screen._handle_msg(screen, {'event': 'redraw'}, [])
+
+    assert sent[0].count('<line ') == 2
+    assert f'data-node="{first + 2}"' not in sent[0]
+
+
+def test_paths_simplified(mock_comm):
+    """
+    Check paths are simplified within tolerance when asked, keeping corners and every vertex in the scene.
+    """
+    screen = Screen(tolerance=0.5)
+    screen.tracer(0)
+
+    turtle = Turtle(screen)
+    for i in range(1, 1001):
+        turtle.goto(i / 10, 0.1 if i % 2 else 0)
+    turtle.goto(100, 100)
+    turtle.circle(10, 90)
+    screen.update()
+
+    path = screen.actions[1]
+
+    assert path['commands'] == 'LLLA'
+    assert path['points'][:4] == [400.1, 249.9, 500.0, 250.0]
+    assert screen.simplified == {'vertices': 1002, 'dropped': 998}
+    assert len(screen.scene) == 1002
+
+    screen._handle_msg(None, {'event': 'redraw'}, [])
+
+    assert screen.simplified == {'vertices': 1002, 'dropped': 998}
+
+    screen.tolerance = None
+    turtle.polyline([(0, 0), (1, 0), (2, 0)])
+    screen.update()
+
+    assert screen.actions[-1]['commands'] == 'LLL'
@@ -0,0 +1,165 @@
+"""
+Test cases for the resource cache.
+"""
+
+import os
+
+from ipywidgets.widgets.widget import _remove_buffers
+
+from .. import resources
+from ..resources import RESOURCES, ResourceCache
+from ..screen import Screen
+from ..turtle import Turtle
+
+
+def test_resource_cache(tmp_path):
+    """
+    Check files are cached by content, re-read when changed and evicted by size.
+    """
+    cache = ResourceCache(max_bytes=20)
+    first = tmp_path / 'a.png'
+    first.write_bytes(b'0123456789')
+
+    entry = cache.get(str(first))
+
+    assert entry['type'] == 'image'
+    assert entry['buffer'] == b'0123456789'
+    assert cache.get(str(first)) is entry
+
+    first.write_bytes(b'9876543210!')
+
+    changed = cache.get(str(first))
+
+    assert changed['hash'] != entry['hash']
+    assert cache.find(entry['hash']) is None
+    assert cache.size == len(changed['buffer'])
+
+
+def test_screens_share_resources(mock_comm, tmp_path):
+    """
+    Check a resource is sent with its buffer once, then by hash to other screens.
+    """
+    sprite = tmp_path / 'sprite.svg'
+    sprite.write_text('<svg></svg>')
+    path = str(sprite)
+
+    first = Screen()
+    first.tracer(0)
+    second = Screen()
+    second.tracer(0)
+
+    first.load(path)
+
+    assert first.resource['buffer'] == b'<svg></svg>'
+
+    second.load(path)
+
+    assert 'buffer' not in second.resource
+    assert second.resource['hash'] == first.resource['hash']
+
+    second._handle_msg(second, {'event': 'missing', 'name': path, 'hash': second.resource['hash']}, [])
+
+    assert second.resource['buffer'] == b'<svg></svg>'
+
+    sprite.write_text('<svg><g/></svg>')
+    os.utime(path, (0, 0))
+    first.load(path)
+
+    assert first.resource['buffer'] == b'<svg><g/></svg>'
+    assert RESOURCES.find(first.resource['hash']) is not None
+
+
+def test_resources_sent_as_binary_buffers(mock_comm, tmp_path, monkeypatch):
+    """
+    Check large files are memory-mapped, resources are synced as binary buffers, not base64, and changed files are not read from their mapping.
+    """
+    monkeypatch.setattr(resources, 'MMAP_BYTES', 16)
+    music = tmp_path / 'music.mp3'
+    music.write_bytes(bytes(range(256)) * 4)
+
+    screen = Screen()
+    screen.tracer(0)
+    screen.load(str(music))
+
+    entry = RESOURCES.get(str(music))
+
+    assert isinstance(entry['buffer'], memoryview)
+    assert isinstance(screen.resource['buffer'], bytes)
+
+    state, buffer_paths, buffers = _remove_buffers(screen.get_state())
+
+    assert ['resource', 'buffer'] in buffer_paths
+    assert bytes(buffers[buffer_paths.index(['resource', 'buffer'])]) == music.read_bytes()
+
+    # The mapping of a file that shrank is never read again, the file is
+    music.write_bytes(bytes(100))
+    os.utime(music, (0, 0))
+    screen._handle_msg(screen, {'event': 'missing', 'name': str(music), 'hash': entry['hash']}, [])
+
+    assert RESOURCES.find(entry['hash']) is None
+    assert bytes(screen.resource['buffer']) == bytes(100)
+
+
+def test_large_resources_streamed(mock_comm, tmp_path, monkeypatch):
+    """
+    Check large resources are streamed in chunks, only referenced once acknowledged, and then shown.
+    """
+    monkeypatch.setattr(resources, 'CHUNK_BYTES', 100)
+    video = tmp_path / 'clip.webm'
+    video.write_bytes(bytes(250))
+    path = str(video)
+
+    screen = Screen()
+    screen.tracer(0)
+    sent = []
+    screen.send = lambda content, buffers=None: sent.append((content, buffers))
+
+    screen.load(path)
+    screen._uploads[path].result()
+
+    assert sent[0][0]['event'] == 'resource_begin'
+    assert sent[0][0]['chunks'] == 3
+    assert [len(buffers[0]) for _, buffers in sent[1:]] == [100, 100, 50]
+    assert screen.upload_progress[path] == (250, 250)
+
+    screen.add_action({'id': 't', 'type': 'STAMP', 'shape': path, 'media': None})
+    screen.add_action({'id': 't', 'type': 'S', 'shape': '', 'media': path})
+    screen.add_action({'id': 'u', 'type': 'UPDATE_STATE', 'shape': path, 'media': None})
+
+    assert [(a['type'], a['shape']) for a in screen._instant] == [('STAMP', ''), ('UPDATE_STATE', '')]
+
+    screen._handle_msg(screen, {'event': 'resource_ack', 'name': path, 'hash': sent[0][0]['hash']}, [])
+
+    assert [(a['id'], a['type']) for a in screen._instant] == [('t', 'STAMP'), ('u', 'UPDATE_STATE'), ('t', 'S'), ('u', 'UPDATE_STATE')]
+    assert sent[0][0]['hash'] in RESOURCES.sent
+
+    # The turtle still showing its shape is shown again with it, the other one moved on
+    screen.update()
+
+    assert screen.scene.turtles['u']['shape'] == path
+    assert screen.scene.turtles['t']['shape'] == ''
+
+
+def test_preload(mock_comm, tmp_path):
+    """
+    Check resources are loaded in the background and later uses are cache hits.
+    """
+    paths = []
+    for n in range(3):
+        sprite = tmp_path / f'sprite{n}.svg'
+        sprite.write_text(f'<svg id="{n}"></svg>')
+        paths.append(str(sprite))
+
+    screen = Screen()
+    screen.tracer(0)
+
+    assert screen.preload(paths).result(5) == paths
+    assert all(path in screen.loaded for path in paths)
+
+    sent = []
+    screen.observe(lambda change: sent.append(change), 'resource')
+    turtle = Turtle(screen)
+    turtle.shape(paths[0])
+
+    assert sent == []
+    assert turtle.shape() == paths[0]
@@ -0,0 +1,172 @@
+"""
+Test cases for the retained scene graph.
+"""
+
+import json
+
+from array import array
+
+from ..headless import HeadlessScreen
+from ..screen import Screen
+from ..turtle import Turtle
+from .test_codec import _unpack
+
+
+def test_scene_nodes():
+    """
+    Check drawing actions become nodes, stamps are cleared one by one and clear drops the layer of a turtle.
+    """
+    screen = HeadlessScreen(200, 100)
+    turtle = Turtle(screen)
+    other = Turtle(screen)
+
+    turtle.begin_fill()
+    turtle.forward(20)
+    turtle.left(90)
+    turtle.forward(20)
+    turtle.end_fill()
+    stamps = [turtle.stamp() for _ in range(3)]
+    other.penup()
+    other.forward(10)
+    other.write('hi')
+
+    assert [node['kind'] for node in screen.scene.items()] == ['line', 'line', 'fill', 'stamp', 'stamp', 'stamp', 'text']
+    assert screen.scene.items(other.id)[0]['action']['text'] == 'hi'
+    assert screen.scene.items(kind='fill')[0]['action']['d'].startswith('M 100.0,50.0 L 120.0,50.0 L 120')
+    assert [round(v) for v in screen.scene.bbox(turtle.id)] == [100, 20, 130, 50]
+
+    turtle.clearstamp(stamps[1])
+    turtle.clearstamps(-1)
+
+    assert [node['action']['stampid'] for node in screen.scene.items(kind='stamp')] == stamps[:1]
+    assert screen.to_svg(turtles=False).count('<svg x=') == 1
+
+    turtle.clear()
+
+    assert screen.scene.items(turtle.id) == []
+    assert len(screen.scene) == 1
+
+
+def test_undo():
+    """
+    Check undo removes the last item of a turtle and moves it back.
+    """
+    screen = HeadlessScreen(200, 100)
+    turtle = Turtle(screen)
+
+    turtle.forward(30)
+    turtle.left(90)
+    turtle.forward(10)
+
+    assert turtle.undobufferentries() == 2
+
+    turtle.undo()
+
+    assert turtle.position() == (30, 0)
+    assert turtle.heading() == 90
+    assert turtle.undobufferentries() == 1
+    assert screen.to_svg(turtles=False).count('<line ') == 1
+
+    turtle.undo()
+    turtle.undo()
+
+    assert turtle.position() == (0, 0)
+    assert turtle.undobufferentries() == 0
+    assert screen.to_png() == HeadlessScreen(200, 100).to_png()
+
+
+def test_scene_replayed_and_packed(mock_comm):
+    """
+    Check new views get the shown nodes, and node ids survive the packed encoding.
+    """
+    screen = Screen(encoding='packed')
+    screen.tracer(0)
+
+    turtle = Turtle(screen)
+    turtle.forward(10)
+    stamp = turtle.stamp()
+    screen.update()
+    turtle.forward(10)
+
+    sent = []
+    screen.send = lambda content, buffers=None: sent.append((content, buffers))
+    screen._handle_msg(screen, {'event': 'redraw'}, [])
+
+    content, buffers = sent[0]
+
+    assert content['event'] == 'snapshot'
+    assert [action['type'] for action in content['actions']] == ['STAMP', 'M']
+    assert content['actions'][-1]['position'] == (410, 250)
+    assert buffers[0].decode('utf-8').startswith('<g data-node="1"><line x1="400" y1="250" x2="410" y2="250"')
+
+    turtle.clearstamp(stamp)
+    screen.update()
+
+    packed = screen.packed_actions
+
+    assert [(row['node'], row['removes']) for row in _unpack(packed)] == [(3, 0), (None, 1)]
+    assert array('i', packed['removed'].tobytes()).tolist() == [2]
+
+
+def test_snapshot_restored(mock_comm):
+    """
+    Check a snapshot stored as JSON shows the same drawing on another screen, in one message.
+    """
+    screen = Screen()
+    screen.tracer(0)
+
+    turtle = Turtle(screen)
+    turtle.begin_fill()
+    turtle.circle(20)
+    turtle.end_fill()
+    turtle.stamp()
+    turtle.write('hi')
+    turtle.forward(10)
+    screen.bgcolor('red')
+    screen.update()
+
+    snapshot = json.loads(json.dumps(screen.snapshot()))
+
+    other = Screen()
+    other.tracer(0)
+    sent = []
+    other.send = lambda content, buffers=None: sent.append((content, buffers))
+    other.restore(snapshot)
+
+    content, buffers = sent[0]
+
+    assert len(sent) == 1
+    assert content['clear']
+    assert [action['type'] for action in content['actions']] == ['STAMP', 'W', 'M']
+    assert buffers[0].decode('utf-8').count('<g data-node=') == 3
+    assert other.background == 'red'
+    assert len(other.scene) == len(screen.scene)
+    assert list(other.scene.stamps) == list(screen.scene.stamps)
+
+    other.scene.add({**content['actions'][-1], 'type': 'L', 'pen': True})
+
+    assert max(other.scene.nodes) == max(screen.scene.nodes) + 1
+
+
+def test_restore_drops_transforms(mock_comm):
+    """
+    Check sprite transforms pending when a snapshot is restored do not move the restored turtles.
+    """
+    screen = Screen()
+    screen.tracer(0)
+
+    turtle = Turtle(screen)
+    turtle.forward(10)
+    screen.update()
+
+    snapshot = screen.snapshot()
+    position = screen.scene.turtles[turtle.id]['position']
+
+    screen.update_turtles([turtle.id], [(50, 50)])
+    sent = []
+    screen.send = lambda content, buffers=None: sent.append(content)
+    screen.restore(snapshot)
+    screen.update()
+
+    assert [content['event'] for content in sent] == ['snapshot']
+    assert screen.scene.turtles[turtle.id]['position'] == position
@@ -0,0 +1,302 @@
+"""
+Test cases for screen action scheduling.
+"""
+
+import threading
+import time
+
+from .. import screen as screen_module
+from .. import shutdown
+from ..metrics import Metrics
+from ..screen import MAX_INFLIGHT_FRAMES, Screen
+from ..turtle import ACTIVE_TURTLES, FASTEST_DELAY, Turtle
+
+
+def test_turtles_share_screen_thread():
+    """
+    Check turtles do not start threads of their own.
+    """
+    screen = Screen()
+    count = threading.active_count()
+
+    turtles = [Turtle(screen) for _ in range(20)]
+    for turtle in turtles:
+        turtle.forward(10)
+
+    assert threading.active_count() == count
+
+    screen.tracer(0)
+
+
+def test_actions_paced_by_due_time():
+    """
+    Check animated actions of a turtle are due one after another.
+    """
+    screen = Screen()
+    screen.stop()
+
+    turtle = Turtle(screen)
+    screen._build_actions()
+
+    turtle.forward(10)
+    turtle.left(90)
+    turtle.forward(10)
+
+    dues = [due for due, _ in screen.todo_actions[turtle.id]]
+
+    assert abs(dues[1] - dues[0]) < 1e-6
+    assert abs(dues[2] - dues[1] - FASTEST_DELAY) < 1e-3
+
+    assert len(screen._build_actions(dues[0])) == 2
+    assert len(screen._build_actions(dues[2])) == 1
+    assert screen._build_actions() == []
+
+
+def test_manual_mode_skips_pacing():
+    """
+    Check actions bypass scheduling when tracer is off and are flushed by update.
+    """
+    screen = Screen()
+    screen.tracer(0)
+
+    turtle = Turtle(screen)
+    for _ in range(10):
+        turtle.forward(10)
+
+    assert not screen.todo_actions
+    assert len(screen._instant) == 14
+
+    screen.update()
+
+    # Strokes are merged into one path, see optimize.py
+    assert [action['type'] for action in screen.actions] == ['M', 'P']
+    assert len(screen.actions[1]['commands']) == 10
+    assert len(screen._instant) == 0
+
+
+def test_frames_coalesced_and_acknowledged():
+    """
+    Check empty frames are skipped, frames are capped and unacknowledged frames hold back the next ones.
+    """
+    screen = Screen()
+    screen.stop()
+
+    turtle = Turtle(screen)
+    screen._build_actions()
+
+    screen._publish([])
+    assert screen.frame == 0
+
+    for _ in range(5):
+        turtle.forward(10)
+
+    assert len(screen._build_actions(None, 3)) == 3
+    assert len(screen._build_actions(None, 3)) == 2
+    assert screen._next_due() is None
+
+    for _ in range(MAX_INFLIGHT_FRAMES):
+        screen._publish([{'id': turtle.id, 'type': 'UPDATE_STATE'}])
+    assert screen._ready(0)
+
+    screen._handle_msg(screen, {'event': 'ack', 'frame': 1}, [])
+    assert screen.latency > 0
+    assert screen._ready(0)
+
+    screen._publish([{'id': turtle.id, 'type': 'UPDATE_STATE'}])
+    assert not screen._ready(screen._sent[-1][1])
+    assert screen._frame_interval() >= screen.interval / 1000
+
+
+def test_ack_timeout_recovers():
+    """
+    Check frames go out at full rate again once a view stops acknowledging them.
+    """
+    screen = Screen()
+    screen.stop()
+    turtle = Turtle(screen)
+
+    screen._publish([{'id': turtle.id, 'type': 'UPDATE_STATE'}])
+    screen._handle_msg(screen, {'event': 'ack', 'frame': 1}, [])
+
+    for _ in range(MAX_INFLIGHT_FRAMES):
+        screen._publish([{'id': turtle.id, 'type': 'UPDATE_STATE'}])
+    sent_at = screen._sent[-1][1]
+
+    assert not screen._ready(sent_at)
+    assert screen._ready(sent_at + screen_module.ACK_TIMEOUT + 0.1)
+
+    for _ in range(2 * MAX_INFLIGHT_FRAMES):
+        screen._publish([{'id': turtle.id, 'type': 'UPDATE_STATE'}])
+        assert screen._ready(screen._sent[-1][1])
+
+
+def test_stats():
+    """
+    Check metrics are only recorded once enabled, and tell hooks about every measure.
+    """
+    screen = Screen(encoding='packed')
+    screen.tracer(0)
+    turtle = Turtle(screen)
+    turtle.forward(10)
+    screen.update()
+
+    assert screen.stats()['counters'] == {}
+
+    measured = []
+    screen.metrics.enable()
+    screen.metrics.hooks.append(lambda name, value: measured.append(name))
+
+    for _ in range(10):
+        turtle.forward(10)
+    turtle.write('hi')
+    stats = screen.stats()
+
+    assert stats['counters'] == {'actions': 11}
+    assert stats['instant'] == 11
+    assert stats['latencies']['queue']['count'] == 11
+
+    screen.update()
+    stats = screen.stats()
+
+    assert stats['counters']['frames'] == 1
+    assert stats['counters']['actions_sent'] + stats['counters']['actions_merged'] == 11
+    assert stats['sizes']['frame_bytes']['count'] == 1
+    assert stats['sizes']['frame_bytes']['total'] > 0
+    assert set(stats['latencies']) == {'queue', 'build', 'merge', 'sync'}
+    assert stats['instant'] == 0
+    assert measured.count('actions') == 11 and 'frame_bytes' in measured
+
+
+def test_metrics_threads():
+    """
+    Check measures taken from many threads at once are all recorded.
+    """
+    metrics = Metrics(enabled=True)
+
+    def measure():
+        for _ in range(10000):
+            metrics.count('actions')
+            metrics.observe('queue', 1e-6)
+
+    threads = [threading.Thread(target=measure) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = metrics.snapshot()
+
+    assert stats['counters']['actions'] == 40000
+    assert stats['latencies']['queue']['count'] == 40000
+
+
+def test_producers_do_not_block_drain():
+    """
+    Check actions added from several threads while frames are drained are neither lost nor reordered.
+    """
+    screen = Screen()
+    screen.stop()
+
+    def produce(_id):
+        for i in range(5000):
+            screen.add_action({'id': _id, 'type': 'L', 'index': i})
+
+    producers = [threading.Thread(target=produce, args=(str(n),)) for n in range(4)]
+    for producer in producers:
+        producer.start()
+
+    drained = []
+    while any(producer.is_alive() for producer in producers):
+        drained.extend(screen._build_actions(None, 1000))
+    for producer in producers:
+        producer.join()
+    drained.extend(screen._build_actions())
+
+    assert len(drained) == 20000
+    for n in range(4):
+        assert [a['index'] for a in drained if a['id'] == str(n)] == list(range(5000))
+
+
+def test_drained_turtles_forgotten():
+    """
+    Check the queues and clocks of turtles are dropped once they are drained, but not before.
+    """
+    screen = Screen()
+    screen.stop()
+
+    for n in range(100):
+        screen.add_action({'id': f'swarm:{n}', 'type': 'L'}, 0.5)
+
+    now = time.monotonic()
+    screen._build_actions(now)
+
+    assert len(screen.todo_actions) == len(screen._clocks) == 100
+
+    drained = screen._build_actions(now + 1)
+
+    assert len(drained) == 100
+    assert screen.todo_actions == {} and screen._clocks == {}
+
+
+def test_idle_thread_exits(monkeypatch):
+    """
+    Check the frame loop thread exits when nothing is queued and restarts with the next action.
+    """
+    monkeypatch.setattr(screen_module, 'IDLE_TIMEOUT', 0.05)
+
+    screen = Screen()
+    turtle = Turtle(screen)
+    turtle.forward(10)
+
+    deadline = time.monotonic() + 5
+    while screen.thread is not None and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert screen.thread is None
+    frame = screen.frame
+
+    turtle.forward(10)
+    deadline = time.monotonic() + 5
+    while screen.frame == frame and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert screen.frame > frame
+    assert screen.actions[-1]['position'] == turtle._canvas_position
+
+    screen.close()
+
+
+def test_shutdown_releases_threads(tmp_path):
+    """
+    Check closing screens and shutting down leaves as many threads as before, and turtles are not kept alive.
+    """
+    shutdown()
+    count = threading.active_count()
+
+    image = tmp_path / 'tile.svg'
+    image.write_text('<svg xmlns="http://www.w3.org/2000/svg" width="4" height="4"></svg>')
+
+    screens = [Screen() for _ in range(3)]
+    for screen in screens:
+        Turtle(screen).forward(10)
+    screens[0].preload([str(image)]).result(5)
+
+    with Screen() as other:
+        turtle = Turtle(other)
+        turtle.forward(20)
+        turtle.forward(20)
+
+    assert other.closed
+    assert other.actions[-1]['position'] == turtle._canvas_position
+    assert other.thread is None or not other.thread.is_alive()
+    assert threading.active_count() > count
+
+    turtle.forward(20)
+    del turtle
+
+    assert len(ACTIVE_TURTLES) == 0
+
+    shutdown()
+
+    assert threading.active_count() == count
+    assert all(screen.closed for screen in screens)
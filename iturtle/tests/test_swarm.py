@@ -0,0 +1,152 @@
+"""
+Test cases for swarms of turtles held as arrays.
+"""
+
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from ..headless import HeadlessScreen
+from ..screen import Screen
+from ..swarm import TurtleSwarm
+from ..turtle import Turtle
+
+
+def test_swarm_motion():
+    """
+    Check members move like turtles, each with its own heading and pen.
+    """
+    screen = HeadlessScreen(200, 100)
+    swarm = TurtleSwarm(4, screen)
+    turtle = Turtle(screen)
+
+    swarm.left([0, 90, 45, -120])
+    swarm.forward(10)
+    swarm.penup([0, 1])
+    swarm.right(30)
+    swarm.forward([5, 5, 20, 20])
+
+    for turn, step in [(45, 10), (-30, 20)]:
+        turtle.left(turn)
+        turtle.forward(step)
+
+    assert np.allclose(swarm.position()[2], turtle.position())
+    assert abs(swarm.heading[2] - turtle.heading() % 360) < 1e-5
+    assert swarm.pen.tolist() == [False, False, True, True]
+    assert [node['action']['commands'] for node in screen.scene.items(swarm.id)] == ['ML' * 4, 'ML' * 2]
+    assert screen.to_svg(turtles=False).count('<path ') == 2
+    assert screen.to_svg().count('<svg x=') == 4 + 1
+
+    swarm.clear()
+
+    assert screen.scene.items(swarm.id) == []
+
+
+def test_swarm_frame(mock_comm):
+    """
+    Check a move of the whole swarm adds one path, and members are moved by one packed message a frame.
+    """
+    screen = Screen()
+    screen.tracer(0)
+
+    sent = []
+    screen.send = lambda content, buffers=None: sent.append((content, buffers))
+
+    swarm = TurtleSwarm(1000, screen)
+    swarm.setheading(np.arange(1000) * 0.36)
+    swarm.forward(50)
+    swarm.forward(50)
+    screen.update()
+
+    actions = screen.actions
+    path = actions[-1]
+    content, (slots, transforms) = sent[0]
+    transforms = np.frombuffer(transforms, dtype=np.float32).reshape(-1, 3)
+
+    assert [action['type'] for action in actions] == ['UPDATE_STATE', 'P']
+    assert actions[0]['members'] == 1000
+    assert path['commands'] == 'ML' * 2000
+    assert not path['show']
+    assert len(sent) == 1
+    assert content['names'] == [[0, swarm.id, 1000]]
+    assert np.frombuffer(slots, dtype=np.int32).tolist() == list(range(1000))
+    assert np.allclose(transforms[-1], (400 + 100 * np.cos(np.radians(359.64)), 250 - 100 * np.sin(np.radians(359.64)), 359.64), atol=1e-3)
+    assert np.allclose(path['points'][-2:], transforms[-1][:2], atol=1e-3)
+    assert np.allclose(screen.scene.swarms[swarm.id][1][-3:], transforms[-1])
+    assert swarm.x.nbytes + swarm.y.nbytes + swarm.heading.nbytes + swarm.pen.nbytes == 25 * 1000
+
+    # Members share one entry wherever the screen keeps turtles
+    swarm.color('red')
+    screen.update()
+
+    assert screen.actions == [{**screen.actions[0], 'id': swarm.id, 'members': 1000, 'color': 'red'}]
+    assert list(screen.scene.turtles) == list(screen.scene._latest) == list(screen.scene.swarms) == [swarm.id]
+    assert list(screen._slots) == [swarm.id]
+    assert screen.todo_actions == {} and screen._clocks == {}
+    assert np.allclose(screen.scene.swarms[swarm.id][1][-3:], transforms[-1])
+
+    swarm.left(90)
+    screen.update()
+
+    content, (slots, transforms) = sent[-1]
+
+    assert len(sent) == 2
+    assert content['names'] == []
+    assert np.frombuffer(transforms, dtype=np.float32)[2] == 90
+
+
+def test_swarm_paced(mock_comm):
+    """
+    Check members are moved when the strokes that take them there are drawn.
+    """
+    screen = Screen()
+    screen.stop()
+
+    sent = []
+    screen.send = lambda content, buffers=None: sent.append((content, buffers))
+
+    swarm = TurtleSwarm(3, screen)
+    swarm.speed('fastest')
+    assert swarm.speed() == 10
+    swarm.speed('slowest')
+    swarm.forward(200)
+
+    now = time.monotonic()
+    screen._publish(screen._build_actions(now), now)
+
+    assert [action['type'] for action in screen.actions] == ['UPDATE_STATE']
+    assert sent == []
+
+    due = screen._next_due()
+    screen._publish(screen._build_actions(due), due)
+
+    assert due > now
+    assert screen.actions[-1]['type'] == 'P'
+    assert len(sent) == 1
+    assert np.frombuffer(sent[0][1][1], dtype=np.float32)[0] == 600
+
+
+def test_swarm_redrawn(mock_comm):
+    """
+    Check new views get the shared state of a swarm once, and its members where they are.
+    """
+    screen = Screen()
+    screen.tracer(0)
+
+    swarm = TurtleSwarm(3, screen)
+    swarm.left([0, 90, 180])
+    swarm.forward(10)
+    screen.update()
+
+    sent = []
+    screen.send = lambda content, buffers=None: sent.append((content, buffers))
+    screen._handle_msg(screen, {'event': 'redraw'}, [])
+
+    content, (_, slots, transforms) = sent[0]
+
+    assert content['names'] == [[0, swarm.id, 3]]
+    assert [action['members'] for action in content['actions'] if 'members' in action] == [3]
+    assert np.frombuffer(slots, dtype=np.int32).tolist() == [0, 1, 2]
+    assert np.allclose(np.frombuffer(transforms, dtype=np.float32), [410, 250, 0, 400, 240, 90, 390, 250, 180])
@@ -0,0 +1,62 @@
+"""
+Test cases for vectorized turtle geometry.
+"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from ..turtle import Turtle
+from ..vector import draw_lsystem, draw_walk, interpret, lsystem, walk
+
+
+def test_walk():
+    """
+    Check vectorized walk matches turtle motion.
+    """
+    turtle = Turtle()
+    turns = [0, 90, 45, -120]
+    steps = [10, 20, 5, 30]
+
+    for turn, step in zip(turns, steps):
+        turtle.left(turn)
+        turtle.forward(step)
+
+    xs, ys, headings = walk(turns, steps)
+
+    assert abs(xs[-1] - turtle.xcor()) < 1e-5
+    assert abs(ys[-1] - turtle.ycor()) < 1e-5
+    assert abs(headings[-1] - turtle.heading() % 360) < 1e-5
+
+
+def test_lsystem():
+    """
+    Check L-system expansion and interpretation with nested branches.
+    """
+    assert lsystem("F", {"F": "F+F"}, 2) == "F+F+F+F"
+
+    commands, xs, ys, heading = interpret("F[+F[-F]F]F", 90, 10)
+
+    assert commands == "LLLMLML"
+    assert np.allclose(xs, [10, 10, 20, 10, 10, 10, 20])
+    assert np.allclose(ys, [0, 10, 10, 10, 20, 0, 0])
+    assert heading == 0
+
+
+def test_draw_batches():
+    """
+    Check turtles are moved to the end of vectorized paths.
+    """
+    turtle = Turtle()
+
+    draw_walk(turtle, 90, [10, 10, 10])
+    assert np.allclose(turtle.pos(), (-10, 0))
+    assert turtle.heading() == 270
+
+    draw_lsystem(turtle, "F[+F]F", 90, 10)
+    assert np.allclose(turtle.pos(), (-10, -20))
+    assert turtle.heading() == 270
+
+    draw_lsystem(turtle, "+-+", 90, 10)
+    assert np.allclose(turtle.pos(), (-10, -20))
+    assert turtle.heading() == 0
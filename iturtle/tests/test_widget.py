@@ -259,3 +259,21 @@ def test_logo_mode():
 
     t.setheading(300)
     t.heading() == 300
+
+
+def test_turtle_polyline():
+    """
+    Check turtle polyline and path methods.
+    """
+    turtle = Turtle()
+
+    turtle.polyline([(10, 0), (10, 10), (0, 10)])
+    assert turtle.pos() == (0, 10)
+    assert turtle.heading() == 180
+
+    turtle.path([("M", 0, 0), ("L", 0, -20)])
+    assert turtle.pos() == (0, -20)
+    assert turtle.heading() == 270
+
+    with pytest.raises(Exception):
+        turtle.path([("C", 0, 0)])
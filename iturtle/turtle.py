@@ -1,16 +1,18 @@
-import queue
-import threading
 import sys
 import time
 import uuid
+import weakref
 
-from .screen import Screen
+from . import resources
+from .screen import BUILTIN_SHAPES, SCREENS, Screen
 from .utils import build_color, decode_color
 from math import atan2, cos, degrees, radians, sin, sqrt
 from traitlets import Enum
 
-ACTIVE_TURTLES = set()
+ACTIVE_TURTLES = weakref.WeakSet() # Turtles are dropped once nothing else refers to them
 DEFAULT_HEADING = 0
+FASTEST_DELAY = 0.02
+SPEED_NAMES = {'fastest': 10, 'fast': 10, 'normal': 6, 'slow': 3, 'slowest': 1}
 
 class ActionType(str, Enum):
   MOVE_ABSOLUTE = 'M'
@@ -26,32 +28,26 @@ class ActionType(str, Enum):
   BEGIN_FILL = 'BEGIN_FILL'
   END_FILL = 'END_FILL'
   DONE = 'DONE'
-
-def turtle_worker(*args):
-  screen = args[0]
-  queue = args[1]
-  stop_event = args[2]
+  PATH = 'P'
+  REMOVE = 'RM'
+
+def action_delay(speed, distance, screen_delay):
+  """
+  Seconds an animated action waits after the previous action of its turtle.
+  """
+  if speed < 10:
+    return max(abs(distance) * screen_delay / (3 * 1.1 ** speed * speed), 1) * 0.05
+  
+  return FASTEST_DELAY
+
+def speed_value(_speed):
+  """
+  The speed from 1 to 10 of a speed name or number, 10 for anything else.
+  """
+  if type(_speed) is str:
+    return SPEED_NAMES.get(_speed, 10)
   
-  while not stop_event.is_set():
-    try:
-      action = queue.get(block=True, timeout=3)
-      if action:
-        delay = 0.02
-        if action['need_delay']:
-          distance = action['distance']
-          speed = action['speed']
-          
-          if speed < 10:
-            delay = max(
-              abs(distance) * screen.delay / (3 * 1.1 ** speed * speed),
-              1
-            ) * 0.05
-            
-          time.sleep(delay)
-
-        screen.add_action(action)
-    except Exception:
-      pass
+  return int(round(_speed)) if 0.5 < _speed < 10.5 else 10
 
 def set_active(func):
   def wrapper(*args, **kwargs):
@@ -94,12 +90,7 @@ class Turtle:
       self.screen = Screen()
     else:
       self.screen = screen
-    
-    self.stop_event = threading.Event()
-    self._queue = queue.Queue()
-    
-    self._thread = threading.Thread(target=turtle_worker, args=(self.screen, self._queue, self.stop_event))
-    self._thread.start()
+    self._own_screen = screen is None
     
     self.id = str(uuid.uuid4())
     
@@ -111,6 +102,16 @@ class Turtle:
     
     ACTIVE_TURTLES.add(self)
     
+  def __enter__(self):
+    return self
+  
+  def __exit__(self, *exc):
+    ACTIVE_TURTLES.discard(self)
+    
+    # A screen created for the turtle goes with it
+    if self._own_screen:
+      self.screen.__exit__(*exc)
+    
   def _init(self):
     self._stretchfactor = (1, 1)
     self._outlinewidth = 1
@@ -138,49 +139,55 @@ class Turtle:
     self._align = 'left'
     self._font = ('Arial', 8, 'normal')
     self._fill_mode = False # Default not in fill node
+    self._commands = ''
+    self._points = []
+    self._nodes = [] # Scene nodes to remove, see Scene in scene.py
+    self._due = 0 # When the last action is shown, see Screen.add_action
     
     self._add_action(ActionType.UPDATE_STATE, False)
     
-  def __del__(self):
-    self.stop_event.set()
-    self._thread.join()
-    
   def done(self):
     self._add_action(ActionType.DONE, False)
     
   def _add_action(self, action_type, need_delay=True):
-    if not self.stop_event.is_set():
-      action = {
-        'id': self.id,
-        'type': action_type,
-        'position': self._canvas_position,
-        'speed': self._speed,
-        'color': self._color,
-        'heading': self._heading,
-        "show": self._show,
-        'stampid': self._stampid,
-        'pen': self._pen,
-        'pencolor': self._pencolor,
-        'pensize': self._pensize,
-        'penstretchfactor': self._penstretchfactor,
-        'penoutlinewidth': self._penoutlinewidth,
-        'distance': abs(self._distance),
-        'radius': self._radius,
-        'clockwise': self._clockwise,
-        'large_arc': self._large_arc,
-        'media': self._media,
-        'shape': self._shape,
-        'need_delay': need_delay,
-        'fill_mode': self._fill_mode,
-      }
+    action = {
+      'id': self.id,
+      'type': action_type,
+      'position': self._canvas_position,
+      'speed': self._speed,
+      'color': self._color,
+      'heading': self._heading,
+      "show": self._show,
+      'stampid': self._stampid,
+      'pen': self._pen,
+      'pencolor': self._pencolor,
+      'pensize': self._pensize,
+      'penstretchfactor': self._penstretchfactor,
+      'penoutlinewidth': self._penoutlinewidth,
+      'distance': abs(self._distance),
+      'radius': self._radius,
+      'clockwise': self._clockwise,
+      'large_arc': self._large_arc,
+      'media': self._media,
+      'shape': self._shape,
+      'need_delay': need_delay,
+      'fill_mode': self._fill_mode,
+    }
+    
+    if (action_type == ActionType.WRITE_TEXT) and self._text:
+      action['text'] = self._text
+      action["font"] = self._font
+      action["align"] = self._align    
       
-      if (action_type == ActionType.WRITE_TEXT) and self._text:
-        action['text'] = self._text
-        action["font"] = self._font
-        action["align"] = self._align    
-        
-      # self.screen.add_action(action)
-      self._queue.put(action)
+    if action_type == ActionType.PATH:
+      action['commands'] = self._commands
+      action['points'] = self._points
+      
+    if action_type == ActionType.REMOVE:
+      action['nodes'] = self._nodes
+      
+    delay = action_delay(self._speed, self._distance, self.screen.delay) if need_delay and self.screen._tracer else 0
+    self._due = self.screen.add_action(action, delay)
     
   @set_active
   def showturtle(self):
@@ -229,22 +236,7 @@ class Turtle:
     if _speed is None:
       return self._speed
     else:
-      self._speed = 10
-      
-      if type(_speed) is str:
-        if _speed == 'fastest':
-          self._speed = 10
-        elif _speed == 'fast':
-          self._speed = 10
-        elif _speed == 'normal':
-          self._speed = 6
-        elif _speed == 'slow':
-          self._speed = 3
-        elif _speed == 'slowest':
-          self._speed = 1
-      else:
-        if 0.5 < _speed < 10.5:
-          self._speed = int(round(_speed))
+      self._speed = speed_value(_speed)
 
   def colormode(self, mode=None):
     if mode is None:
@@ -307,7 +299,7 @@ class Turtle:
 
   @set_active
   def shape(self, _shape=None, reload=False):
-    if _shape not in ['circle', 'default', 'square', 'triangle', 'turtle']:
+    if _shape not in [None, *BUILTIN_SHAPES]:
       self.screen.load(_shape, reload)
         
     if _shape is None:
@@ -407,6 +399,62 @@ class Turtle:
     
     self._add_action(ActionType.LINE_ABSOLUTE if self._pen else ActionType.MOVE_ABSOLUTE, need_delay)
 
+  @set_active
+  def polyline(self, points):
+    self._path('L' * len(points), points)
+
+  @set_active
+  def path(self, commands):
+    ops = ''.join(c[0] for c in commands)
+    
+    unknown = set(ops) - {'M', 'L'}
+    if unknown:
+      raise Exception(f'Unknown path commands {unknown}, expected M or L')
+      
+    self._path(ops, [c[1:] for c in commands])
+
+  def _path(self, commands, points):
+    if not commands:
+      return
+    
+    # NumPy arrays and the like are converted in one go rather than per element
+    if hasattr(points, 'tolist'):
+      points = points.tolist()
+      
+    w, h = self.screen.width / 2, self.screen.height / 2
+    x, y = self._x, self._y
+    dx, dy = 0, 0
+    distance = 0
+    canvas = []
+    
+    for _, (_x, _y) in zip(commands, points):
+      if (_x != x) or (_y != y):
+        dx, dy = _x - x, _y - y
+        distance += sqrt(dx * dx + dy * dy)
+        x, y = _x, _y
+        
+      canvas.append(x + w)
+      canvas.append(h - y)
+    
+    heading = (degrees(atan2(dy, dx)) % 360) if (dx or dy) else self._heading
+    
+    self._emit_path(commands, canvas, x, y, heading, distance)
+
+  def _emit_path(self, commands, canvas, x, y, heading, distance):
+    self._x, self._y = x, y
+    self._heading = heading
+    self._canvas_position = self._to_canvas_pos(self._x, self._y)
+    self._distance = distance
+    
+    if self._pen:
+      self._commands = commands
+      self._points = canvas
+      self._add_action(ActionType.PATH)
+      self._commands = ''
+      self._points = []
+    else:
+      self._add_action(ActionType.MOVE_ABSOLUTE)
+
   @set_active
   def teleport(self, x, y=None):
     if (y == None) and (type(x) in [list, tuple]):
@@ -424,7 +472,53 @@ class Turtle:
     self._stampid = str(uuid.uuid4())
     self._add_action(ActionType.STAMP, False)
     
-    self._stampid = ''
+    stampid, self._stampid = self._stampid, ''
+    
+    return stampid
+
+  @set_active
+  def clearstamp(self, stampid):
+    self._remove([self.screen.scene.stamps.get(stampid)])
+
+  @set_active
+  def clearstamps(self, n=None):
+    stamps = [node['node'] for node in self.screen.scene.items(self.id, 'stamp')]
+    
+    if n is None:
+      self._remove(stamps)
+    elif n > 0:
+      self._remove(stamps[:n])
+    elif n < 0:
+      self._remove(stamps[n:])
+
+  @set_active
+  def undo(self):
+    """
+    Remove the last item drawn by the turtle, and move it back to where it
+    was before drawing it.
+    """
+    node = self.screen.scene.last(self.id)
+    if node is None:
+      return
+    
+    if node['before'] is not None:
+      self._canvas_position, self._heading = node['before']
+      self._x = self._canvas_position[0] - self.screen.width / 2
+      self._y = self.screen.height / 2 - self._canvas_position[1]
+      
+    self._remove([node['node']])
+
+  def undobufferentries(self):
+    return len(self.screen.scene.layers.get(self.id, {}))
+
+  def _remove(self, nodes):
+    self._nodes = [n for n in nodes if n is not None]
+    
+    if self._nodes:
+      self._distance = 0
+      self._add_action(ActionType.REMOVE, False)
+      
+    self._nodes = []
 
   @set_active
   def home(self):
@@ -572,9 +666,20 @@ class Turtle:
 
 def done():
   screens = set()
-  for t in ACTIVE_TURTLES:
+  for t in list(ACTIVE_TURTLES):
     if t.screen not in screens:
       t.done()
       screens.add(t.screen)
 
-  ACTIVE_TURTLES.clear()
\ No newline at end of file
+  ACTIVE_TURTLES.clear()
+
+def shutdown():
+  """
+  Close every screen and forget every turtle, then stop the resource threads,
+  so that no thread of iturtle is left running. New screens work as usual.
+  """
+  for screen in list(SCREENS):
+    screen.close()
+
+  ACTIVE_TURTLES.clear()
+  resources.shutdown()
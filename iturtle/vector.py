@@ -0,0 +1,157 @@
+"""
+Vectorized turtle geometry over NumPy arrays.
+
+Instead of moving a turtle one step at a time, whole programs of turns and
+steps (random walks, L-systems) are computed in a single pass and handed to a
+turtle as one path.
+"""
+
+import numpy as np
+
+# L-system symbols, anything else is ignored when interpreting a program
+DRAW_SYMBOLS = 'FG'
+MOVE_SYMBOLS = 'f'
+LEFT = '+'
+RIGHT = '-'
+PUSH = '['
+POP = ']'
+
+def walk(turns, steps, start=(0, 0), heading=0):
+  """
+  Positions and headings of a turtle that turns then steps, pair by pair.
+
+  Returns xs, ys and headings arrays, one entry per (turn, step) pair.
+  """
+  turns, steps = np.broadcast_arrays(np.asarray(turns, dtype=float), np.asarray(steps, dtype=float))
+
+  headings = heading + np.cumsum(turns)
+  angles = np.radians(headings)
+
+  xs = start[0] + np.cumsum(steps * np.cos(angles))
+  ys = start[1] + np.cumsum(steps * np.sin(angles))
+
+  return xs, ys, headings % 360
+
+def to_canvas(xs, ys, width, height):
+  """
+  Convert turtle coordinates to flat [x0, y0, x1, y1, ...] canvas coordinates.
+  """
+  canvas = np.empty(2 * len(xs))
+  canvas[0::2] = xs + width / 2
+  canvas[1::2] = height / 2 - ys
+
+  return canvas
+
+def lsystem(axiom, rules, iterations):
+  """
+  Expand an L-system, rules map a symbol to its replacement string.
+  """
+  table = str.maketrans(rules)
+  program = axiom
+
+  for _ in range(iterations):
+    program = program.translate(table)
+
+  return program
+
+def _restore(values, opens, closes):
+  # Values after each POP jump back to the values at the matching PUSH. The raw
+  # cumulative values are corrected by offsets added at every POP. The total
+  # offset after a POP is the jump back plus the total offset in effect at its
+  # PUSH, which only depends on earlier POPs.
+  if not len(closes):
+    return values
+
+  totals = (values[opens] - values[closes - 1]).tolist()
+  previous = (np.searchsorted(closes, opens) - 1).tolist()
+
+  for k, j in enumerate(previous):
+    if j >= 0:
+      totals[k] += totals[j]
+
+  totals = np.asarray(totals)
+  offsets = np.zeros_like(values)
+  offsets[closes] = np.diff(totals, prepend=0)
+
+  return values + np.cumsum(offsets)
+
+def interpret(program, angle, step, start=(0, 0), heading=0):
+  """
+  Interpret an L-system program with turtle semantics.
+
+  F and G draw a step forward, f moves a step forward without drawing, + and -
+  turn left and right by angle, [ and ] push and pop the turtle state.
+
+  Returns the path commands (L to draw, M to move) with the xs and ys of
+  every point, and the final heading.
+  """
+  symbols = np.frombuffer(program.encode('ascii'), dtype=np.uint8)
+
+  def mask(chars):
+    return np.isin(symbols, np.frombuffer(chars.encode('ascii'), dtype=np.uint8))
+
+  draws = mask(DRAW_SYMBOLS)
+  moves = mask(MOVE_SYMBOLS)
+  pops = mask(POP)
+
+  # Match brackets, a stack is only needed over the brackets themselves
+  brackets = np.flatnonzero(mask(PUSH + POP))
+  opens = np.empty(int(pops.sum()), dtype=np.intp)
+  closes = np.flatnonzero(pops)
+  stack = []
+  k = 0
+  for i in brackets.tolist():
+    if program[i] == PUSH:
+      stack.append(i)
+    else:
+      opens[k] = stack.pop()
+      k += 1
+
+  turns = np.where(mask(LEFT), angle, 0.0) - np.where(mask(RIGHT), angle, 0.0)
+  headings = _restore(heading + np.cumsum(turns), opens, closes)
+
+  angles = np.radians(headings)
+  steps = np.where(draws | moves, float(step), 0.0)
+  xs = _restore(start[0] + np.cumsum(steps * np.cos(angles)), opens, closes)
+  ys = _restore(start[1] + np.cumsum(steps * np.sin(angles)), opens, closes)
+
+  # Every step and every jump back to a pushed state ends at a path point
+  points = draws | moves | pops
+  commands = np.where(draws[points], ord('L'), ord('M')).astype(np.uint8).tobytes().decode('ascii')
+  final = headings[-1] % 360 if len(headings) else heading
+
+  return commands, xs[points], ys[points], final
+
+def draw_path(turtle, commands, xs, ys, heading):
+  """
+  Hand a precomputed path to a turtle as a single batch.
+  """
+  if not commands:
+    # Only turns, the turtle is still turned as drawn one command at a time
+    turtle.setheading(float(heading))
+    return
+
+  screen = turtle.screen
+  canvas = to_canvas(xs, ys, screen.width, screen.height)
+  dxs = np.diff(xs, prepend=turtle.xcor())
+  dys = np.diff(ys, prepend=turtle.ycor())
+  distance = float(np.hypot(dxs, dys).sum())
+
+  turtle._emit_path(commands, canvas.tolist(), float(xs[-1]), float(ys[-1]), float(heading), distance)
+
+def draw_walk(turtle, turns, steps):
+  """
+  Walk a turtle through arrays of turns and steps, drawn as a single path.
+  """
+  xs, ys, headings = walk(turns, steps, turtle.position(), turtle.heading())
+
+  if len(headings):
+    draw_path(turtle, 'L' * len(xs), xs, ys, headings[-1])
+
+def draw_lsystem(turtle, program, angle, step):
+  """
+  Draw an expanded L-system program with a turtle, as a single path.
+  """
+  commands, xs, ys, heading = interpret(program, angle, step, turtle.position(), turtle.heading())
+
+  draw_path(turtle, commands, xs, ys, heading)
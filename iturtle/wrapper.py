@@ -10,7 +10,8 @@ default_turtle = None
 def check_default_screen():
   global default_screen
   
-  if default_screen is None:
+  # Screens closed by shutdown are replaced
+  if (default_screen is None) or default_screen.closed:
     default_screen = Screen()
     
   return default_screen
@@ -28,13 +29,19 @@ def tracer(n):
   if screen:
     screen.tracer(n)
 
+def update():
+  screen = check_default_screen()
+  
+  if screen:
+    screen.update()
+
 # Turtle wrappers
 def check_default_turtle():
   global default_turtle
   
   screen = check_default_screen()
 
-  if not default_turtle:
+  if (not default_turtle) or (default_turtle.screen is not screen):
     default_turtle = Turtle(screen)
     
   return default_turtle
@@ -166,6 +173,14 @@ def forward(distance):
 def goto(x, y=None, *, need_delay=True):
   pass
 
+@turtle_method
+def polyline(points):
+  pass
+
+@turtle_method
+def path(commands):
+  pass
+
 @turtle_method
 def teleport(x, y=None):
   pass
@@ -174,6 +189,22 @@ def teleport(x, y=None):
 def stamp():
   pass
 
+@turtle_method
+def clearstamp(stampid):
+  pass
+
+@turtle_method
+def clearstamps(n=None):
+  pass
+
+@turtle_method
+def undo():
+  pass
+
+@turtle_method
+def undobufferentries():
+  pass
+
 @turtle_method
 def home():
   pass
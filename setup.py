@@ -90,10 +90,14 @@ setup_args = dict(
             "pytest>=4.6",
             "pytest-cov",
             "nbval",
+            "numpy",
         ],
         "examples": [
             # Any requirements for the examples to run
         ],
+        "vector": [
+            "numpy",
+        ],
         "docs": [
             "jupyter_sphinx",
             "nbsphinx",
@@ -0,0 +1,234 @@
+import { ActionType, FontSpec, TurtleAction } from './interface';
+
+// Mirrors the packed layout produced by iturtle/codec.py
+const ACTION_TYPES: ActionType[] = [
+    ActionType.MOVE_ABSOLUTE,
+    ActionType.MOVE_RELATIVE,
+    ActionType.LINE_ABSOLUTE,
+    ActionType.DRAW_DOT,
+    ActionType.WRITE_TEXT,
+    ActionType.CIRCLE,
+    ActionType.SOUND,
+    ActionType.CLEAR,
+    ActionType.UPDATE_STATE,
+    ActionType.STAMP,
+    ActionType.BEGIN_FILL,
+    ActionType.END_FILL,
+    ActionType.DONE,
+    ActionType.PATH,
+    ActionType.REMOVE,
+];
+
+const FLAG_SHOW = 1;
+const FLAG_PEN = 2;
+const FLAG_CLOCKWISE = 4;
+const FLAG_LARGE_ARC = 8;
+const FLAG_FILL_MODE = 16;
+
+const FLOAT_FIELDS = 11;
+const REF_FIELDS = 12;
+
+// Bits of the per action mask after those of the changed fields
+const MASK_NODE = 2 ** (FLOAT_FIELDS + REF_FIELDS);
+const MASK_NODE_AT = MASK_NODE * 2;
+const MASK_REMOVES = MASK_NODE * 4;
+
+export interface PackedActions {
+    frame: number;
+    count: number;
+    strings: string[];
+    types: DataView;
+    flags: DataView;
+    masks: DataView;
+    floats: DataView;
+    refs: DataView;
+    points: DataView;
+    arcs: DataView;
+    nodes: DataView;
+    removed: DataView;
+}
+
+// Typed array views require aligned offsets, copy the buffer when it is not
+const view = <T>(
+    data: DataView,
+    size: number,
+    Type: new (buffer: ArrayBuffer, offset?: number, length?: number) => T
+): T => {
+    if (data.byteOffset % size === 0) {
+        return new Type(data.buffer, data.byteOffset, data.byteLength / size);
+    }
+    const copy = data.buffer.slice(data.byteOffset, data.byteOffset + data.byteLength);
+
+    return new Type(copy, 0, data.byteLength / size);
+};
+
+/**
+ * Decode packed actions sent through binary buffers back to plain actions.
+ */
+export const unpackActions = (packed: PackedActions | null): TurtleAction[] => {
+    if (!packed || !packed.count) {
+        return [];
+    }
+
+    const { count, strings } = packed;
+    const types = view(packed.types, 1, Uint8Array);
+    const flags = view(packed.flags, 1, Uint8Array);
+    const masks = view(packed.masks, 4, Uint32Array);
+    const floats = view(packed.floats, 4, Float32Array);
+    const refs = view(packed.refs, 4, Int32Array);
+    const points = view(packed.points, 4, Float32Array);
+    const arcs = view(packed.arcs, 4, Float32Array);
+    const nodes = view(packed.nodes, 4, Int32Array);
+    const removed = view(packed.removed, 4, Int32Array);
+    let offset = 0;
+    let arcOffset = 0;
+    let removedOffset = 0;
+    let floatOffset = 0;
+    let refOffset = 0;
+    let nodeOffset = 0;
+    let lastNode = -1;
+
+    // Fields of the previous action, only those that changed are sent
+    const f = new Array<number>(FLOAT_FIELDS).fill(0);
+    const r = new Array<number>(REF_FIELDS).fill(-1);
+
+    const str = (index: number) => (index < 0 ? undefined : strings[index]);
+    const actions: TurtleAction[] = new Array(count);
+
+    for (let i = 0; i < count; i++) {
+        const mask = masks[i];
+        const flag = flags[i];
+        let bit = 1;
+
+        for (let k = 0; k < FLOAT_FIELDS; k++, bit *= 2) {
+            if (mask & bit) {
+                f[k] = floats[floatOffset++];
+            }
+        }
+        for (let k = 0; k < REF_FIELDS; k++, bit *= 2) {
+            if (mask & bit) {
+                r[k] = refs[refOffset++];
+            }
+        }
+
+        const action = {
+            id: strings[r[0]],
+            type: ACTION_TYPES[types[i]],
+            position: [f[0], f[1]],
+            heading: f[2],
+            pensize: f[3],
+            penstretchfactor: [f[4], f[5]],
+            penoutlinewidth: f[6],
+            distance: f[7],
+            radius: f[8],
+            show: (flag & FLAG_SHOW) !== 0,
+            pen: flag & FLAG_PEN ? 1 : 0,
+            clockwise: flag & FLAG_CLOCKWISE ? 1 : 0,
+            large_arc: flag & FLAG_LARGE_ARC ? 1 : 0,
+            fill_mode: (flag & FLAG_FILL_MODE) !== 0,
+            color: str(r[1]),
+            pencolor: str(r[2]),
+            stampid: str(r[3]),
+            shape: str(r[4]),
+            media: str(r[5]),
+        } as TurtleAction;
+
+        const text = str(r[6]);
+        if (text !== undefined) {
+            action.text = text;
+            action.align = str(r[7]);
+            action.font = [
+                str(r[8]),
+                f[9],
+                str(r[9]),
+            ] as FontSpec;
+        }
+
+        if (f[10] > 0) {
+            action.members = f[10];
+        }
+
+        const commands = str(r[10]);
+        if (commands !== undefined) {
+            action.commands = commands;
+            action.points = points.subarray(offset, offset + 2 * commands.length);
+            offset += 2 * commands.length;
+
+            const arcCount = commands.split('A').length - 1;
+            if (arcCount > 0) {
+                action.arcs = arcs.subarray(arcOffset, arcOffset + 3 * arcCount);
+                arcOffset += 3 * arcCount;
+            }
+        }
+
+        const d = str(r[11]);
+        if (d !== undefined) {
+            action.d = d;
+        }
+
+        // Nodes follow the last one drawn unless sent
+        action.node = null;
+        if (mask & MASK_NODE) {
+            lastNode = mask & MASK_NODE_AT ? nodes[nodeOffset++] : lastNode + 1;
+            action.node = lastNode;
+        }
+        if (mask & MASK_REMOVES) {
+            const dropped = nodes[nodeOffset++];
+            action.nodes = Array.from(removed.subarray(removedOffset, removedOffset + dropped));
+            removedOffset += dropped;
+        }
+
+        actions[i] = action;
+    }
+
+    return actions;
+};
+
+/**
+ * Decode sprite transforms sent by Screen.update_turtles, see pack_transforms in
+ * iturtle/codec.py: the slot of every sprite, and its x, y and heading.
+ */
+export const unpackTransforms = (
+    slots: DataView,
+    transforms: DataView
+): { slots: Int32Array; transforms: Float32Array } => {
+    return {
+        slots: view(slots, 4, Int32Array),
+        transforms: view(transforms, 4, Float32Array),
+    };
+};
+
+export interface DeltaActions {
+    frame: number;
+    actions: Partial<TurtleAction & { keyframe: boolean; removed: string[] }>[];
+}
+
+/**
+ * Rebuild full actions from the delta encoding in iturtle/codec.py, tracking
+ * the last known state of every turtle.
+ */
+export class DeltaDecoder {
+    private states: Record<string, TurtleAction> = {};
+
+    decode(deltas: DeltaActions | null): TurtleAction[] {
+        const actions: TurtleAction[] = [];
+
+        deltas?.actions.forEach((delta) => {
+            const id = delta.id as string;
+            const base = delta.keyframe ? undefined : this.states[id];
+
+            // Views attached mid-stream wait for the next keyframe of a turtle
+            if (!delta.keyframe && !base) {
+                return;
+            }
+
+            const { keyframe, removed, ...fields } = delta;
+            const action = { ...base, ...fields } as TurtleAction;
+            removed?.forEach((key) => delete (action as any)[key]);
+            this.states[id] = action;
+            actions.push(action);
+        });
+
+        return actions;
+    }
+}
@@ -1,5 +1,6 @@
 import { WidgetModel } from '@jupyter-widgets/base';
 import { TurtleState } from './widget';
+import { Region } from './resources';
 
 export type FontSpec = [family: string, size: number, weight: string];
 
@@ -18,7 +19,9 @@ export enum ActionType {
     STAMP = 'STAMP',
     DONE = 'DONE',
     BEGIN_FILL = 'BEGIN_FILL',
-    END_FILL = 'END_FILL'
+    END_FILL = 'END_FILL',
+    PATH = 'P',
+    REMOVE = 'RM'
 }
 
 export interface TurtleAction {
@@ -69,15 +72,38 @@ export interface TurtleAction {
     // Visibility state of the turtle
     show: boolean;     
     stampid?:string;
+    // Path commands, one letter per point: L to line, M to move, A to arc
+    commands?: string;
+    // Flat [x0, y0, x1, y1, ...] canvas coordinates of path points
+    points?: ArrayLike<number>;
+    // Radius, large arc and sweep flags of every A command of a path
+    arcs?: ArrayLike<number>;
     fill_mode:boolean,
     fill_start_position:number[];
+    // Scene node drawn by the action, see iturtle/scene.py
+    node?: number | null;
+    // Scene nodes removed by REMOVE and CLEAR actions
+    nodes?: number[];
+    // Whole outline of a fill, sent with END_FILL
+    d?: string;
+    // Where a redrawn stroke starts, sent when replaying the scene
+    start?: Coord;
+    // Number of members of a swarm sharing this state, see iturtle/swarm.py
+    members?: number;
 }
 export interface ResourceProps {
     [key:string]:{
         'name': string,
         'type': string,
         'ext': string,
-        'buffer': string 
+        // Text of SVG documents
+        'buffer': string,
+        // Object URL of the media
+        'url': string,
+        'hash'?: string,
+        // Region of every shape bundled in an atlas sheet, and its object URL
+        'regions'?: Record<string, Region>,
+        'members'?: Record<string, string>
     }
 }
 export interface TurtleProps {
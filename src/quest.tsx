@@ -8,12 +8,13 @@ import {
   TurtleAction,
   WidgetProps,
 } from './interface';
-import { WidgetModelContext, useModelState } from './store';
+import { WidgetModelContext, useModel, useModelState } from './store';
 
 import '../css/widget.css';
 import { saveAs } from 'file-saver';
 import { toPng } from 'html-to-image';
-import { Turtle, TurtleRender } from './shapes';
+import { Turtle, TurtleRender, format } from './shapes';
+import { unpackTransforms } from './codec';
 
 const SVG_NS = 'http://www.w3.org/2000/svg';
 
@@ -101,7 +102,7 @@ const Background: FunctionComponent<{
         <image
           id={'background-svg'}
           width={`${width}px`}
-          href={`data:${resource[url].type}/${resource[url].ext};base64,${resource[url].buffer}`}
+          href={resource[url].url}
         />
       );
     }
@@ -117,7 +118,11 @@ const Screen: FunctionComponent = () => {
   const [actions] = useModelState('actions');
   const [resource] = useModelState('resource'); //Resource must be established in top level
   const [, setKey] = useModelState('key');
+  const model = useModel();
   const [turtles, setTurtles] = useState<{ [key: string]: TurtleAction }>({}); // TODO remove this later
+  // The turtles map is updated in place, sprites moved by transforms change it without rendering
+  const turtlesRef = useRef(turtles);
+  turtlesRef.current = turtles;
 
   const currentAudio = useRef<HTMLAudioElement | null>(null);
 
@@ -125,27 +130,135 @@ const Screen: FunctionComponent = () => {
   const ref = useRef<SVGSVGElement | null>(null);
   const positions = useRef<Record<string, Coord>>({});
   const fillPathRef = useRef<SVGPathElement | null>(null);
+  // Elements of the scene nodes drawn in this view, see iturtle/scene.py
+  const nodes = useRef<Record<number, Element>>({});
+  const applyRef = useRef<(action: TurtleAction) => void>(() => undefined);
+  // Turtle id of every sprite slot in transform messages, see Screen.update_turtles and Screen.update_swarm
+  const slots = useRef<string[]>([]);
+
+  // Name the slots of new turtles, and those of the members of new swarms, see Screen._slot
+  const nameSlots = (names?: ([number, string] | [number, string, number])[]) => {
+    names?.forEach(([slot, name, members]) => {
+      if (members === undefined) {
+        slots.current[slot] = name;
+        return;
+      }
+      for (let i = 0; i < members; i++) {
+        slots.current[slot + i] = `${name}:${i}`;
+      }
+    });
+  };
+
+  // Sprites of many turtles moved at once, attributes are set in place without rendering
+  const moveSprites = (slotsBuffer: DataView, transformsBuffer: DataView) => {
+    const { slots: moved, transforms } = unpackTransforms(slotsBuffer, transformsBuffer);
+
+    moved.forEach((slot, i) => {
+      const name = slots.current[slot];
+      const turtle = turtlesRef.current[name];
+      if (!turtle) {
+        return;
+      }
+
+      const action = {
+        ...turtle,
+        position: [transforms[3 * i], transforms[3 * i + 1]] as Coord,
+        heading: transforms[3 * i + 2],
+      };
+      turtlesRef.current[name] = action;
+      positions.current[name] = action.position;
+
+      const sprite = document.getElementById(
+        `turtle-id-${name}-shape-${action.shape}-${action.stampid ?? ''}`
+      );
+      const shape = sprite?.getElementsByTagNameNS(SVG_NS, 'g')?.[0];
+      if (sprite && shape) {
+        format(sprite, shape, action, action.stampid);
+      }
+    });
+  };
 
   useEffect(() => {
-    const saved = sessionStorage.getItem(id.toString());
+    if (!id || !model) {
+      return;
+    }
+
+    // A new view starts empty, the kernel sends back what is drawn so far in one snapshot
+    const onSnapshot = (content: any, buffers?: (ArrayBuffer | ArrayBufferView)[]) => {
+      if (content?.event !== 'snapshot') {
+        return;
+      }
+      if (content.clear) {
+        removeNodes(Object.keys(nodes.current).map(Number));
+      }
+      nameSlots(content.names);
 
-    if (saved) {
-      const savedData: TurtleAction[] = JSON.parse(saved);
+      // Strokes, dots and fills come as markup, one group per node, inserted at once
       const svg = document.getElementById(`${id}_svgCanvas`);
+      const base = document.getElementById(`${id}_baseline`);
+      const layer = document.createElementNS(SVG_NS, 'g');
+      const fragment = document.createDocumentFragment();
 
-      // Painting svg according to data in local storage once component is set up
-      savedData.forEach((action) => {
-        const renderer = getRenderer[action.type];
-        const visual = renderer(action);
-        const base = document.getElementById(`${id}_baseline`);
-        if (base && visual && svg) {
-          svg.insertBefore(visual, base);
+      layer.innerHTML = buffers?.length ? new TextDecoder().decode(buffers[0]) : '';
+      Array.from(layer.children).forEach((group) => {
+        const node = Number(group.getAttribute('data-node'));
+
+        if (!nodes.current[node]) {
+          nodes.current[node] = group;
+          fragment.appendChild(group);
         }
       });
+      if (base && svg) {
+        svg.insertBefore(fragment, base);
+      }
+
+      (content.actions as TurtleAction[]).forEach((action) => applyRef.current(action));
 
-      // setActionsState(savedData);
+      // Members of swarms follow their shared state, where they are
+      if (buffers && buffers.length >= 3) {
+        moveSprites(buffers[1] as DataView, buffers[2] as DataView);
+      }
+    };
+    // Sprites moved by Screen.update_turtles and Screen.update_swarm
+    const onTransforms = (content: any, buffers?: DataView[]) => {
+      if (content?.event !== 'transforms' || !buffers || buffers.length < 2) {
+        return;
+      }
+      nameSlots(content.names);
+      moveSprites(buffers[0], buffers[1]);
+    };
+    model.on('msg:custom', onSnapshot);
+    model.on('msg:custom', onTransforms);
+    model.send({ event: 'redraw' }, {});
+
+    return () => {
+      model.off('msg:custom', onSnapshot);
+      model.off('msg:custom', onTransforms);
+    };
+  }, [id, model]);
+
+  // Insert the element of a node before a baseline, once per node
+  const insertNode = (action: TurtleAction, visual: Node, baseline: string) => {
+    const svg = document.getElementById(`${id}_svgCanvas`);
+    const base = document.getElementById(`${id}_${baseline}`);
+
+    if (action.node !== undefined && action.node !== null) {
+      if (nodes.current[action.node]) {
+        return;
+      }
+      nodes.current[action.node] = visual as Element;
+    }
+    if (base && svg) {
+      svg.insertBefore(visual, base);
     }
-  }, [id]);
+  };
+
+  const removeNodes = (removed?: number[]) => {
+    removed?.forEach((node) => {
+      nodes.current[node]?.remove();
+      delete nodes.current[node];
+    });
+  };
 
   const getTextWidth = (font?: FontSpec, text?: string) => {
     if (!font || !text) {
@@ -202,20 +315,7 @@ const Screen: FunctionComponent = () => {
       audio = new Audio(action.media);
       currentAudio.current = audio;
     } else {
-      const tempoResource = resource[action.media];
-      const base64Audio = `data:${tempoResource.type}/${tempoResource.ext};base64,${tempoResource.buffer}`;
-
-      // Transfer Base64 data into Blob object
-      const byteCharacters = atob(base64Audio.split(',')[1]);
-      const byteNumbers = new Array(byteCharacters.length);
-      for (let i = 0; i < byteCharacters.length; i++) {
-        byteNumbers[i] = byteCharacters.charCodeAt(i);
-      }
-      const byteArray = new Uint8Array(byteNumbers);
-      const blob = new Blob([byteArray], { type: 'audio/mpeg' });
-
-      // Create URL
-      const audioUrl = URL.createObjectURL(blob);
+      const audioUrl = resource[action.media].url;
       audio = new Audio(audioUrl);
       currentAudio.current = audio;
     }
@@ -251,7 +351,7 @@ const Screen: FunctionComponent = () => {
         fillPathRef.current.setAttribute('d', `${currentD} L ${x},${y}`);
       }
 
-      const position = positions.current[action.id] ?? [width / 2, height / 2];
+      const position = action.start ?? positions.current[action.id] ?? [width / 2, height / 2];
 
       const visual = document.createElementNS(
         'http://www.w3.org/2000/svg',
@@ -285,7 +385,7 @@ const Screen: FunctionComponent = () => {
   };
 
   const drawCircle = (action: TurtleAction): SVGPathElement | undefined => {
-    const position = positions.current[action.id] ?? [width / 2, height / 2];
+    const position = action.start ?? positions.current[action.id] ?? [width / 2, height / 2];
 
     // Command to draw arc
     const arcCommand = `A ${action.radius},${action.radius} 0 ${action.large_arc} ${action.clockwise} ${action.position[0]},${action.position[1]}`;
@@ -310,12 +410,48 @@ const Screen: FunctionComponent = () => {
     return visual;
   };
 
+  const drawPath = (action: TurtleAction): SVGPathElement | undefined => {
+    const position = action.start ?? positions.current[action.id] ?? [width / 2, height / 2];
+    const commands = action.commands ?? '';
+    const points = action.points ?? [];
+
+    const arcs = action.arcs ?? [];
+
+    const segments: string[] = new Array(commands.length);
+    for (let i = 0, arc = 0; i < commands.length; i++) {
+      if (commands[i] === 'A') {
+        // Strokes merged by the kernel keep their arcs, see iturtle/optimize.py
+        const r = arcs[arc];
+        segments[i] = `A ${r},${r} 0 ${arcs[arc + 1]} ${arcs[arc + 2]} ${points[2 * i]},${points[2 * i + 1]}`;
+        arc += 3;
+      } else {
+        segments[i] = `${commands[i]} ${points[2 * i]},${points[2 * i + 1]}`;
+      }
+    }
+    const pathCommand = segments.join(' ');
+
+    if (action.fill_mode && fillPathRef.current) {
+      const currentD = fillPathRef.current.getAttribute('d') || '';
+      fillPathRef.current.setAttribute('d', `${currentD} ${pathCommand}`);
+    }
+
+    // A single element for the whole path, joined like consecutive lines would be
+    const visual = document.createElementNS(SVG_NS, 'path');
+    visual.setAttribute('class', `class${action.id}`); // For fetching elements in deleting
+    visual.setAttribute('d', `M ${position[0]},${position[1]} ${pathCommand}`);
+    visual.setAttribute('stroke', `${action.pencolor}`);
+    visual.setAttribute('stroke-width', `${action.pensize}`);
+    visual.setAttribute('stroke-linecap', 'round');
+    visual.setAttribute('stroke-linejoin', 'round');
+    visual.setAttribute('fill', 'none');
+
+    positions.current[action.id] = action.position.slice() as Coord;
+
+    return visual;
+  };
+
   const writeText = (action: TurtleAction): SVGTextElement | undefined => {
     const width = getTextWidth(action.font, action.text);
-    console.log(
-      'x,y',
-      `${positions.current[action.id][0]}, ${positions.current[action.id][1]}`
-    );
     positions.current[action.id] = getTextPos(action, width) as Coord;
     const visual = document.createElementNS(SVG_NS, 'text');
     visual.setAttribute('class', `class${action.id}`); // For fetching elements in deleting
@@ -355,6 +491,18 @@ const Screen: FunctionComponent = () => {
   }
 
   const endFill = (action: TurtleAction): SVGPathElement | null => {
+    if (action.d) {
+      // The kernel sends the whole outline, which also redraws fills from the scene
+      const outline = document.createElementNS(SVG_NS, 'path');
+      outline.setAttribute('fill', action.color || 'black');
+      outline.setAttribute('stroke', 'none');
+      outline.setAttribute('class', 'fill-path');
+      outline.setAttribute('d', action.d);
+      fillPathRef.current = null;
+
+      return outline;
+    }
+
     const path = fillPathRef.current;
     if (path) {
       const currentD = path.getAttribute('d') || '';
@@ -399,6 +547,7 @@ const Screen: FunctionComponent = () => {
     [ActionType.DRAW_DOT]: drawDot,
     [ActionType.WRITE_TEXT]: writeText,
     [ActionType.CIRCLE]: drawCircle,
+    [ActionType.PATH]: drawPath,
     [ActionType.SOUND]: playSound,
     [ActionType.CLEAR]: clear,
     [ActionType.UPDATE_STATE]: updateState,
@@ -406,6 +555,7 @@ const Screen: FunctionComponent = () => {
     [ActionType.BEGIN_FILL]: beginFill,
     [ActionType.END_FILL]: endFill,
     [ActionType.DONE]: done,
+    [ActionType.REMOVE]: moveAbsolute,
   };
 
   const takePicture = () => {
@@ -438,120 +588,123 @@ const Screen: FunctionComponent = () => {
     setGrid((grid) => !grid);
   };
 
+  const apply = (action: TurtleAction) => {
+    if (action.members) {
+      // The state shared by the members of a swarm, each member keeps where it is.
+      // Sprites moved before the next render move the members of the new map
+      const turtles = { ...turtlesRef.current };
+      for (let i = 0; i < action.members; i++) {
+        const name = `${action.id}:${i}`;
+        const member = turtles[name];
+        turtles[name] = {
+          ...action,
+          id: name,
+          members: undefined,
+          position: member?.position ?? action.position,
+          heading: member?.heading ?? action.heading,
+        };
+      }
+      turtlesRef.current = turtles;
+      setTurtles(turtles);
+      return;
+    }
+    setTurtles((oldTurtles) => {
+      const tempo = oldTurtles;
+      tempo[action.id] = { ...action };
+      return tempo;
+    });
+    switch (action.type) {
+      case ActionType.SOUND:
+        playSound(action);
+        break;
+
+      case ActionType.CLEAR: {
+        // The kernel sends the nodes of the turtle, nothing to search for
+        removeNodes(action.nodes);
+        break;
+      }
+      case ActionType.REMOVE: {
+        removeNodes(action.nodes);
+        moveAbsolute(action);
+        break;
+      }
+      case ActionType.UPDATE_STATE: {
+        // const turtle = { [action.id]: ({ ...action } as unknown as TurtleState) }
+        // console.log('turtle', turtle)
+        // setTurtles(oldTurtles => {
+        //     const tempo = oldTurtles
+        //     tempo[action.id] = { ...action } as unknown as TurtleState
+        //     return tempo
+        // })
+        break;
+      }
+      case ActionType.STAMP: {
+        const visual = TurtleRender({
+          action: action,
+          resource,
+          stampId: action.stampid ?? '',
+        });
+        if (visual) {
+          insertNode(action, visual as unknown as Node, 'stamp_baseline');
+        }
+        break;
+      }
+      // The logic of the layers in the 2048 game code is structured as turtle - text - turtle - text,
+      // stacked in that order.
+      // Based on this logic, we have inserted both the text and the stamp sequentially into the stamp-base-line.
+      case ActionType.WRITE_TEXT: {
+        const renderer = getRenderer[action.type];
+        const visual = renderer(action);
+
+        if (visual) {
+          insertNode(action, visual, 'stamp_baseline');
+        }
+        break;
+      }
+      case ActionType.BEGIN_FILL:{
+        const renderer = getRenderer[action.type];
+        renderer(action)
+
+        break
+      }
+      case ActionType.END_FILL: {
+        const renderer = getRenderer[action.type];
+        const visual = renderer(action); // Get the fill polygon
+
+        if (visual) {
+          insertNode(action, visual as unknown as Node, 'baseline');
+        }
+        break;
+      }
+      case ActionType.DONE: {
+        break;
+      }
+      default: {
+        const renderer = getRenderer[action.type];
+        const visual = renderer(action);
+
+        // Update start point of next painted line
+        positions.current[action.id] = action.position.slice() as Coord;
+        if (visual) {
+          insertNode(action, visual, 'baseline');
+        }
+        break;
+      }
+    }
+  };
+  applyRef.current = apply;
+
   useEffect(() => {
     if (id && actions) {
-      // As model state now only provides addendum action, we'll need to accumulate the actions whenever
-      // there is a new one. However, we'll need to persist existing actions before the change, as we'll
-      // load these actions during mount with the latest action syncing from the kernel :-)
+      // Model state only provides the actions of the latest frame, a new view asks the kernel
+      // for the scene drawn so far on mount
       if (Object.keys(actions).length === 0) {
         return;
       }
-      actions.forEach((action) => {
-        setTurtles((oldTurtles) => {
-          const tempo = oldTurtles;
-          tempo[action.id] = { ...action };
-          return tempo;
-        });
-        switch (action.type) {
-          case ActionType.SOUND:
-            playSound(action);
-            break;
-
-          case ActionType.CLEAR: {
-            // Erasing all paths with same id of turtle
-            const svg = document.getElementById(`${id}_svgCanvas`);
-            const elementsToRemove = svg?.querySelectorAll(
-              `.class${action.id}`
-            );
-            elementsToRemove?.forEach((element) => {
-              svg?.removeChild(element);
-            });
-
-            const t = actions.filter((tt: TurtleAction) => tt.id !== action.id);
-            sessionStorage.setItem(id.toString(), JSON.stringify(t));
-            // setActionsState(t)
-            break;
-          }
-          case ActionType.UPDATE_STATE: {
-            // const turtle = { [action.id]: ({ ...action } as unknown as TurtleState) }
-            // console.log('turtle', turtle)
-            // setTurtles(oldTurtles => {
-            //     const tempo = oldTurtles
-            //     tempo[action.id] = { ...action } as unknown as TurtleState
-            //     return tempo
-            // })
-            break;
-          }
-          case ActionType.STAMP: {
-            const svg = document.getElementById(`${id}_svgCanvas`);
-            const base = document.getElementById(`${id}_stamp_baseline`);
-            const visual = TurtleRender({
-              action: action,
-              resource,
-              stampId: action.stampid ?? '',
-            });
-            if (base && visual && svg) {
-              svg.insertBefore(visual as unknown as Node, base);
-            }
-            break;
-          }
-          // The logic of the layers in the 2048 game code is structured as turtle - text - turtle - text,
-          // stacked in that order.
-          // Based on this logic, we have inserted both the text and the stamp sequentially into the stamp-base-line.
-          case ActionType.WRITE_TEXT: {
-            const svg = document.getElementById(`${id}_svgCanvas`);
-            const base = document.getElementById(`${id}_stamp_baseline`);
-            const renderer = getRenderer[action.type];
-            const visual = renderer(action);
-
-            if (base && visual && svg) {
-              svg.insertBefore(visual, base);
-            }
-            break;
-          }
-          case ActionType.BEGIN_FILL:{
-            const renderer = getRenderer[action.type];
-            renderer(action)
-
-            break
-          }
-          case ActionType.END_FILL: {
-            const svg = document.getElementById(`${id}_svgCanvas`);
-            const base = document.getElementById(`${id}_baseline`);
-            const renderer = getRenderer[action.type];
-            const visual = renderer(action); // Get the fill polygon
-
-            if (svg && base && visual) {
-              svg.insertBefore(visual as unknown as Node, base);
-            }
-            break;
-          }
-          case ActionType.DONE: {
-            break;
-          }
-          default: {
-            // We add ${id} into id of svg element to prevent conflicts of svg background in different tabs or cells
-            const svg = document.getElementById(`${id}_svgCanvas`);
-            const base = document.getElementById(`${id}_baseline`);
-            const renderer = getRenderer[action.type];
-            const visual = renderer(action);
-
-            // Update start point of next painted line
-            positions.current[action.id] = action.position.slice() as Coord;
-            if (base && visual && svg) {
-              svg.insertBefore(visual, base);
-            }
-
-            // Since this is default case in switch, it would be triggered when component set up.
-            // We need to set data back to local storage to avoid getting lost of data while keep refreshing page
-            // setActionsState(actions => {
-            //     sessionStorage.setItem(id.toString(), JSON.stringify(actions));
-            //     return ([...actions, action])
-            // })
-            break;
-          }
-        }
-      });
+      actions.forEach((action) => apply(action));
+
+      // Acknowledge the frame so that the kernel paces frames to this view
+      model?.send({ event: 'ack', frame: model.get('frame') }, {});
     }
   }, [actions, id]);
 
@@ -0,0 +1,126 @@
+export interface Media {
+    // Text of SVG documents, empty for other media
+    buffer: string;
+    // Object URL of the media
+    url: string;
+    // Object URL of every shape of an atlas sheet
+    members?: Record<string, string>;
+}
+
+export interface Region {
+    offset: number;
+    length: number;
+    width: number;
+    height: number;
+    mime: string;
+}
+
+// Media by content hash, shared by every screen of the page
+const cache = new Map<string, Media>();
+
+/**
+ * Turn the binary buffer of a resource into an object URL, and into text for
+ * SVG documents that are inlined.
+ */
+export const toMedia = (type: string, ext: string, buffer: DataView): Media => {
+    const mime = ext === 'svg' ? 'image/svg+xml' : `${type}/${ext}`;
+    const url = URL.createObjectURL(new Blob([buffer], { type: mime }));
+
+    return {
+        buffer: ext === 'svg' ? new TextDecoder('utf-8').decode(buffer) : '',
+        url,
+    };
+};
+
+/**
+ * Turn an atlas sheet, see build_atlas in iturtle/atlas.py, into one object
+ * URL per shape over its own bytes.
+ */
+export const toAtlas = (buffer: DataView, regions: Record<string, Region>): Media => {
+    const members: Record<string, string> = {};
+
+    Object.entries(regions).forEach(([name, region]) => {
+        const bytes = new Uint8Array(buffer.buffer, buffer.byteOffset + region.offset, region.length);
+        members[name] = URL.createObjectURL(new Blob([bytes], { type: region.mime }));
+    });
+
+    return { buffer: '', url: '', members };
+};
+
+export const cacheResource = (hash: string, media: Media): void => {
+    cache.set(hash, media);
+};
+
+export const cachedResource = (hash: string): Media | undefined => {
+    return cache.get(hash);
+};
+
+interface Upload {
+    name: string;
+    type: string;
+    ext: string;
+    hash: string;
+    size: number;
+    chunks: (DataView | undefined)[];
+    received: number;
+    regions?: Record<string, Region>;
+}
+
+const uploads = new Map<string, Upload>();
+
+type Buffer = ArrayBuffer | ArrayBufferView;
+
+const toBytes = (buffer: Buffer): Uint8Array =>
+    ArrayBuffer.isView(buffer)
+        ? new Uint8Array(buffer.buffer, buffer.byteOffset, buffer.byteLength)
+        : new Uint8Array(buffer);
+
+/**
+ * Collect a resource streamed in chunks by Screen._upload. Returns the
+ * complete resource with its buffer once the last chunk has arrived.
+ */
+export const receiveChunk = (
+    content: any,
+    buffers: Buffer[]
+):
+    | { name: string; type: string; ext: string; hash: string; buffer: DataView; regions?: Record<string, Region> }
+    | undefined => {
+    if (content.event === 'resource_begin') {
+        uploads.set(content.hash, {
+            name: content.name,
+            type: content.type,
+            ext: content.ext,
+            hash: content.hash,
+            size: content.size,
+            chunks: new Array(content.chunks),
+            received: 0,
+            regions: content.regions,
+        });
+        return;
+    }
+
+    const upload = uploads.get(content.hash);
+    if (content.event !== 'resource_chunk' || !upload || !buffers.length) {
+        return;
+    }
+    const bytes = toBytes(buffers[0]);
+    upload.chunks[content.index] = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+    upload.received += 1;
+
+    if (upload.received < upload.chunks.length) {
+        return;
+    }
+    uploads.delete(content.hash);
+
+    const data = new Uint8Array(upload.size);
+    let offset = 0;
+    upload.chunks.forEach((chunk) => {
+        if (chunk) {
+            data.set(toBytes(chunk), offset);
+            offset += chunk.byteLength;
+        }
+    });
+    const { name, type, ext, hash, regions } = upload;
+
+    return { name, type, ext, hash, regions, buffer: new DataView(data.buffer) };
+};
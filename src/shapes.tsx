@@ -7,7 +7,7 @@ const SVG_NS = 'http://www.w3.org/2000/svg';
 // Previously we don't change heading direction for official shapes
 // const OFFICIAL_SHAPES = ['arrow', 'turtle', '', 'square', 'triangle', 'circle'];
 
-const format = (
+export const format = (
   visual: any,
   shape: any,
   action: TurtleAction,
@@ -168,15 +168,34 @@ export const TurtleRender = ({
         shape.appendChild(image);
       } else {
         const tempoResource = resource[action.shape];
+        const atlas = tempoResource
+          ? undefined
+          : Object.values(resource ?? {}).find((r) => r.regions?.[action.shape]);
+
+        if (atlas?.regions && atlas.members) {
+          // Show the object URL of the shape in the atlas sheet, shared by all stamps
+          const { width: rw, height: rh } = atlas.regions[action.shape];
+          const image = document.createElementNS(SVG_NS, 'image');
+          image.setAttribute('href', atlas.members[action.shape]);
+          image.setAttribute('width', `${rw}`);
+          image.setAttribute('height', `${rh}`);
+          shape.appendChild(image);
+
+          width = Math.trunc((rw / 2) * action.penstretchfactor[0]);
+          height = Math.trunc((rh / 2) * action.penstretchfactor[1]);
+          shape.setAttribute(
+            'transform',
+            `translate(-${width}, -${height}),rotate(${heading}, ${width}, ${height}),scale(${action.penstretchfactor[0]}, ${action.penstretchfactor[1]})`
+          );
+          break;
+        }
         if (!tempoResource) {
           break;
         }
 
         if (tempoResource.ext === 'svg') {
-          const decoder = new TextDecoder('utf-8');
-          const decodedString = decoder.decode(tempoResource.buffer as any);
           const parser = new DOMParser();
-          const svgDoc = parser.parseFromString(decodedString, 'image/svg+xml');
+          const svgDoc = parser.parseFromString(tempoResource.buffer, 'image/svg+xml');
           const svgElement = svgDoc.documentElement;
 
           while (svgElement.firstChild) {
@@ -184,7 +203,7 @@ export const TurtleRender = ({
           }
         } else {
           const image = document.createElementNS(SVG_NS, 'image');
-          tempoShape = `data:${tempoResource.type}/${tempoResource.ext};base64,${tempoResource.buffer}`;
+          tempoShape = tempoResource.url;
 
           const img = new Image();
           img.src = tempoShape;
@@ -4,6 +4,8 @@ import ReactDOM from 'react-dom';
 import Screen from './quest';
 import { MODULE_NAME, MODULE_VERSION } from './version';
 import { TurtleAction } from './interface';
+import { DeltaActions, DeltaDecoder, unpackActions } from './codec';
+import { Region, cacheResource, cachedResource, receiveChunk, toAtlas, toMedia } from './resources';
 
 import '../css/widget.css';
 
@@ -33,7 +35,11 @@ export interface WidgetModelState {
     width: number;
 
     // Turtle control properties
+    frame: number;
     actions: TurtleAction[];
+    // Decoded from PackedActions by the model serializer
+    packed_actions: TurtleAction[];
+    delta_actions: DeltaActions | null;
     bearing: number;
     id: string;
     key: string;
@@ -45,7 +51,11 @@ export interface WidgetModelState {
             'name': string,
             'type': string,
             'ext': string,
-            'buffer': string 
+            'buffer': string,
+            'url': string,
+            'hash'?: string,
+            'regions'?: Record<string, Region>,
+            'members'?: Record<string, string>
         }
     }
 }
@@ -64,8 +74,67 @@ export class TurtleModel extends DOMWidgetModel {
         };
     }
 
+    private deltas = new DeltaDecoder();
+
+    initialize(attributes: any, options: any): void {
+        super.initialize(attributes, options);
+
+        // Packed frames are decoded by the serializer, views only consume plain actions
+        this.on('change:packed_actions', () => {
+            this.showActions(this.get('packed_actions'));
+        });
+        this.on('change:delta_actions', () => {
+            this.showActions(this.deltas.decode(this.get('delta_actions')));
+        });
+        // Binary buffers become object URLs, resources already sent to another
+        // screen come without their buffer
+        this.on('change:resource', () => {
+            const resource = this.get('resource');
+            if (!resource?.hash) {
+                return;
+            }
+            if (resource.buffer !== undefined) {
+                const media = resource.regions
+                    ? toAtlas(resource.buffer, resource.regions)
+                    : toMedia(resource.type, resource.ext, resource.buffer);
+                cacheResource(resource.hash, media);
+                Object.assign(resource, media);
+            } else {
+                const media = cachedResource(resource.hash);
+                if (media !== undefined) {
+                    Object.assign(resource, media);
+                } else {
+                    this.send({ event: 'missing', name: resource.name, hash: resource.hash }, {});
+                }
+            }
+        });
+        // Large resources are streamed in chunks, acknowledged once complete
+        this.on('msg:custom', (content: any, buffers: (ArrayBuffer | ArrayBufferView)[]) => {
+            const resource = receiveChunk(content, buffers ?? []);
+            if (resource) {
+                // Not set(), which would sync the whole buffer back to the kernel
+                this.attributes.resource = resource;
+                this.trigger('change:resource', this, resource);
+                this.send({ event: 'resource_ack', name: resource.name, hash: resource.hash }, {});
+            }
+        });
+        // A frame identical to the previous one does not change any actions, replay it anyway
+        this.on('change:frame', () => {
+            if (!['actions', 'packed_actions', 'delta_actions'].some((name) => this.hasChanged(name))) {
+                this.trigger('change:actions', this, this.get('actions'));
+            }
+        });
+    }
+
+    // Not set(), which would keep the frame as a change to sync back to the kernel
+    private showActions(actions: any): void {
+        this.attributes.actions = actions;
+        this.trigger('change:actions', this, actions);
+    }
+
     static serializers: ISerializers = {
         ...DOMWidgetModel.serializers,
+        packed_actions: { deserialize: unpackActions },
     };
 
     static model_name = 'TurtleModel';